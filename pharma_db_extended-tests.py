@@ -257,3 +257,141 @@ assert db.list_drugs_with_side_effect_frequency(34, 35) == []
 
 
 print("Wszystkie testy przeszły poprawnie")
+
+# Instrumentacja zapytań o częstotliwość
+db.enable_instrumentation()
+assert db.count_drugs_with_side_effect_frequency(5.0, 15.0) == 3
+assert len(db.list_drugs_with_side_effect_frequency(0, 100)) == 8
+stats = db.instrumentation_stats()
+assert stats["methods"]["count_drugs_with_side_effect_frequency"]["calls"] == 1
+assert stats["counters"]["frequency_keys_scanned"]["total"] == 8       # count_drugs_with_side_effect_frequency nie przegląda kluczy
+db.disable_instrumentation()
+print("Testy instrumentacji przeszły poprawnie")
+
+# Liczba par z zakresu częstotliwości (różnica rang) zgodna z przeglądem wszystkich par
+import random
+
+rng = random.Random(43)
+counted = PharmaDB()
+for i in range(300):
+    counted.add_drug(f"Lek_{i}", [], [], [(f"objaw_{j}", 1, float(rng.randint(0, 40))) for j in range(rng.randint(0, 3))])
+all_freqs = [freq for drug in counted.drugs_by_order[1:] for _, _, freq in drug.side_effects]
+for low, high in [(0, 40), (5, 5), (3.5, 17.2), (-1, 0), (41, 50), (20, 10)]:
+    assert counted.count_drugs_with_side_effect_frequency(low, high) == sum(low <= freq <= high for freq in all_freqs)
+
+# Indeks częstotliwości jako indeks pomocniczy rdzenia
+from pharma_db_extended import SideEffectFrequencyIndex
+from pharmdb import PharmDB
+
+core = PharmDB()
+core.add_drug("Drug_X", [], [], [("effect_A", 1, 5.0), ("effect_B", 2, 7.5)])
+index = core.register_index(SideEffectFrequencyIndex())
+core.add_drug("Drug_Y", [], [], [("effect_A", 1, 5.0)])
+assert list(index.freq_map.items()) == [(5.0, [("Drug_X", "effect_A"), ("Drug_Y", "effect_A")]),
+                                        (7.5, [("Drug_X", "effect_B")])]
+print("Testy indeksu pomocniczego przeszły poprawnie")
+
+# Kwantyle, rangi i k-ty najczęstszy skutek uboczny
+import math
+import random
+
+from pharmdb_bench import generate_catalogue, load_catalogue
+
+db = PharmaDB()
+assert db.frequency_quantile(0.5) is None and db.kth_side_effect(1) is None and db.frequency_rank(3.0) == 0
+load_catalogue(db, generate_catalogue(400, 0, n_side_effects=30, seed=6))
+
+
+def all_pairs(db):
+    pairs = [(freq, i, pair) for freq, group in db.side_effect_freq_map.items() for i, pair in enumerate(group)]
+    return sorted(pairs, key=lambda p: (-p[0], p[1]))
+
+
+pairs = all_pairs(db)
+frequencies = sorted(p[0] for p in pairs)
+n = len(frequencies)
+for q in (0, 0.01, 0.25, 0.5, 0.95, 1):
+    assert db.frequency_quantile(q) == frequencies[max(0, math.ceil(q * n) - 1)]
+for f in (0.0, frequencies[0], frequencies[n // 2], frequencies[-1], frequencies[-1] + 1):
+    assert db.frequency_rank(f) == sum(1 for x in frequencies if x < f)
+for k in [1, 2, 3, n // 2, n - 1, n] + random.Random(0).sample(range(1, n + 1), 30):
+    freq, _, (drug_name, effect) = pairs[k - 1]
+    assert db.kth_side_effect(k) == (drug_name, effect, freq)
+assert db.kth_side_effect(0) is None and db.kth_side_effect(n + 1) is None
+try:
+    db.frequency_quantile(1.5)
+    assert False
+except ValueError:
+    pass
+print("Testy kwantyli częstotliwości przeszły poprawnie")
+
+# Zapytania złożone ze źródłem w indeksie częstotliwości
+db = PharmaDB()
+load_catalogue(db, generate_catalogue(500, 2, n_diseases=20, n_side_effects=30, seed=8))
+plan = db.query(side_effect_frequency=(10.0, 10.5), max_side_effect_level=2).plan()
+assert plan.driver == "frequency" and plan.filters == ["max_side_effect_level"]
+assert db.query(disease="choroba_1", min_efficacy=10, side_effect_frequency=(0.0, 50.0)).plan().driver == "disease"
+for low, high, level in [(10.0, 10.5, 2), (0.0, 3.0, None), (49.0, 60.0, 1), (70.0, 80.0, None)]:
+    expected = [d.id for d in db.drugs_by_order[1:]
+                if any(low <= f <= high for _, _, f in d.side_effects)
+                and (level is None or all(l <= level for _, l, _ in d.side_effects))]
+    result = list(db.query(side_effect_frequency=(low, high), max_side_effect_level=level))
+    assert sorted(result) == expected
+print("Testy zapytań złożonych w PharmaDB przeszły poprawnie")
+
+# Zamrożona PharmaDB: zapytania o częstotliwość na posortowanych tablicach
+db = PharmaDB()
+load_catalogue(db, generate_catalogue(400, 2, n_diseases=10, n_side_effects=25, seed=9))
+frozen = db.freeze()
+frequencies = sorted(f for d in db.drugs_by_order[1:] for _, _, f in d.side_effects)
+for low, high in [(0.0, 100.0), (10.0, 10.5), (20.0, 5.0), (frequencies[3], frequencies[3]), (60.0, 70.0)]:
+    assert frozen.count_drugs_with_side_effect_frequency(low, high) == db.count_drugs_with_side_effect_frequency(low, high)
+    assert frozen.list_drugs_with_side_effect_frequency(low, high) == db.list_drugs_with_side_effect_frequency(low, high)
+for f in (0.0, frequencies[0], frequencies[len(frequencies) // 2], 100.0):
+    assert frozen.frequency_rank(f) == db.frequency_rank(f)
+for q in (0, 0.1, 0.5, 0.99, 1):
+    assert frozen.frequency_quantile(q) == db.frequency_quantile(q)
+for k in range(0, len(frequencies) + 2):
+    assert frozen.kth_side_effect(k) == db.kth_side_effect(k)
+assert frozen.find_best_drug_for_indication("choroba_3") == db.find_best_drug_for_indication("choroba_3")
+for conditions in ({"side_effect_frequency": (10.0, 10.5), "max_side_effect_level": 2},
+                   {"side_effect_frequency": (0.0, 3.0), "disease": "choroba_1"},
+                   {"disease": "choroba_1", "min_efficacy": 10, "side_effect_frequency": (0.0, 50.0)}):
+    assert frozen.query(**conditions).plan() == db.query(**conditions).plan()
+    assert list(frozen.query(**conditions)) == list(db.query(**conditions))
+empty = PharmaDB().freeze()
+assert empty.frequency_quantile(0.5) is None and empty.list_drugs_with_side_effect_frequency(0, 100) == []
+print("Testy zamrożonej PharmaDB przeszły poprawnie")
+
+# Replikacja przyrostowa PharmaDB: nowe wpisy indeksu częstotliwości trafiają do repliki z zestawem zmian
+import tempfile
+from pharmdb_io import export_catalogue, import_catalogue
+from pharmdb_shared import SECTIONS, _build_sections
+
+rows = generate_catalogue(600, 2, n_diseases=10, n_side_effects=25, seed=10)
+db = PharmaDB()
+ids = load_catalogue(db, rows[:400])
+replica = PharmaDB()
+replica.apply_delta(db.export_delta(0))
+for first in (400, 500):
+    since = db.version
+    for name, indications, substitutes, side_effects in rows[first:first + 100]:
+        ids.append(db.add_drug(name, indications, [ids[j] for j in substitutes], side_effects))
+    for i in range(20):
+        db.update_best_indication(f"choroba_{i % 10}", i % 10 + 1)
+    replica.apply_delta(db.export_delta(since))
+    assert list(replica.side_effect_freq_map.items()) == list(db.side_effect_freq_map.items())
+    for low, high in [(0.0, 100.0), (10.0, 12.5)]:
+        assert replica.list_drugs_with_side_effect_frequency(low, high) == db.list_drugs_with_side_effect_frequency(low, high)
+    for k in (1, 50, 700):
+        assert replica.kth_side_effect(k) == db.kth_side_effect(k)
+
+with tempfile.TemporaryDirectory() as directory:
+    export_catalogue(db, directory)
+    rebuilt = PharmaDB()
+    import_catalogue(rebuilt, directory)
+for a, b in ((replica, db), (replica, rebuilt)):
+    sections_a, sections_b = _build_sections(a), _build_sections(b)
+    assert b"".join(sections_a[n].tobytes() for n, _ in SECTIONS) == b"".join(sections_b[n].tobytes() for n, _ in SECTIONS)
+assert list(rebuilt.side_effect_freq_map.items()) == list(replica.side_effect_freq_map.items())
+print("Testy replikacji przyrostowej PharmaDB przeszły poprawnie")
@@ -2,429 +2,83 @@
 # PharmDB – system zarządzania i analizy leków
 # Autor rozwiązania: Mateusz Roman
 
+# Wersja rozszerzona: PharmaDB to PharmDB z dodatkowym indeksem częstotliwości skutków ubocznych,
+# zarejestrowanym w rdzeniu jako indeks pomocniczy (SecondaryIndex).
 
-import heapq
-from collections import deque
-# Dodaję SortedDict, w celu użycia drzew czerwono-czarnych do efektywnego
-# wyszukiwania po zakresie częstotliwości (O(log F)) https://www.geeksforgeeks.org/introduction-to-red-black-tree/
-from sortedcontainers import SortedDict
+# Częstotliwości trzyma SortedKeyDict (pharmdb_sorted): posortowane porcje kluczy pozwalają efektywnie
+# wyszukiwać po zakresie częstotliwości (O(log F)) bez zależności od sortedcontainers.
+import math
 
+from pharmdb import PharmDB, SecondaryIndex
+from pharmdb_query import QueryDriver
+from pharmdb_sorted import SortedCountIndex, SortedKeyDict
 
-class Drug:
-    def __init__(self, drug_id, name, insert_order, indications=None, substitutes=None, side_effects=None):
-        self.id = drug_id
-        self.name = name
-        self.indications = {}                   # wskazania w leczeniu (choroba, skuteczność)
-        self.efficacy_histogram = [0]*11        # indeksy 1-10
 
-        if indications:
-            for disease, efficacy in indications:
-                self.indications[disease] = efficacy
-
-                # Aktualizuj histogram wskazań: liczba wskazań z efektywnością
-                for level in range(1, efficacy+1):
-                        self.efficacy_histogram[level] += 1      
-
-        if substitutes:
-            self.substitutes = set(substitutes) # leki, które ten lek może zastąpić
-        else:
-            self.substitutes = set()
-        self.replaced_by = set()                # leki, które mogą zastąpić ten lek (odwrotna relacja)
-
-        if side_effects:                        # efekty działań nieporządanych (poziom dolegliwości, częstotliwość)
-            self.side_effects = side_effects
-        else:
-            self.side_effects = []
-
-        # Oblicz raz przy dodawaniu wartości (aby potem drugi raz tego nie liczyć)
-        self.risk_score = self._compute_risk_score()
-        self.worst_effect_name = self._compute_worst_effect_name()
-
-        # Kolejność dodania do bazy (potrzebna przy remisach)
-        self.insert_order = insert_order
-
-    def _compute_risk_score(self):
-        score = 0.0
-        for _, level, freq in self.side_effects:
-            score += level * freq
-        return score
-
-    def _compute_worst_effect_name(self):
-        if not self.side_effects:
-            return None
-        # Szukaj najpierw najwyższego poziomu dolegliwości
-        max_level = 0
-        for effect in self.side_effects:
-            if effect[1] > max_level:
-                max_level = effect[1]
-
-        # Przeszukuj efekty o tym poziomie, szukam tego o największej częstości
-        worst_effect = None
-        worst_frequency = 0
-        for effect in self.side_effects:
-            if effect[1] == max_level:
-                if effect[2] > worst_frequency:
-                    worst_frequency = effect[2]
-                    worst_effect = effect
-
-        return worst_effect[0] if worst_effect else None
-
-
-
-class PharmaDB:
+class SideEffectFrequencyIndex(SecondaryIndex):
     '''
-        Klasa przechowująca kompleksową bazę danych leków oraz umożliwiająca analizę ich wzajemnych zależności.
-        System zapewnia efektywne odpowiedzi na zapytania dotyczące bezpieczeństwa przyjmowanych leków 
-        i optymalizacji ich doboru.
-
-        Kazdy lek jest opisany następującymi atrybutami:
-            - id: unikalny identyfikator nadawany przez system (np. "D0001", "D0002")
-            - name: unikalna nazwa leku (np. "Apap", "Ibuprom")
-            - indications: lista wskazań terapeutycznych (chorób) wraz z poziomem skuteczności (skala 1-10)
-            - substitutes: lista leków, które mogą być zastąpione przez dany lek
-                    (jeśli lek A ma na liście substitutes lek B, oznacza to, że B może być zastąpiony przez A)
-            - side_effects: lista działań niepożądanych (nazwa objawu, poziom dolegliwości 1-3, częstotliwość)
+        Indeks par (nazwa leku, nazwa objawu) pogrupowanych według częstotliwości występowania objawu.
     '''
 
     def __init__(self):
-        # Słownik leków po identyfikatorze
-        self.drugs_by_id = {}
-
-        # Relacje odwrotna zamienników jako graf
-        self.reverse_substitutes = {}      # B -> zbiór A
-
-        # Choroba → (efektywność, ID najnowszego leku)
-        self.best_drug_for_disease = {}
-
-        # Choroba → kopiec leków (efektywność, -kolejność, ID), do szybkiej aktualizacji najlepszego
-        self.indication_heap = {}
-
-        # Numer Generatora ID (numerowany jako D0001, D0002, itd.)
-        # Potrzebny jest do rozstrzygania remisów (im większy, tym lek później dodany)
-        self.next_id_number = 1
-
-        # DODANA STRUKTURA DANYCH W KLASIE
-        self.side_effect_freq_map = SortedDict()  
         # Jest to posortowany słownik, który będzie przechowywał efekty uboczne pogrupowane według częstotliwości występowania
-        # SortedDict zapewnia, że klucze (częstotliwości) są zawsze uporządkowane rosnąco.
-
-
-    def add_drug(self, drug_name, indications=None, substitutes=None, side_effects=None):
-        '''
-            Dodaje nowy lek do bazy danych o podanych wskazaniach terapeutycznych, 
-            lekach zastępowanych i efektach ubocznych.
-            
-            Args:
-               drug_name (str): nazwa leku
-               indications (list, optional): lista krotek (choroba, skuteczność)
-               substitutes (list, optional): lista identyfikatorów leków, które mogą być zastąpione przez nowy lek
-               side_effects (list, optional): lista krotek (objaw, poziom dolegliwości, częstotliwość)
-            
-            Returns:
-               str: identyfikator dodanego leku
-            
-            Wymagana złożoność czasowa: O(k log K + s + e), gdzie:
-               - k to liczba wskazań terapeutycznych
-               - K to maksymalna liczba leków dla dowolnego wskazania terapeutycznego
-               - s to liczba zamienników
-               - e to liczba działań niepożądanych
-        '''
-
-        # Generowanie ID
-        drug_id = f"D{self.next_id_number:04d}"
-
-        # Stwórz obiekt Drug
-        drug = Drug(
-            drug_id=drug_id,
-            name=drug_name,
-            insert_order=self.next_id_number,
-            indications=indications,
-            substitutes=substitutes,
-            side_effects=side_effects
-        )
-
-        # Zwiększ licznik dodanych leków
-        self.next_id_number += 1
-
-        # Dodaj lek do słownika leków
-        self.drugs_by_id[drug_id] = drug
-
-        for sub_id in drug.substitutes:
-            # Z warunków zadania musi być id już w bazie, ale wypada dodać sprawdzenie
-            if sub_id in self.drugs_by_id:
-                # Zaktualizuj odwrotną relację
-                if sub_id not in self.reverse_substitutes:
-                    self.reverse_substitutes[sub_id] = set()
-                self.reverse_substitutes[sub_id].add(drug_id)
-                # Zaktualizuj także obiekt zamienianego leku
-                self.drugs_by_id[sub_id].replaced_by.add(drug_id)
-            else:
-                raise Exception("Dodany lek może być zamiennikiem tylko dla leków wcześniej dodanych do bazy danych!")
-
-        # Aktualizuj struktury dotyczące wskazań
-        if indications:
-            for disease, efficacy in indications:
-                # Kopiec dla choroby
-                if disease not in self.indication_heap:
-                    self.indication_heap[disease] = []
-                # Dodaj z minusami, bo heapq to kopiec minimalny — symuluj działanie kopca maksymalnego
-                heapq.heappush(self.indication_heap[disease], (-efficacy, -drug.insert_order, drug_id))
-
-                # Aktualizuj najlepszy lek
-                if disease not in self.best_drug_for_disease:
-                    self.best_drug_for_disease[disease] = (efficacy, drug_id)
-                else:
-                    best_efficacy, best_id = self.best_drug_for_disease[disease]
-                    if (efficacy > best_efficacy) or (efficacy == best_efficacy and drug.insert_order > self.drugs_by_id[best_id].insert_order):
-                        self.best_drug_for_disease[disease] = (efficacy, drug_id)
-
-        # Dodaj do słownika efektów ubocznych po indeksie częstotliwości
-        if side_effects:
-            for effect_name, level, freq in side_effects:  # Iteruj po każdej krotce (nazwa efektu, poziom, częstotliwość)
-                if freq not in self.side_effect_freq_map:  # Jeśli dla danej częstotliwości nie ma jeszcze listy efektów
-                    self.side_effect_freq_map[freq] = []  # Utwórz pustą listę, aby przechowywać efekty o tej częstotliwości
-                # Dodaj parę (nazwa leku, nazwa efektu) do listy efektów dla tej częstotliwości
-                self.side_effect_freq_map[freq].append((drug.name, effect_name))
-
-        return drug_id  # Zwróć identyfikator leku po dodaniu efektów ubocznych
-
-
-
-    def number_of_indications(self, drug_id, min_efficacy):
-        '''
-            Zwraca liczbę wskazań terapeutycznych o efektywności co najmniej min_efficacy dla podanego leku.
-
-            Args:
-                drug_id (str): identyfikator leku
-                min_efficacy (int): minimalna wymagana efektywność
-
-            Returns:
-                int: liczba wskazań terapeutycznych spełniających kryterium
-        
-            Wymagana złożoność czasowa: O(1)
-        '''
-        
-        drug = self.drugs_by_id.get(drug_id)
-        if not drug:
-            return 0
-        return drug.efficacy_histogram[min_efficacy]
-
-
-
-    def number_of_alternative_drugs(self, drug_id):
-        '''
-            Zwraca liczbę leków, które mogą bezpośrednio zastąpić dany lek.
-            
-            Args:
-                drug_id (str): identyfikator leku
-            
-            Returns:
-                int: liczba leków mogących zastąpić dany lek
-            
-            Wymagana złożoność czasowa: O(1)
-        '''
-        drug = self.drugs_by_id.get(drug_id)
-        if not drug:
-            return 0
-        return len(drug.replaced_by)
-
-
-    def worst_side_effect(self, drug_id):
-        '''
-            Zwraca nazwę najbardziej dotkliwego skutku ubocznego dla podanego leku.
-            Najbardziej dotkliwy to skutek o największej częstotliwości spośród tych o największym poziomie dolegliwości.
-        
-            Args:
-            drug_id (str): identyfikator leku
-        
-            Returns:
-            str: nazwa najbardziej dotkliwego skutku ubocznego lub None jeśli lek nie ma skutków ubocznych
-        
-            Wymagana złożoność czasowa: O(1)
-        '''
-       
-        drug = self.drugs_by_id.get(drug_id)
-        if not drug:
-            return None
-        return drug.worst_effect_name
-
-
-    def risk_score(self, drug_id):
-        '''
-            Zwraca wskaźnik ryzyka (risk score) zdefiniowany jako ważona suma wszystkich działań niepożądanych leku.
-            Risk score = suma(częstość występowania x poziom dolegliwości) po wszystkich efektach ubocznych.
-
-            Args:
-                drug_id (str): identyfikator leku
-
-            Returns:
-                float: wskaźnik ryzyka
-        
-            Wymagana złożoność czasowa: O(1)
-        '''
-        drug = self.drugs_by_id.get(drug_id)
-        if not drug:
-            return 0.0
-        return drug.risk_score
-
-
-    def find_best_alternative(self, drug_id, max_steps=2):
-        '''
-            Zwraca identyfikator leku o minimalnym ryzyku spośród leków, które można zastosować 
-            zamiast leku drug_id przy ograniczeniu liczby zamian (max_steps).
-            
-            Args:
-            drug_id (str): identyfikator leku
-            max_steps (int, optional): maksymalna liczba zamian, domyślnie 2
-            
-            Returns:
-                str: identyfikator leku o minimalnym ryzyku
-            
-            Wymagana złożoność czasowa: funkcja powinna działać istotnie szybciej niż O(D+S)
-        '''
-
-        if drug_id not in self.drugs_by_id:
-            return None
-
-        # BFS (lek_id, liczba wykonanych kroków)
-        visited = set()
-        queue = deque([(drug_id, 0)])
-        visited.add(drug_id)
-
-        best_id = drug_id
-        best_score = self.drugs_by_id[drug_id].risk_score
-
-        while queue:
-            current_id, steps = queue.popleft()
-            current_score = self.drugs_by_id[current_id].risk_score
-
-            # Aktualizuj najlepszy lek
-            if (current_score < best_score) or (current_score == best_score and current_id < best_id):
-                best_score = current_score
-                best_id = current_id
-
-            # Przejdź do sąsiadów, jeśli nie przekroczono max_steps
-            if steps < max_steps:
-                for neighbor in self.reverse_substitutes.get(current_id, []):
-                    if neighbor not in visited:
-                        visited.add(neighbor)
-                        queue.append((neighbor, steps + 1))
-
-        return best_id
-
-
-    def longest_alternative_list(self):
-        '''
-            Zwraca listę identyfikatorów leków stanowiącą najdłuższy ciąg zamienników leków,
-            gdzie każdy kolejny lek na liście może bezpośrednio zamienić lek poprzedni.
-        
-            Przykład: jeśli A może być zastąpione przez B, B przez C lub D, a C przez D,
-            to wynikiem działania tej funkcji powinna być lista [id(A), id(B), id(C), id(D)].
-        
-            Returns:
-                list: lista identyfikatorów leków
-
-            Wymagana złożoność czasowa: O(d), gdzie d to długość zwracanej listy
-        '''
-        memo = {}  # drug_id: (długość ścieżki, następny lek w najdłuższej ścieżce)
-
-        # DFS z zapamiętywaniem przebytej ścieżki
-        def dfs(drug_id):
-            if drug_id in memo:
-                return memo[drug_id]
-
-            max_len = 1
-            next_id = None
-
-            # Przechodzę po lekach, które mogą zastąpić dany lek (graf skierowany)
-            # Sortuję, aby przy remisie wybrać leksykograficznie najmniejszy ciąg
-            for neighbor in sorted(self.reverse_substitutes.get(drug_id, [])):
-                path_len, _ = dfs(neighbor)
-                if path_len + 1 > max_len:
-                    max_len = path_len + 1
-                    next_id = neighbor
-                elif path_len + 1 == max_len:
-                    if next_id is None or neighbor < next_id:
-                        next_id = neighbor
-
-            memo[drug_id] = (max_len, next_id)
-            return memo[drug_id]
-
-        # Szukam najlepszego startowego leku
-        best_start = None
-        best_len = 0
-        for drug_id in sorted(self.drugs_by_id):  # sortowanie dla remisu
-            length, _ = dfs(drug_id)
-            if length > best_len:
-                best_len = length
-                best_start = drug_id
-
-        # Odtwarzam najdłuższą ścieżkę za pomocą memo
-        path = []
-        current = best_start
-        while current:
-            path.append(current)
-            _, current = memo[current]
-
-        return path
-
-    def find_best_drug_for_indication(self, disease_name):
-        '''
-            Zwraca identyfikator leku o największej efektywności dla wskazanej choroby.
-            W przypadku wielu leków o takiej samej efektywności, zwraca najpóźniej dodany do bazy.
+        # SortedKeyDict zapewnia, że klucze (częstotliwości) są zawsze uporządkowane rosnąco.
+        self.freq_map = SortedKeyDict()
+        # Liczność par dla każdej częstotliwości z operacjami rank/select (kwantyle, k-ty element)
+        self.counts = SortedCountIndex()
+        # Nazwa leku → klucz leku (dla leków ze skutkami ubocznymi), do zapytań złożonych
+        self.order_of_name = {}
+
+    def on_insert(self, drug):
+        if drug.side_effects:
+            self.order_of_name[drug.name] = drug.insert_order
+        for effect_name, level, freq in drug.side_effects:  # Iteruj po każdej krotce (nazwa efektu, poziom, częstotliwość)
+            if freq not in self.freq_map:  # Jeśli dla danej częstotliwości nie ma jeszcze listy efektów
+                self.freq_map[freq] = []  # Utwórz pustą listę, aby przechowywać efekty o tej częstotliwości
+            # Dodaj parę (nazwa leku, nazwa efektu) do listy efektów dla tej częstotliwości
+            self.freq_map[freq].append((drug.name, effect_name))
+            self.counts.add(freq)
+
+    def on_bulk_insert(self, drugs):
+        # Nowe wpisy grupuję po częstotliwości; istniejące listy wydłużam, a nowe klucze wstawiam jednym
+        # update (przy dużym update klucze są sortowane raz zamiast wstawiane po kolei)
+        new_keys = {}
+        for drug in drugs:
+            if drug.side_effects:
+                self.order_of_name[drug.name] = drug.insert_order
+            for effect_name, level, freq in drug.side_effects:
+                pairs = self.freq_map.get(freq)
+                if pairs is None:
+                    pairs = new_keys.setdefault(freq, [])
+                pairs.append((drug.name, effect_name))
+                self.counts.add(freq)
+        self.freq_map.update(new_keys)
+
+
+class PharmaDB(PharmDB):
+    '''
+        PharmDB rozszerzona o zapytania zakresowe po częstotliwości skutków ubocznych.
+    '''
 
-            Args:
-                disease_name (str): nazwa choroby
+    INSTRUMENTED_METHODS = PharmDB.INSTRUMENTED_METHODS + (
+        "count_drugs_with_side_effect_frequency", "list_drugs_with_side_effect_frequency",
+        "frequency_rank", "frequency_quantile", "kth_side_effect",
+    )
 
-            Returns:
-                str: identyfikator leku o największej efektywności
-        
-            Wymagana złożoność czasowa: O(1)
-        '''
-        if disease_name not in self.best_drug_for_disease:
-            return None
-        return self.best_drug_for_disease[disease_name][1]  # (efficacy, drug_id)
+    def __init__(self, id_prefix="D", id_width=4):
+        super().__init__(id_prefix, id_width)
 
+        # DODANA STRUKTURA DANYCH W KLASIE
+        self.side_effect_index = self.register_index(SideEffectFrequencyIndex())
+        self.side_effect_freq_map = self.side_effect_index.freq_map
 
-    def update_best_indication(self, disease_name, new_efficacy):
+    def freeze(self):
         '''
-            Zmienia efektywność najlepszego leku dla wskazanej choroby, tj.
-            leku, który jest wynikiem działania find_best_drug_for_indication
-        
-            Args:
-                disease_name (str): nazwa choroby
-                new_efficacy (int): nowa efektywność
-        
-            Wymagana złożoność czasowa: O(log K)
+            Niezmienna kopia bazy do odczytu (FrozenPharmaDB) — także z zapytaniami o częstotliwość
+            na posortowanych tablicach.
         '''
-        if disease_name not in self.best_drug_for_disease:
-            return
-
-        # Pobieram lek aktualnie najlepszy dla choroby
-        _, drug_id = self.best_drug_for_disease[disease_name]
-        drug = self.drugs_by_id[drug_id]
+        from pharmdb_frozen import FrozenPharmaDB
 
-        old_eff = drug.indications[disease_name]
-        drug.indications[disease_name] = new_efficacy
-
-        # Aktualizuję histogram skuteczności. Odejmuję stare poziomy i dodaję nowe
-        for level in range(1, old_eff + 1):
-            drug.efficacy_histogram[level] -= 1
-        for level in range(1, new_efficacy + 1):
-            drug.efficacy_histogram[level] += 1
-
-        # Dodaję nową wartość do kopca bez usuwania starej wartości
-        heapq.heappush(self.indication_heap[disease_name], (-new_efficacy, -drug.insert_order, drug_id))
-
-        # Czyszczę górę kopca tylko jeśli jest nieaktualny
-        while self.indication_heap[disease_name]:
-            eff, neg_order, top_id = self.indication_heap[disease_name][0]
-            current_eff = self.drugs_by_id[top_id].indications.get(disease_name)
-            if current_eff is not None and -eff == current_eff:
-                # Aktualizuję najlepszy lek dla choroby
-                self.best_drug_for_disease[disease_name] = (current_eff, top_id)
-                break
-            heapq.heappop(self.indication_heap[disease_name])  # usuwam nieaktualny wpis
+        return FrozenPharmaDB(self)
 
     def count_drugs_with_side_effect_frequency(self, min_freq, max_freq):
         '''
@@ -434,16 +88,10 @@ class PharmaDB:
             gdzie F to sumaryczna liczba działań niepożądanych dla wszystkich leków w bazie danych.
         '''
 
-        # self.side_effect_freq_map to SortedDict, czyli struktura oparta na drzewie czerwono-czarnym,
-        # przechowuje ona dane posortowane po częstotliwości działań niepożądanych.
-        # Dzięki temu można efektywnie wywołać irange(min_freq, max_freq) - iterując tylko po kluczach
-        # w zadanym zakresie częstotliwości, bez przeglądania całej struktury.
-        # Wyszukiwanie zakresowe i iteracja po elementach w SortedDict działają w czasie O(log F + liczba zwróconych elementów).
-        # Tutaj, ponieważ liczy się tylko liczbę elementów, czas jest O(log F) zamortyzowany.
-        count = 0
-        for freq in self.side_effect_freq_map.irange(min_freq, max_freq):
-            count += len(self.side_effect_freq_map[freq])
-        return count
+        # self.side_effect_index.counts to SortedCountIndex: porcje posortowanych częstotliwości z krotnościami
+        # i drzewo Fenwicka sum krotności porcji. count_range liczy pary z zakresu jako różnicę rang
+        # (rank(max_freq) + count(max_freq) - rank(min_freq)), bez przeglądania kluczy z zakresu — O(log F).
+        return self.side_effect_index.counts.count_range(min_freq, max_freq)
 
     def list_drugs_with_side_effect_frequency(self, min_freq, max_freq):
         '''
@@ -452,13 +100,78 @@ class PharmaDB:
             gdzie m jest liczbą par (lek, objaw) z zadanego przedziału.
 
         '''
-        # Podobnie używam SortedDict (drzewa czerwono-czarnego),
+        # Podobnie używam SortedKeyDict,
         # co pozwala na szybkie znalajdowanie zakresu kluczy częstotliwości.
         # Operacja irange(min_freq, max_freq) znajduje granice zakresu w czasie O(log F),
         # a następnie należy iterować tylko po elementach należących do tego ograniczonego już zakresu.
         # Łączenie wyników (extend) ma złożoność O(m), gdzie m to liczba dopasowanych par (lek, objaw).
         # Ostatecznie funkcja działa w czasie O(log F + m).
         result = []
+        scanned = 0
         for freq in self.side_effect_freq_map.irange(min_freq, max_freq):
             result.extend(self.side_effect_freq_map[freq])
+            scanned += 1
+        if self.stats is not None:
+            self.stats.record("frequency_keys_scanned", scanned)
         return result
+
+    def frequency_rank(self, freq):
+        '''
+            Zwraca liczbę par (lek, objaw) o częstotliwości mniejszej niż freq.
+
+            Wymagana złożoność czasowa: O(log F)
+        '''
+        return self.side_effect_index.counts.rank(freq)
+
+    def frequency_quantile(self, q):
+        '''
+            Zwraca kwantyl rzędu q (0 <= q <= 1) częstotliwości wszystkich par (lek, objaw), metodą
+            najbliższej rangi: najmniejszą częstotliwość, od której nie większych jest co najmniej q * F par
+            (np. q = 0.5 — mediana dolna, q = 0.95 — 95. percentyl). Dla pustej bazy zwraca None.
+
+            Wymagana złożoność czasowa: O(log F)
+        '''
+        if not 0 <= q <= 1:
+            raise ValueError("Rząd kwantyla musi należeć do przedziału [0, 1]")
+        counts = self.side_effect_index.counts
+        if not len(counts):
+            return None
+        return counts.select(max(0, math.ceil(q * len(counts)) - 1))
+
+    def kth_side_effect(self, k):
+        '''
+            Zwraca k-tą (od 1) najczęstszą parę jako krotkę (nazwa leku, objaw, częstotliwość).
+            Pary o równej częstotliwości są uporządkowane w kolejności dodania. Dla k spoza zakresu zwraca None.
+
+            Wymagana złożoność czasowa: O(log F)
+        '''
+        counts = self.side_effect_index.counts
+        total = len(counts)
+        if not 1 <= k <= total:
+            return None
+        freq = counts.select(total - k)
+        # Pary o większej częstotliwości poprzedzają grupę freq w porządku malejącym
+        above = total - counts.rank(freq) - counts.count(freq)
+        drug_name, effect_name = self.side_effect_freq_map[freq][k - 1 - above]
+        return drug_name, effect_name, freq
+
+    def _query_drivers(self, query):
+        drivers = super()._query_drivers(query)
+        if query.side_effect_frequency is not None:
+            low, high = query.side_effect_frequency
+            # Liczba par (lek, objaw) w zakresie z liczności indeksu rank/select — O(log F)
+            estimate = self.side_effect_index.counts.count_range(low, high)
+            drivers.insert(-1, QueryDriver("frequency", estimate, lambda: self._frequency_orders(low, high),
+                                           ("side_effect_frequency",)))
+        return drivers
+
+    def _frequency_orders(self, min_freq, max_freq):
+        # Klucze leków z parami w zakresie częstotliwości, bez powtórzeń, rosnąco po częstotliwości
+        order_of_name = self.side_effect_index.order_of_name
+        seen = set()
+        for freq in self.side_effect_freq_map.irange(min_freq, max_freq):
+            for drug_name, _ in self.side_effect_freq_map[freq]:
+                order = order_of_name[drug_name]
+                if order not in seen:
+                    seen.add(order)
+                    yield order
@@ -106,4 +106,933 @@ assert db3.find_best_alternative(a1, 4) == a4
 # Testowanie longest_alternative_list
 assert db3.longest_alternative_list() == [a1, a2, a3, a4, a5]
 
-print('Wszystkie testy zakończone sukcesem!')
\ No newline at end of file
+print('Wszystkie testy zakończone sukcesem!')
+
+print('Testowanie identyfikatorów powyżej D9999...')
+db4 = PharmDB()
+ids = [db4.add_drug(f"L{i}", [("choroba X", 5)], [], [("efekt", 1, 1.0)]) for i in range(10001)]
+assert ids[0] == "D0001" and ids[9998] == "D9999" and ids[9999] == "D10000"
+# Remis ryzyka: wygrywa lek dodany wcześniej, mimo że "D10000" < "D9999" leksykograficznie
+b1 = db4.add_drug("B1", [], [ids[9998]], [("efekt", 1, 1.0)])
+assert db4.find_best_alternative(ids[9998], 1) == ids[9998]
+b2 = db4.add_drug("B2", [], [ids[9999]], [("efekt", 1, 1.0)])
+assert db4.find_best_alternative(ids[9999], 1) == ids[9999]
+assert db4.find_best_drug_for_indication("choroba X") == ids[-1]
+# Najdłuższy ciąg przy remisie zaczyna się od leku dodanego najwcześniej
+assert db4.longest_alternative_list() == [ids[9998], b1]
+
+# Konfigurowalny format identyfikatorów
+db5 = PharmDB(id_prefix="DRUG-", id_width=8)
+assert db5.add_drug("Lek") == "DRUG-00000001"
+assert db5.order_of("DRUG-00000001") == 1
+assert db5.order_of("D0001") is None
+print('Testy identyfikatorów zakończone sukcesem!')
+
+print('Testowanie modeli ryzyka...')
+from pharmdb import RiskModel
+db6 = PharmDB()
+r1 = db6.add_drug("R1", [], [], [("senność", 1, 5.0), ("nudności", 2, 2.0)])
+r2 = db6.add_drug("R2", [], [r1], [("wysypka", 1, 6.0), ("bezsenność", 1, 3.0)])
+r3 = db6.add_drug("R3", [], [], [("zero", 3, 0.0), ("kaszel", 2, 4.0)])
+r4 = db6.add_drug("R4", [], [], [])
+assert db6.risk_score(r1) == 9.0 and db6.risk_score(r2) == 9.0
+assert db6.find_best_alternative(r1, 1) == r1  # remis — wcześniej dodany
+
+# Nieliniowe wagi poziomów: R1 = 1*5 + 4*2 = 13, R2 = 1*6 + 1*3 = 9
+db6.set_risk_model(RiskModel(level_weights={1: 1, 2: 4, 3: 9}))
+assert db6.risk_score(r1) == 13.0 and db6.risk_score(r2) == 9.0
+assert db6.find_best_alternative(r1, 1) == r2
+assert db6.worst_side_effect(r1) == "nudności"
+assert db6.worst_side_effect(r3) is None  # najwyższy poziom ma zerową częstotliwość
+assert db6.risk_score(r4) == 0.0 and db6.worst_side_effect(r4) is None
+
+# Nowe leki używają bieżącego modelu
+r5 = db6.add_drug("R5", [], [], [("ból", 2, 1.0)])
+assert db6.risk_score(r5) == 4.0
+
+# Korekta częstotliwości i powrót do modelu domyślnego
+db6.set_risk_model(RiskModel(frequency_factor=0.5))
+assert db6.risk_score(r1) == 4.5 and db6.risk_score(r5) == 1.0
+db6.set_risk_model(RiskModel())
+assert db6.risk_score(r1) == 9.0 and db6.worst_side_effect(r2) == "wysypka"
+
+# Przeliczenie bez NumPy daje te same wyniki
+import sys
+expected = [(d.risk_score, d.worst_effect_name) for d in db6.drugs_by_order[1:]]
+numpy_module = sys.modules.get("numpy")
+sys.modules["numpy"] = None
+try:
+    db6.set_risk_model(RiskModel(level_weights={1: 1, 2: 4, 3: 9}))
+    assert db6.risk_score(r1) == 13.0 and db6.worst_side_effect(r3) is None
+    db6.set_risk_model(RiskModel())
+    assert [(d.risk_score, d.worst_effect_name) for d in db6.drugs_by_order[1:]] == expected
+finally:
+    if numpy_module is None:
+        del sys.modules["numpy"]
+    else:
+        sys.modules["numpy"] = numpy_module
+print('Testy modeli ryzyka zakończone sukcesem!')
+
+print('Testowanie instrumentacji...')
+db7 = PharmDB()
+assert db7.instrumentation_stats() is None
+assert "find_best_alternative" not in db7.__dict__   # wyłączona = brak opakowań
+db7.enable_instrumentation()
+i1 = db7.add_drug("I1", [("choroba", 5)], [], [("efekt", 1, 10.0)])
+i2 = db7.add_drug("I2", [("choroba", 7)], [i1], [("efekt", 1, 5.0)])
+i3 = db7.add_drug("I3", [("choroba", 6)], [i2], [("efekt", 1, 1.0)])
+assert db7.find_best_alternative(i1, 2) == i3
+assert db7.find_best_alternative(i1, 1) == i2
+assert db7.longest_alternative_list() == [i1, i2, i3]
+db7.update_best_indication("choroba", 1)   # I2 spada, nowy najlepszy to I3, usunięty stary wpis I2
+assert db7.find_best_drug_for_indication("choroba") == i3
+
+stats = db7.instrumentation_stats()
+assert stats["methods"]["add_drug"]["calls"] == 3
+assert stats["methods"]["find_best_alternative"]["calls"] == 2
+assert stats["methods"]["find_best_alternative"]["p50_us"] <= stats["methods"]["find_best_alternative"]["max_us"]
+assert stats["counters"]["bfs_nodes_visited"] == {"samples": 2, "total": 5, "mean": 2.5, "max": 3}
+assert stats["methods"]["longest_alternative_list"]["calls"] == 1
+assert stats["counters"]["stale_heap_pops"]["total"] == 1
+
+db7.stats.reset()
+assert db7.instrumentation_stats() == {"methods": {}, "counters": {}}
+final = db7.disable_instrumentation()
+assert final is not None and db7.instrumentation_stats() is None
+assert "find_best_alternative" not in db7.__dict__
+assert db7.find_best_alternative(i1, 2) == i3
+print('Testy instrumentacji zakończone sukcesem!')
+
+print('Testowanie indeksów pomocniczych...')
+from pharmdb import SecondaryIndex
+
+class EventLog(SecondaryIndex):
+    def __init__(self):
+        self.events = []
+    def on_insert(self, drug):
+        self.events.append(("insert", drug.id))
+    def on_update(self, drug, disease, old_efficacy, new_efficacy):
+        self.events.append(("update", drug.id, disease, old_efficacy, new_efficacy))
+    def on_risk_recomputed(self, db):
+        self.events.append(("risk",))
+
+db8 = PharmDB()
+x1 = db8.add_drug("X1", [("choroba", 4)], [], [])
+log = db8.register_index(EventLog())
+assert log.events == [("insert", x1)]       # istniejące leki wstawione przy rejestracji
+x2 = db8.add_drug("X2", [("choroba", 6)], [x1], [])
+db8.update_best_indication("choroba", 3)
+db8.set_risk_model(RiskModel())
+assert log.events == [("insert", x1), ("insert", x2), ("update", x2, "choroba", 6, 3), ("risk",)]
+print('Testy indeksów pomocniczych zakończone sukcesem!')
+
+print('Testowanie ścieżek zamian...')
+# Ścieżki w db3: A1 -> A2 -> A3 -> A4 -> A5 (ryzyko 10, 5, 15, 3, 8)
+assert db3.substitution_path(a1, a4) == ([a1, a2, a3, a4], 5.0 + 15.0 + 3.0)
+assert db3.substitution_path(a1, a4, bidirectional=False) == ([a1, a2, a3, a4], 23.0)
+assert db3.substitution_path(a1, a4, cost="max") == ([a1, a2, a3, a4], 15.0)
+assert db3.substitution_path(a1, a4, max_risk=10.0) is None     # A3 przekracza limit ryzyka
+assert db3.substitution_path(a4, a1) is None                    # brak ścieżki w przeciwnym kierunku
+assert db3.substitution_path(a2, a2) == ([a2], 0.0)
+
+# W pierwszej bazie Apap zastępuje tylko Aspiryna; stany zapalne leczą Ibuprom i Nurofen
+assert db.cheapest_substitution_path(drug1, "stany zapalne") == ([drug1, drug3, drug4, drug5], 33.0 + 2.0 + 3.0)
+assert db.cheapest_substitution_path(drug2, "stany zapalne") == ([drug2], 0.0)
+assert db.cheapest_substitution_path(drug1, "ból głowy", min_efficacy=9) == ([drug1, drug3, drug4], 35.0)
+assert db.cheapest_substitution_path(drug1, "ból głowy", min_efficacy=9, cost="max") == ([drug1, drug3, drug4], 33.0)
+assert db.cheapest_substitution_path(drug1, "ból głowy", min_efficacy=9, max_risk=30.0) is None
+assert db.cheapest_substitution_path(drug1, "nieznana choroba") is None
+
+# Porównanie z programowaniem dynamicznym po kolejności dodania (graf zamian jest DAG-iem)
+from pharmdb_bench import generate_catalogue, load_catalogue
+db9 = PharmDB()
+ids9 = load_catalogue(db9, generate_catalogue(300, substitution_degree=4, n_diseases=5, seed=3))
+
+def dp_costs(db, start, use_sum):
+    inf = float("inf")
+    best = {db.order_of(start): 0.0}
+    for order in range(db.order_of(start), db.next_id_number):
+        if order not in best:
+            continue
+        for nxt in db.reverse_substitutes.get(order, ()):
+            risk = db.drugs_by_order[nxt].risk_score
+            cand = best[order] + risk if use_sum else max(best[order], risk)
+            if cand < best.get(nxt, inf):
+                best[nxt] = cand
+    return best
+
+import random
+rng9 = random.Random(9)
+for _ in range(30):
+    s = rng9.choice(ids9)
+    sums, maxes = dp_costs(db9, s, True), dp_costs(db9, s, False)
+    for t in rng9.sample(ids9, 10):
+        expected = sums.get(db9.order_of(t))
+        for bidirectional in (True, False):
+            found = db9.substitution_path(s, t, bidirectional=bidirectional)
+            if expected is None:
+                assert found is None
+            else:
+                path, cost = found
+                assert abs(cost - expected) < 1e-9 and path[0] == s and path[-1] == t
+                assert all(db9.order_of(path[k]) in db9.drugs_by_id[path[k + 1]].substitutes for k in range(len(path) - 1))
+        found = db9.substitution_path(s, t, cost="max")
+        assert (found is None) == (maxes.get(db9.order_of(t)) is None)
+        if found:
+            assert found[1] == maxes[db9.order_of(t)]
+print('Testy ścieżek zamian zakończone sukcesem!')
+
+print('Testowanie osiągalności (can_replace)...')
+assert db3.can_replace(a5, a1) and db3.can_replace(a2, a1)
+assert not db3.can_replace(a1, a5) and not db3.can_replace(a3, a3)
+assert db.can_replace(drug5, drug1) and db.can_replace(drug6, drug2) and not db.can_replace(drug6, drug4)
+assert not db.can_replace(drug1, "D9999")
+# Indeks utrzymywany przyrostowo po pierwszym zapytaniu
+a6 = db3.add_drug("A6", [], [a5], [])
+a7 = db3.add_drug("A7", [], [], [])
+assert db3.can_replace(a6, a1) and not db3.can_replace(a7, a1)
+
+# Porównanie z BFS, także przy małym limicie etykiet (przeszukiwanie zapasowe)
+from pharmdb_reachability import ReachabilityIndex
+
+def bfs_reachable(db, source):
+    seen = {source}
+    queue = [source]
+    for current in queue:
+        for nxt in db.reverse_substitutes.get(current, ()):
+            if nxt not in seen:
+                seen.add(nxt)
+                queue.append(nxt)
+    return seen
+
+small = db9.register_index(ReachabilityIndex(db9, label_limit=2))
+assert any(label is None for label in small.labels[1:])
+for source in range(1, db9.next_id_number, 7):
+    reachable = bfs_reachable(db9, source)
+    for target in range(1, db9.next_id_number, 3):
+        expected = target in reachable and target != source
+        assert small.can_reach(source, target) == expected
+        assert db9.can_replace(db9.format_drug_id(target), db9.format_drug_id(source)) == expected
+print('Testy osiągalności zakończone sukcesem!')
+
+print('Testowanie ciągów zamienników...')
+# db: Apap -> Aspiryna -> Paracetamol -> Nurofen, Ibuprom -> Aspiryna / Nurofen, Aspiryna -> Polopiryna
+assert db.chain_length(drug1) == 4 and db.chain_length(drug2) == 4 and db.chain_length(drug5) == 1
+assert db.chain_length("D9999") == 0 and db.longest_chain_from("D9999") == []
+assert db.longest_chain_from(drug2) == [drug2, drug3, drug4, drug5]
+assert db.longest_chain_from(drug3) == [drug3, drug4, drug5]
+assert db.top_k_chains(3) == [[drug1, drug3, drug4, drug5], [drug2, drug3, drug4, drug5], [drug3, drug4, drug5]]
+assert db.top_k_chains(3, disjoint=True) == [[drug1, drug3, drug4, drug5], [drug6]]
+assert len(db.top_k_chains(100)) == 6
+
+# Dane utrzymywane przy dodawaniu: nowy lek wydłuża ciągi
+drug7 = db.add_drug("Ketonal", [], [drug5], [])
+assert db.longest_alternative_list() == [drug1, drug3, drug4, drug5, drug7]
+assert db.chain_length(drug2) == 5
+drug8 = db.add_drug("Ketoprofen", [], [drug6], [])     # remis długości, ale Paracetamol dodany wcześniej
+assert db.longest_chain_from(drug3) == [drug3, drug4, drug5, drug7]
+assert PharmDB().longest_alternative_list() == []
+
+# Porównanie z programowaniem dynamicznym (przy remisie najwcześniej dodany następnik)
+lengths = {}
+for order in range(db9.next_id_number - 1, 0, -1):
+    best = (1, None)
+    for nxt in sorted(db9.reverse_substitutes.get(order, ())):
+        if lengths[nxt][0] + 1 > best[0]:
+            best = (lengths[nxt][0] + 1, nxt)
+    lengths[order] = best
+for order in range(1, db9.next_id_number):
+    drug_id = db9.format_drug_id(order)
+    assert db9.chain_length(drug_id) == lengths[order][0]
+    chain = db9.longest_chain_from(drug_id)
+    assert len(chain) == lengths[order][0]
+    assert chain[1:2] == ([db9.format_drug_id(lengths[order][1])] if lengths[order][1] else [])
+
+# Przyrostowo budowany indeks daje to samo co zbudowany od zera
+db10 = PharmDB()
+db10.longest_alternative_list()
+load_catalogue(db10, generate_catalogue(300, substitution_degree=4, n_diseases=5, seed=3))
+assert db10.chains.length == db9.chains.length and db10.chains.next == db9.chains.next
+assert db10.longest_alternative_list() == db9.longest_alternative_list()
+assert db10.top_k_chains(20) == db9.top_k_chains(20)
+print('Testy ciągów zamienników zakończone sukcesem!')
+
+# Słowniki chorób i objawów
+db11 = PharmDB()
+a = db11.add_drug("A", [("grypa", 5), ("ból" + "", 3)], [], [("senność", 1, 10.0)])
+b = db11.add_drug("B", [("gr" + "ypa", 5)], [], [("senność", 2, 20.0), ("wysypka", 3, 1.0)])
+assert db11.disease_names == ["grypa", "ból"] and db11.disease_ids == {"grypa": 0, "ból": 1}
+assert db11.effect_names == ["senność", "wysypka"]
+assert next(iter(db11.drugs_by_id[b].indications)) is db11.disease_names[0]
+
+# Skutki uboczne leków przechowują nazwy objawów ze słownika (także we wsadzie); błędny lek nie dopisuje objawu
+c = db11.add_drug("C", [], [], [("".join(["sen", "ność"]), 1, 5.0)])
+with db11.batch():
+    d = db11.add_drug("D", [], [], [("".join(["wys", "ypka"]), 1, 5.0), ("".join(["kaszel"]), 1, 2.0)])
+    e = db11.add_drug("E", [], [], [("".join(["kasz", "el"]), 2, 1.0)])
+assert db11.drugs_by_id[c].side_effects[0][0] is db11.effect_names[0]
+assert db11.drugs_by_id[d].side_effects[0][0] is db11.effect_names[1]
+assert db11.drugs_by_id[e].side_effects[0][0] is db11.drugs_by_id[d].side_effects[1][0] is db11.effect_names[2]
+try:
+    db11.add_drug("Zły", [], ["D9999"], [("nowy_objaw", 1, 1.0)])
+    assert False
+except Exception:
+    pass
+assert db11.effect_names == ["senność", "wysypka", "kaszel"]
+
+# Odrzucony lek (skuteczność spoza 1-10) nie dopisuje choroby do słownika ani kopców
+diseases11 = (dict(db11.disease_ids), list(db11.disease_names), len(db11.indication_heap), list(db11.best_drug_for_disease))
+try:
+    db11.add_drug("Zły", [("grypa", 4), ("nowa_choroba", 11)], [], [])
+    assert False
+except IndexError:
+    pass
+assert (db11.disease_ids, db11.disease_names, len(db11.indication_heap), list(db11.best_drug_for_disease)) == diseases11
+assert db11.find_best_drug_for_indication("nowa_choroba") is None
+c11 = db11.add_drug("F", [("".join(["nowa_", "choroba"]), 7), ("nowa_choroba", 9)], [], [])
+assert next(iter(db11.drugs_by_id[c11].indications)) is db11.disease_names[-1] == "nowa_choroba"
+assert db11.find_best_drug_for_indication("nowa_choroba") == c11
+assert db11.find_best_drug_for_indication("grypa") == b
+assert db11.find_best_drug_for_indication("nieznana") is None
+db11.update_best_indication("nieznana", 3)
+db11.recompute_risk_scores()
+assert db11.worst_side_effect(b) == "wysypka" and db11.worst_side_effect(a) == "senność"
+
+# Spakowane kopce dają to samo co przegląd wszystkich leków
+import random
+rng = random.Random(7)
+db12 = PharmDB()
+load_catalogue(db12, generate_catalogue(400, substitution_degree=0, n_diseases=30, seed=7))
+for _ in range(500):
+    disease = f"choroba_{rng.randrange(30)}"
+    db12.update_best_indication(disease, rng.randint(1, 10))
+    for name in db12.disease_names:
+        best = max(((d.indications[name], d.insert_order) for d in db12.drugs_by_order[1:] if name in d.indications),
+                   default=None)
+        assert db12.find_best_drug_for_indication(name) == (db12.format_drug_id(best[1]) if best else None)
+print('Testy słowników chorób zakończone sukcesem!')
+
+# Ocena schematu leczenia
+db13 = PharmDB()
+r1 = db13.add_drug("R1", [], [], [("senność", 2, 10.0), ("nudności", 1, 5.0)])
+r2 = db13.add_drug("R2", [], [r1], [("senność", 1, 1.0)])
+r3 = db13.add_drug("R3", [], [], [("nudności", 3, 2.0)])
+r4 = db13.add_drug("R4", [], [r2, r3], [])
+result = db13.regimen_risk([r1, r3, "D9999", r1])
+assert result["risk"] == db13.risk_score(r1) + db13.risk_score(r3)
+assert result["worst_effects"] == ["senność", "nudności"]
+assert result["overlapping_effects"] == {"nudności": [r1, r3]}
+assert result["alternatives"] == {r1: r4, r3: r4}
+assert db13.regimen_risk([r4])["alternatives"] == {r4: None}
+assert db13.regimen_risk([]) == {"risk": 0.0, "worst_effects": [], "overlapping_effects": {}, "alternatives": {}}
+
+# Wsadowy BFS daje te same zamienniki co find_best_alternative
+for steps in (0, 1, 3):
+    regimen = [db9.format_drug_id(o) for o in range(1, db9.next_id_number, 7)]
+    alternatives = db9.regimen_risk(regimen, steps)["alternatives"]
+    for drug_id in regimen:
+        best = db9.find_best_alternative(drug_id, steps)
+        assert alternatives[drug_id] == (best if best != drug_id else None)
+print('Testy schematów leczenia zakończone sukcesem!')
+
+# Front Pareto zamienników (skuteczność dla choroby, ryzyko)
+db14 = PharmDB()
+p1 = db14.add_drug("P1", [("astma", 5)], [], [("kaszel", 1, 1.0)])
+p2 = db14.add_drug("P2", [("astma", 8)], [p1], [("kaszel", 2, 5.0)])        # 8, 10.0
+p3 = db14.add_drug("P3", [("astma", 6)], [p1], [("kaszel", 1, 2.0)])        # 6, 2.0
+p4 = db14.add_drug("P4", [("astma", 6)], [p1], [("kaszel", 1, 3.0)])        # zdominowany przez P3
+p5 = db14.add_drug("P5", [("grypa", 9)], [p2], [])                          # nie leczy astmy
+p6 = db14.add_drug("P6", [("astma", 8)], [p5], [("kaszel", 3, 2.0)])        # 8, 6.0 — dominuje P2
+p7 = db14.add_drug("P7", [("astma", 6)], [p1], [("kaszel", 2, 1.0)])        # ta sama para co P3, dodany później
+assert db14.pareto_alternatives(p1, "astma", 1) == [(p2, 8, 10.0), (p3, 6, 2.0)]
+assert db14.pareto_alternatives(p1, "astma", 3) == [(p6, 8, 6.0), (p3, 6, 2.0)]
+assert db14.pareto_alternatives(p6, "astma") == []
+assert db14.pareto_alternatives(p1, "nieznana") is None
+
+# Porównanie z BFS i filtrowaniem
+from collections import deque
+
+def naive_pareto(db, drug_id, disease, steps):
+    start = db.order_of(drug_id)
+    level = {start: 0}
+    queue = deque([start])
+    while queue:
+        current = queue.popleft()
+        if level[current] < steps:
+            for neighbor in db.reverse_substitutes.get(current, ()):
+                if neighbor not in level:
+                    level[neighbor] = level[current] + 1
+                    queue.append(neighbor)
+    points = {}
+    for order, depth in level.items():
+        efficacy = db.drugs_by_order[order].indications.get(disease)
+        if order != start and efficacy is not None:
+            key = (efficacy, db.drugs_by_order[order].risk_score)
+            points[key] = min(points.get(key, (depth, order)), (depth, order))
+    front = [(e, r, o) for (e, r), (_, o) in points.items()
+             if not any(e2 >= e and r2 <= r and (e2, r2) != (e, r) for e2, r2 in points)]
+    return [(db.format_drug_id(o), e, r) for e, r, o in sorted(front, key=lambda p: -p[0])]
+
+for o in range(1, db9.next_id_number, 11):
+    for disease in ("choroba_0", "choroba_3"):
+        for steps in (1, 2, 4):
+            assert db9.pareto_alternatives(db9.format_drug_id(o), disease, steps) == naive_pareto(db9, db9.format_drug_id(o), disease, steps)
+print('Testy frontu Pareto zakończone sukcesem!')
+
+# k najlepszych leków dla choroby
+for name in db12.disease_names:
+    expected = sorted(((d.indications[name], d.insert_order) for d in db12.drugs_by_order[1:] if name in d.indications),
+                      reverse=True)
+    assert db12.top_k_drugs_for_indication(name, 5) == [db12.format_drug_id(o) for _, o in expected[:5]]
+    assert db12.top_k_drugs_for_indication(name, 1000) == [db12.format_drug_id(o) for _, o in expected]
+assert db12.top_k_drugs_for_indication("nieznana", 3) == []
+print('Testy k najlepszych leków zakończone sukcesem!')
+
+# Zapytania złożone z planerem
+import random
+
+db15 = PharmDB()
+load_catalogue(db15, generate_catalogue(600, 3, n_diseases=30, n_side_effects=40, seed=15))
+for _ in range(40):
+    db15.update_best_indication(f"choroba_{_ % 30}", _ % 10 + 1)      # nieaktualne wpisy w kopcach
+
+
+def naive_query(db, disease=None, min_efficacy=1, max_risk=None, max_side_effect_level=None, replaces=None,
+                max_steps=2):
+    reachable = None
+    if replaces is not None:
+        start = db.order_of(replaces)
+        reachable = set()
+        frontier = {start}
+        for _ in range(max_steps):
+            frontier = {n for c in frontier for n in db.reverse_substitutes.get(c, ())} - reachable - {start}
+            reachable |= frontier
+    result = set()
+    for drug in db.drugs_by_order[1:]:
+        if disease is not None and drug.indications.get(disease, 0) < max(1, min_efficacy):
+            continue
+        if max_risk is not None and drug.risk_score > max_risk:
+            continue
+        if max_side_effect_level is not None and any(level > max_side_effect_level for _, level, _ in drug.side_effects):
+            continue
+        if reachable is not None and drug.insert_order not in reachable:
+            continue
+        result.add(drug.id)
+    return result
+
+
+rng = random.Random(15)
+drivers_used = set()
+for _ in range(300):
+    conditions = {}
+    if rng.random() < 0.6:
+        conditions["disease"] = f"choroba_{rng.randrange(30)}"
+        conditions["min_efficacy"] = rng.randint(1, 10)
+    if rng.random() < 0.5:
+        conditions["max_risk"] = rng.uniform(0, 8)
+    if rng.random() < 0.4:
+        conditions["max_side_effect_level"] = rng.randint(1, 3)
+    if rng.random() < 0.5:
+        conditions["replaces"] = db15.format_drug_id(rng.randint(1, 600))
+        conditions["max_steps"] = rng.randint(0, 4)
+    query = db15.query(**conditions)
+    drivers_used.add(query.plan().driver)
+    result = list(query)
+    assert len(result) == len(set(result)) and set(result) == naive_query(db15, **conditions)
+assert drivers_used == {"disease", "substitutes", "scan"}
+
+# Wybór źródła i strumieniowanie
+plan = db15.query(disease="choroba_1", min_efficacy=9, max_risk=3.0, replaces="D0002", max_steps=4).plan()
+assert plan.driver == "disease" and plan.filters == ["max_risk", "replaces"]
+assert set(plan.estimates) == {"disease", "substitutes", "scan"}
+plan = db15.query(disease="choroba_1", max_risk=3.0, replaces="D0580").plan()
+assert plan.driver == "substitutes" and plan.filters == ["max_risk", "disease"]
+assert db15.query(max_risk=1.0).plan().driver == "scan"
+assert db15.query(disease="nieznana").plan().driver == "empty" and list(db15.query(disease="nieznana")) == []
+assert list(db15.query(replaces="D9999")) == []
+stream = iter(db15.query(disease="choroba_2"))
+assert next(stream) == db15.find_best_drug_for_indication("choroba_2")
+assert list(db15.query(disease="choroba_2", min_efficacy=5)) == [
+    d for d in db15.top_k_drugs_for_indication("choroba_2", 600)
+    if db15.drugs_by_id[d].indications["choroba_2"] >= 5]
+
+db15.enable_instrumentation()
+assert len(list(db15.query(disease="choroba_3", min_efficacy=8))) > 0
+assert db15.instrumentation_stats()["counters"]["query_candidates_scanned"]["total"] == len(
+    list(db15.query(disease="choroba_3", min_efficacy=8)))
+db15.disable_instrumentation()
+print('Testy zapytań złożonych zakończone sukcesem!')
+
+# Rankingi według liczby zamienników
+db16 = PharmDB()
+rows16 = generate_catalogue(700, 4, n_diseases=12, seed=16)
+ids16 = load_catalogue(db16, rows16[:400])
+
+
+def naive_ranking(db, degree, disease=None):
+    drugs = [d for d in db.drugs_by_order[1:] if disease is None or disease in d.indications]
+    return sorted(drugs, key=lambda d: (-degree(d), d.insert_order))
+
+
+def check_rankings(db):
+    for disease in [None, "choroba_0", "choroba_7"]:
+        for method, counter, degree in [
+                (db.most_replaceable_drugs, db.count_drugs_by_replacers, lambda d: len(d.replaced_by)),
+                (db.most_versatile_drugs, db.count_drugs_by_substitutes, lambda d: len(d.substitutes))]:
+            expected = naive_ranking(db, degree, disease)
+            for k in (0, 1, 10, 1000):
+                assert method(k, disease) == [d.id for d in expected[:k]]
+            for low, high in [(0, 0), (1, 3), (2, 100), (5, 2)]:
+                assert counter(low, high, disease) == sum(1 for d in expected if low <= degree(d) <= high)
+
+
+check_rankings(db16)                                    # budowa indeksu dla istniejących leków
+for name, indications, substitutes, side_effects in rows16[400:550]:
+    ids16.append(db16.add_drug(name, indications, [ids16[j] for j in substitutes], side_effects))
+check_rankings(db16)                                    # utrzymanie przyrostowe
+with db16.batch():
+    for name, indications, substitutes, side_effects in rows16[550:]:
+        ids16.append(db16.add_drug(name, indications, [ids16[j] for j in substitutes], side_effects))
+check_rankings(db16)                                    # transakcja wsadowa
+assert db16.most_replaceable_drugs(3, "nieznana") == [] and db16.count_drugs_by_substitutes(0, 9, "nieznana") == 0
+print('Testy rankingów zamienników zakończone sukcesem!')
+
+# Podobieństwo profili wskazań
+import math
+
+import pharmdb_similarity
+
+db17 = PharmDB()
+rows17 = generate_catalogue(500, 2, n_diseases=15, seed=17)
+ids17 = load_catalogue(db17, rows17[:300])
+
+
+def naive_similar(db, drug_id, k, missing_only=False):
+    drug = db.drugs_by_id[drug_id]
+    norm = math.sqrt(sum(e * e for e in drug.indications.values()))
+    scored = []
+    for other in db.drugs_by_order[1:]:
+        if other is drug or (missing_only and (other.insert_order in drug.substitutes | drug.replaced_by)):
+            continue
+        dot = sum(e * other.indications.get(name, 0) for name, e in drug.indications.items())
+        if dot:
+            sim = dot / (norm * math.sqrt(sum(e * e for e in other.indications.values())))
+            scored.append((-sim, other.insert_order, other.id, sim))
+    return [(other_id, sim) for _, _, other_id, sim in sorted(scored)[:k]]
+
+
+def check_similar(db, ids):
+    for threshold in (10 ** 9, 0):                    # słownik / NumPy
+        pharmdb_similarity.NUMPY_MIN_COLUMN = threshold
+        batch = db.similar_drugs_batch(ids[::7], 6, missing_only=True)
+        for drug_id in ids[::7]:
+            for k, missing_only in [(1, False), (6, False), (1000, False)]:
+                got = db.similar_drugs(drug_id, k, missing_only)
+                want = naive_similar(db, drug_id, k, missing_only)
+                assert [i for i, _ in got] == [i for i, _ in want]
+                assert all(abs(a[1] - b[1]) < 1e-12 for a, b in zip(got, want))
+            assert [i for i, _ in batch[drug_id]] == [i for i, _ in naive_similar(db, drug_id, 6, True)]
+    pharmdb_similarity.NUMPY_MIN_COLUMN = 256
+
+
+check_similar(db17, ids17)                              # budowa macierzy dla istniejących leków
+for name, indications, substitutes, side_effects in rows17[300:400]:
+    ids17.append(db17.add_drug(name, indications, [ids17[j] for j in substitutes], side_effects))
+with db17.batch():
+    for name, indications, substitutes, side_effects in rows17[400:]:
+        ids17.append(db17.add_drug(name, indications, [ids17[j] for j in substitutes], side_effects))
+for i in range(15):
+    db17.update_best_indication(f"choroba_{i}", (i * 7) % 10 + 1)
+check_similar(db17, ids17)                              # dopisywanie wierszy i aktualizacje skuteczności
+assert db17.similar_drugs("D9999", 3) is None
+empty = db17.add_drug("Bez wskazań", [], [], [])
+assert db17.similar_drugs(empty, 3) == []
+print('Testy podobieństwa profili zakończone sukcesem!')
+
+# Najbezpieczniejsze leki dla choroby z progiem skuteczności
+from pharmdb import RiskModel
+
+db18 = PharmDB()
+rows18 = generate_catalogue(600, 2, n_diseases=10, seed=18)
+ids18 = load_catalogue(db18, rows18[:300])
+
+
+def check_safest(db):
+    for disease in ("choroba_0", "choroba_4", "choroba_9"):
+        for floor in (1, 5, 9, 10, 11):
+            expected = sorted((d.risk_score, d.insert_order, d.id) for d in db.drugs_by_order[1:]
+                              if d.indications.get(disease, 0) >= floor)
+            assert db.safest_drug_for_indication(disease, floor) == (expected[0][2] if expected else None)
+            for k in (0, 3, 1000):
+                assert db.top_k_safest_drugs(disease, k, floor) == [i for _, _, i in expected[:k]]
+
+
+check_safest(db18)
+for name, indications, substitutes, side_effects in rows18[300:450]:
+    ids18.append(db18.add_drug(name, indications, [ids18[j] for j in substitutes], side_effects))
+with db18.batch():
+    for name, indications, substitutes, side_effects in rows18[450:]:
+        ids18.append(db18.add_drug(name, indications, [ids18[j] for j in substitutes], side_effects))
+for i in range(30):
+    db18.update_best_indication(f"choroba_{i % 10}", (i * 3) % 10 + 1)
+check_safest(db18)
+db18.set_risk_model(RiskModel({1: 5, 2: 1, 3: 2}))
+check_safest(db18)
+assert db18.safest_drug_for_indication("nieznana") is None and db18.top_k_safest_drugs("nieznana", 3) == []
+print('Testy najbezpieczniejszych leków zakończone sukcesem!')
+
+# Dodawanie relacji zamiany po fakcie (add_substitutes)
+import random
+
+z1 = PharmDB()
+s1 = z1.add_drug("S1", [("astma", 4)], [], [])
+s2 = z1.add_drug("S2", [("astma", 6)], [], [])
+s3 = z1.add_drug("S3", [("astma", 5)], [s2], [])
+assert z1.add_substitutes([(s1, s3), (s1, s3)]) == 1     # S1 zastępuje nowszy S3 (duplikat pominięty)
+assert z1.topological_position(z1.order_of(s3)) < z1.topological_position(z1.order_of(s1))
+assert z1.can_replace(s1, s2) and z1.number_of_alternative_drugs(s3) == 1
+assert z1.longest_alternative_list() == [s2, s3, s1] and z1.most_versatile_drugs(1) == [s1]
+before = {b: set(a) for b, a in z1.reverse_substitutes.items()}
+try:
+    z1.add_substitutes([(s3, s1), (s2, s1)])            # ...a S2 zastępujący S1 zamyka cykl S1 → S3 → S2 → S1
+    assert False
+except ValueError:
+    pass
+assert z1.reverse_substitutes == before and not z1.drugs_by_id[s3].substitutes & {z1.order_of(s1)}
+for bad in ([(s1, s1)], [(s1, "D9999")]):
+    try:
+        z1.add_substitutes(bad)
+        assert False
+    except Exception:
+        pass
+with z1.batch():
+    try:
+        z1.add_substitutes([(s2, s1)])
+        assert False
+    except RuntimeError:
+        pass
+
+
+def reachable_from(db, order):
+    seen = set()
+    stack = [order]
+    while stack:
+        for neighbor in db.reverse_substitutes.get(stack.pop(), ()):
+            if neighbor not in seen:
+                seen.add(neighbor)
+                stack.append(neighbor)
+    return seen
+
+
+def check_graph(db):
+    drugs = db.drugs_by_order
+    n = db.next_id_number
+    for drug in drugs[1:]:
+        for sub in drug.substitutes:
+            assert drug.insert_order in drugs[sub].replaced_by
+            assert db.topological_position(sub) < db.topological_position(drug.insert_order)
+    assert sorted(db.topological_position(order) for order in range(1, n)) == list(range(1, n))
+
+    # Długości ciągów i następniki (przy remisie najwcześniej dodany) z programowania dynamicznego
+    length = [0] * n
+    following = [None] * n
+    for order in sorted(range(1, n), key=db.topological_position, reverse=True):
+        best = max(((length[o], -o) for o in db.reverse_substitutes.get(order, ())), default=(0, None))
+        length[order] = best[0] + 1
+        following[order] = -best[1] if best[1] is not None else None
+    for order in range(1, n):
+        assert db.chain_length(drugs[order].id) == length[order]
+        assert db.chains.next[order] == following[order]
+    assert len(db.longest_alternative_list()) == max(length[1:])
+    starts = sorted(range(1, n), key=lambda order: (-length[order], order))
+    assert [chain[0] for chain in db.top_k_chains(25)] == [drugs[order].id for order in starts[:25]]
+    assert db.top_k_chains(0) == db.top_k_chains(0, disjoint=True) == []
+
+    rng = random.Random(n)
+    for source in rng.sample(range(1, n), 40):
+        reach = reachable_from(db, source)
+        for target in range(1, n):
+            assert db.can_replace(drugs[target].id, drugs[source].id) == (target in reach)
+
+    for ranking, degree in ((db.most_replaceable_drugs, lambda d: len(d.replaced_by)),
+                            (db.most_versatile_drugs, lambda d: len(d.substitutes))):
+        for disease in (None, "choroba_1"):
+            expected = sorted((-degree(d), d.insert_order, d.id) for d in drugs[1:]
+                              if disease is None or disease in d.indications)
+            assert ranking(25, disease) == [i for _, _, i in expected[:25]]
+
+
+rng = random.Random(19)
+rows19 = generate_catalogue(400, 2, n_diseases=6, seed=19)
+db19 = PharmDB()
+ids19 = load_catalogue(db19, rows19[:300])
+db19.reachability = db19.register_index(ReachabilityIndex(db19, label_limit=3))   # małe etykiety — też przeszukiwanie zapasowe
+db19.most_replaceable_drugs(1)
+db19.longest_alternative_list()
+rejected = 0
+for step in range(60):
+    pairs = [tuple(rng.sample(ids19, 2)) for _ in range(10)]
+    before = {b: set(a) for b, a in db19.reverse_substitutes.items()}
+    try:
+        db19.add_substitutes(pairs)
+    except ValueError:
+        rejected += 1
+        assert db19.reverse_substitutes == before
+    if step == 30:
+        for name, indications, substitutes, side_effects in rows19[300:]:
+            ids19.append(db19.add_drug(name, indications, [ids19[j] for j in substitutes], side_effects))
+assert rejected and db19.topological is not None
+check_graph(db19)
+
+# Indeksy budowane po dodaniu relacji (rejestracja w porządku topologicznym) i eksport/import
+from pharmdb_io import export_catalogue, import_catalogue
+import tempfile
+
+with tempfile.TemporaryDirectory() as directory:
+    export_catalogue(db19, directory, chunk_size=128)
+    db19b = PharmDB()
+    assert import_catalogue(db19b, directory) == len(ids19)
+assert db19b.reverse_substitutes == db19.reverse_substitutes
+check_graph(db19b)
+print('Testy dodawania relacji zamiany zakończone sukcesem!')
+
+# Zamrożona baza do odczytu (freeze)
+rows20 = generate_catalogue(500, 3, n_diseases=12, seed=20)
+db20 = PharmDB()
+ids20 = load_catalogue(db20, rows20[:400])
+with db20.batch():
+    for name, indications, substitutes, side_effects in rows20[400:]:
+        ids20.append(db20.add_drug(name, indications, [ids20[j] for j in substitutes], side_effects))
+db20.add_substitutes([(ids20[a], ids20[b]) for a, b in ((10, 300), (20, 450), (5, 499), (60, 200))
+                      if not db20.can_replace(ids20[b], ids20[a])])
+assert db20.topological is not None
+for i in range(40):
+    db20.update_best_indication(f"choroba_{i % 12}", (i * 7) % 10 + 1)
+
+
+def check_frozen(db, frozen, ids):
+    probes = ids + ["D9999", "X1"]
+    for drug_id in probes:
+        for m in range(11):
+            assert frozen.number_of_indications(drug_id, m) == db.number_of_indications(drug_id, m)
+        assert frozen.number_of_alternative_drugs(drug_id) == db.number_of_alternative_drugs(drug_id)
+        assert frozen.worst_side_effect(drug_id) == db.worst_side_effect(drug_id)
+        assert frozen.risk_score(drug_id) == db.risk_score(drug_id)
+        assert frozen.chain_length(drug_id) == db.chain_length(drug_id)
+        assert frozen.longest_chain_from(drug_id) == db.longest_chain_from(drug_id)
+        assert frozen.order_of(drug_id) == db.order_of(drug_id)
+        for steps in (0, 1, 2, 4):
+            assert frozen.find_best_alternative(drug_id, steps) == db.find_best_alternative(drug_id, steps)
+    for drug_id in probes:
+        for other_id in probes[::7] + probes[-2:]:
+            assert frozen.can_replace(drug_id, other_id) == db.can_replace(drug_id, other_id)
+    assert frozen.longest_alternative_list() == db.longest_alternative_list()
+    for disease in db.disease_names + ["nieznana"]:
+        assert frozen.find_best_drug_for_indication(disease) == db.find_best_drug_for_indication(disease)
+        for k in (0, 1, 5, 1000):
+            assert frozen.top_k_drugs_for_indication(disease, k) == db.top_k_drugs_for_indication(disease, k)
+
+    # Zapytania korzystające w PharmDB z leniwych indeksów pomocniczych
+    diseases = db.disease_names[::3] + ["nieznana"]
+    for k in (-1, 0, 1, 3, 1000):
+        for disjoint in (False, True):
+            assert frozen.top_k_chains(k, disjoint) == db.top_k_chains(k, disjoint)
+    for disease in [None] + diseases:
+        for k in (0, 1, 7, 1000):
+            assert frozen.most_replaceable_drugs(k, disease) == db.most_replaceable_drugs(k, disease)
+            assert frozen.most_versatile_drugs(k, disease) == db.most_versatile_drugs(k, disease)
+        for low, high in ((0, 0), (1, 2), (2, 1), (-3, 100), (3, 3)):
+            assert frozen.count_drugs_by_replacers(low, high, disease) == db.count_drugs_by_replacers(low, high, disease)
+            assert (frozen.count_drugs_by_substitutes(low, high, disease)
+                    == db.count_drugs_by_substitutes(low, high, disease))
+    for disease in diseases:
+        for min_efficacy in (-1, 1, 5, 10, 11):
+            assert (frozen.safest_drug_for_indication(disease, min_efficacy)
+                    == db.safest_drug_for_indication(disease, min_efficacy))
+            for k in (0, 1, 4, 1000):
+                assert frozen.top_k_safest_drugs(disease, k, min_efficacy) == db.top_k_safest_drugs(disease, k, min_efficacy)
+    assert frozen.similar_drugs_batch(probes, 5) == db.similar_drugs_batch(probes, 5)
+    assert frozen.similar_drugs_batch(probes, 3, True) == db.similar_drugs_batch(probes, 3, True)
+    for drug_id in probes[::5] + probes[-2:]:
+        assert frozen.similar_drugs(drug_id, 4) == db.similar_drugs(drug_id, 4)
+        for disease in diseases:
+            for steps in (1, 3):
+                assert frozen.pareto_alternatives(drug_id, disease, steps) == db.pareto_alternatives(drug_id, disease, steps)
+            for cost in ("sum", "max"):
+                assert (frozen.cheapest_substitution_path(drug_id, disease, 4, cost, None)
+                        == db.cheapest_substitution_path(drug_id, disease, 4, cost, None))
+                assert (frozen.cheapest_substitution_path(drug_id, disease, 1, cost, 1.5)
+                        == db.cheapest_substitution_path(drug_id, disease, 1, cost, 1.5))
+        for target_id in probes[::41] + probes[-1:]:
+            for bidirectional in (True, False):
+                for max_risk in (None, 2.0):
+                    assert (frozen.substitution_path(drug_id, target_id, "sum", max_risk, bidirectional)
+                            == db.substitution_path(drug_id, target_id, "sum", max_risk, bidirectional))
+            assert frozen.substitution_path(drug_id, target_id, "max") == db.substitution_path(drug_id, target_id, "max")
+    for regimen in (probes[:4], probes[3:9] + probes[3:5], probes[-3:], []):
+        for steps in (0, 2):
+            assert frozen.regimen_risk(regimen, steps) == db.regimen_risk(regimen, steps)
+    for conditions in ({"disease": "choroba_1", "min_efficacy": 6}, {"max_risk": 1.5, "max_side_effect_level": 2},
+                       {"disease": "choroba_2", "max_risk": 3.0}, {"disease": "nieznana"}, {}):
+        plan = db.query(**conditions).plan()
+        assert frozen.query(**conditions).plan() == plan
+        assert list(frozen.query(**conditions)) == list(db.query(**conditions))
+    for drug_id in probes[::50]:
+        for conditions in ({"replaces": drug_id}, {"replaces": drug_id, "max_steps": 1, "disease": "choroba_0"}):
+            assert sorted(frozen.query(**conditions)) == sorted(db.query(**conditions))
+
+
+frozen20 = db20.freeze()
+check_frozen(db20, frozen20, ids20)
+for write in (lambda: frozen20.add_drug("Nowy", [], [], []),
+              lambda: frozen20.update_best_indication("choroba_0", 1),
+              lambda: frozen20.add_substitutes([(ids20[1], ids20[2])])):
+    try:
+        write()
+        assert False
+    except RuntimeError:
+        pass
+
+# Zmiany bazy po zamrożeniu nie wpływają na kopię
+best_before = frozen20.find_best_drug_for_indication("choroba_0")
+db20.add_drug("Późniejszy", [("choroba_0", 10)], [ids20[0]], [])
+db20.update_best_indication("choroba_0", 10)
+assert frozen20.find_best_drug_for_indication("choroba_0") == best_before
+assert frozen20.number_of_alternative_drugs(ids20[0]) == db20.number_of_alternative_drugs(ids20[0]) - 1
+check_frozen(PharmDB(), PharmDB().freeze(), [])
+check_frozen(db19, db19.freeze(), ids19)                # małe etykiety — przeszukiwanie zapasowe po CSR
+assert db20.can_replace(db20.drugs_by_order[-1].id, ids20[0]) != frozen20.can_replace(db20.drugs_by_order[-1].id, ids20[0])
+print('Testy zamrożonej bazy zakończone sukcesem!')
+
+# Replikacja przyrostowa: export_delta / apply_delta
+import itertools
+from pharmdb_shared import SECTIONS, _build_sections
+
+
+def snapshot_bytes(db):
+    sections = _build_sections(db)
+    return b"".join(sections[name].tobytes() for name, _ in SECTIONS)
+
+
+def full_rebuild(db):
+    with tempfile.TemporaryDirectory() as directory:
+        export_catalogue(db, directory, chunk_size=100)
+        rebuilt = type(db)()
+        import_catalogue(rebuilt, directory)
+    return rebuilt
+
+
+rng = random.Random(21)
+rows21 = generate_catalogue(700, 3, n_diseases=15, n_side_effects=20, seed=21)
+db21 = PharmDB()
+ids21 = load_catalogue(db21, rows21[:300])
+assert db21.version == 300 and db21.export_delta(300) != db21.export_delta(0)
+replica21 = PharmDB()
+assert replica21.apply_delta(db21.export_delta(0)) == 300
+replica21.can_replace(ids21[0], ids21[1])               # indeksy leniwe repliki utrzymywane przy kolejnych zmianach
+replica21.longest_alternative_list()
+chained21 = PharmDB()
+chained21.apply_delta(replica21.export_delta(0))        # replika repliki
+rows_left = iter(rows21[300:])
+for step in range(8):
+    since = db21.version
+    for name, indications, substitutes, side_effects in itertools.islice(rows_left, rng.randint(0, 40)):
+        ids21.append(db21.add_drug(name, indications, [ids21[j] for j in substitutes], side_effects))
+    if step % 3 == 1:
+        with db21.batch():
+            for name, indications, substitutes, side_effects in itertools.islice(rows_left, 20):
+                ids21.append(db21.add_drug(name, indications, [ids21[j] for j in substitutes], side_effects))
+    for _ in range(rng.randint(0, 30)):
+        db21.update_best_indication(f"choroba_{rng.randrange(15)}", rng.randint(1, 10))
+    for a, b in (rng.sample(range(len(ids21)), 2) for _ in range(6)):
+        if not db21.can_replace(ids21[b], ids21[a]):
+            db21.add_substitutes([(ids21[a], ids21[b])])
+    if step == 4:
+        db21.set_risk_model(RiskModel({1: 1, 2: 4, 3: 9}, frequency_factor=0.5))
+    blob = db21.export_delta(since)
+    assert replica21.apply_delta(blob) == db21.version == replica21.version
+    assert snapshot_bytes(replica21) == snapshot_bytes(db21) == snapshot_bytes(full_rebuild(db21))
+    assert replica21.reverse_substitutes == db21.reverse_substitutes
+    for drug_id in rng.sample(ids21, 20):
+        assert replica21.chain_length(drug_id) == db21.chain_length(drug_id)
+        assert replica21.can_replace(drug_id, ids21[0]) == db21.can_replace(drug_id, ids21[0])
+    assert replica21.longest_alternative_list() == db21.longest_alternative_list()
+    chained21.apply_delta(replica21.export_delta(since))
+    assert snapshot_bytes(chained21) == snapshot_bytes(db21)
+
+# Zestaw zmian zawiera tylko zmiany: kolejne zmiany tej samej skuteczności są scalane
+db21.add_drug("Przełączany", [("choroba_rzadka", 5)], [], [])
+since = db21.version
+assert len(db21.export_delta(since)) == len(PharmDB().export_delta(0))
+db21.update_best_indication("choroba_rzadka", 7)
+single_change = db21.export_delta(since)
+for _ in range(50):
+    db21.update_best_indication("choroba_rzadka", 3)
+    db21.update_best_indication("choroba_rzadka", 7)
+assert db21.version - since == 101 and db21.export_delta(since)[24:] == single_change[24:]   # bez nagłówka wersji
+
+# Niepasująca wersja lub uszkodzony zestaw zmian
+for blob, replica in ((db21.export_delta(since), PharmDB()), (b"PHDB", PharmDB()),
+                      (PharmDB().export_delta(0)[:-1] + b"\0\0", PharmDB())):
+    try:
+        replica.apply_delta(blob)
+        assert False
+    except ValueError:
+        pass
+for since in (-1, db21.version + 1):
+    try:
+        db21.export_delta(since)
+        assert False
+    except ValueError:
+        pass
+
+# Zestaw zmian sprawdzany w całości przed nałożeniem: błąd w dowolnej sekcji nie zmienia repliki
+from array import array
+from pharmdb_delta import SECTIONS as DELTA_SECTIONS, _HEADER as DELTA_HEADER
+
+
+def tamper(blob, **changes):
+    header = DELTA_HEADER.unpack_from(blob)
+    offset = DELTA_HEADER.size
+    parts = []
+    for (name, typecode), length in zip(DELTA_SECTIONS, header[4:]):
+        data = array(typecode)
+        data.frombytes(blob[offset:offset + length * data.itemsize])
+        offset += length * data.itemsize
+        parts.append(array(typecode, changes.get(name, data)))
+    return DELTA_HEADER.pack(*header[:4], *map(len, parts)) + b"".join(part.tobytes() for part in parts)
+
+
+source22 = PharmDB()
+a22 = source22.add_drug("A", [("astma", 5)], [], [("kaszel", 1, 2.0)])
+b22 = source22.add_drug("B", [("astma", 6)], [a22], [("kaszel", 2, 1.0)])
+replica22 = PharmDB()
+replica22.apply_delta(source22.export_delta(0))
+since22 = source22.version
+c22 = source22.add_drug("C", [("grypa", 4)], [b22], [("ból", 3, 1.0)])
+source22.add_substitutes([(c22, a22)])
+source22.update_best_indication("astma", 2)
+source22.set_risk_model(RiskModel({1: 1, 2: 4, 3: 9}))
+good22 = source22.export_delta(since22)
+assert tamper(good22) == good22
+a_order, b_order = source22.order_of(a22), source22.order_of(b22)
+state22 = (snapshot_bytes(replica22), replica22.version, len(replica22.change_version), replica22.risk_model)
+for blob in (tamper(good22, edge_drug=[a_order], edge_substitute=[b_order]),       # cykl A → B → A
+             tamper(good22, edge_drug=[a_order], edge_substitute=[4]),             # nieznany lek
+             tamper(good22, edge_drug=[a_order], edge_substitute=[a_order]),       # pętla
+             tamper(good22, edge_drug=[a_order, b_order], edge_substitute=[b_order]),
+             tamper(good22, efficacy_drug=[3]),                                     # lek z zestawu
+             tamper(good22, efficacy=[11]),
+             tamper(good22, efficacy_name=[100]),                                  # numer spoza słownika
+             tamper(good22, substitute=[3]),                                        # zamiennik nowszy od leku
+             tamper(good22, indication_efficacy=[12]),
+             tamper(good22, risk_model=[1.0, 1, 1, 2, 4])):                         # brak wagi poziomu 3
+    try:
+        replica22.apply_delta(blob)
+        assert False
+    except ValueError:
+        pass
+    assert (snapshot_bytes(replica22), replica22.version, len(replica22.change_version), replica22.risk_model) == state22
+assert replica22.apply_delta(good22) == source22.version
+assert snapshot_bytes(replica22) == snapshot_bytes(source22)
+print('Testy replikacji przyrostowej zakończone sukcesem!')
@@ -9,10 +9,122 @@ Zmiany wprowadziłem zgodnie z Pana komentarzem podanym w terminie 0, czyli w fu
 '''
 
 import heapq
+from array import array
 from collections import deque
 
+from pharmdb_stats import Instrumentation
+
+
+class RiskModel:
+    '''
+        Model ryzyka wyznaczający risk_score oraz najbardziej dotkliwy skutek uboczny leku.
+
+        Domyślny model odpowiada definicji z zadania: risk = suma(poziom dolegliwości x częstotliwość),
+        a najgorszy skutek to ten o największej częstotliwości spośród skutków o najwyższym poziomie.
+
+        Args:
+            level_weights (dict, optional): waga (dotkliwość) dla poziomu dolegliwości, np. {1: 1, 2: 4, 3: 9};
+                    domyślnie waga równa poziomowi
+            frequency_factor (float, optional): mnożnik częstotliwości (np. korekta dla populacji)
+
+        Własne modele mogą nadpisać metody weight (pojedynczy skutek) oraz contributions
+        (kolumny NumPy) — obie muszą liczyć to samo.
+    '''
+
+    def __init__(self, level_weights=None, frequency_factor=1.0):
+        self.level_weights = level_weights
+        self.frequency_factor = frequency_factor
+
+    def severity(self, level):
+        if self.level_weights is None:
+            return level
+        return self.level_weights[level]
+
+    def weight(self, level, freq):
+        return self.severity(level) * (freq * self.frequency_factor)
+
+    def severities(self, np, levels):
+        if self.level_weights is None:
+            return levels
+        table = np.zeros(max(self.level_weights) + 1)
+        for level, w in self.level_weights.items():
+            table[level] = w
+        return table[levels]
+
+    def contributions(self, np, levels, freqs):
+        return self.severities(np, levels) * (freqs * self.frequency_factor)
+
+
+DEFAULT_RISK_MODEL = RiskModel()
+
+
+# Wpisy kopców wskazań są spakowane w jedną liczbę: (skuteczność << ORDER_BITS) | klucz leku.
+# Większa liczba = większa skuteczność, a przy remisie lek dodany później — dokładnie porządek kopca maksymalnego.
+ORDER_BITS = 40
+ORDER_MASK = (1 << ORDER_BITS) - 1
+
+# Rodzaje wpisów dziennika zmian (export_delta / apply_delta); dodanie leku zapisuje drug_version, nie dziennik
+CHANGE_EFFICACY = 1             # (klucz leku, numer choroby)
+CHANGE_SUBSTITUTE = 2           # (klucz leku, klucz leku zastępowanego)
+CHANGE_RISK_MODEL = 3           # (0, 0) — przenoszony jest bieżący model
+
+
+def _heap_push(heap, key):
+    # Kopiec maksymalny na array('q') (heapq działa tylko na listach)
+    heap.append(key)
+    pos = len(heap) - 1
+    while pos:
+        parent = (pos - 1) >> 1
+        if heap[parent] >= key:
+            break
+        heap[pos] = heap[parent]
+        pos = parent
+    heap[pos] = key
+
+
+def _heapify(heap):
+    # Budowa kopca maksymalnego w miejscu, O(n)
+    n = len(heap)
+    for start in range(n // 2 - 1, -1, -1):
+        item = heap[start]
+        pos = start
+        child = 2 * pos + 1
+        while child < n:
+            if child + 1 < n and heap[child + 1] > heap[child]:
+                child += 1
+            if heap[child] <= item:
+                break
+            heap[pos] = heap[child]
+            pos = child
+            child = 2 * pos + 1
+        heap[pos] = item
+
+
+def _heap_pop(heap):
+    last = heap.pop()
+    if not heap:
+        return last
+    top = heap[0]
+    n = len(heap)
+    pos = 0
+    child = 1
+    while child < n:
+        if child + 1 < n and heap[child + 1] > heap[child]:
+            child += 1
+        if heap[child] <= last:
+            break
+        heap[pos] = heap[child]
+        pos = child
+        child = 2 * pos + 1
+    heap[pos] = last
+    return top
+
+
 class Drug:
-    def __init__(self, drug_id, name, insert_order, indications=None, substitutes=None, side_effects=None):
+    # Relacje substitutes / replaced_by przechowują wewnętrzne klucze całkowite (insert_order),
+    # a nie zewnętrzne identyfikatory tekstowe — porównania i haszowanie to operacje na liczbach
+    def __init__(self, drug_id, name, insert_order, indications=None, substitutes=None, side_effects=None,
+                 risk_model=DEFAULT_RISK_MODEL):
         self.id = drug_id
         self.name = name
         self.indications = {}                   # wskazania w leczeniu (choroba, skuteczność)
@@ -38,32 +150,32 @@ class Drug:
             self.side_effects = []
 
         # Oblicz raz przy dodawaniu wartości (aby potem drugi raz tego nie liczyć)
-        self.risk_score = self._compute_risk_score()
-        self.worst_effect_name = self._compute_worst_effect_name()
+        self.risk_score = self._compute_risk_score(risk_model)
+        self.worst_effect_name = self._compute_worst_effect_name(risk_model)
 
         # Kolejność dodania do bazy (potrzebna przy remisach)
         self.insert_order = insert_order
 
-    def _compute_risk_score(self):
+    def _compute_risk_score(self, risk_model=DEFAULT_RISK_MODEL):
         score = 0.0
         for _, level, freq in self.side_effects:
-            score += level * freq
+            score += risk_model.weight(level, freq)
         return score
 
-    def _compute_worst_effect_name(self):
+    def _compute_worst_effect_name(self, risk_model=DEFAULT_RISK_MODEL):
         if not self.side_effects:
             return None
         # Szukaj najpierw najwyższego poziomu dolegliwości
         max_level = 0
         for effect in self.side_effects:
-            if effect[1] > max_level:
-                max_level = effect[1]
+            if risk_model.severity(effect[1]) > max_level:
+                max_level = risk_model.severity(effect[1])
 
         # Przeszukuj efekty o tym poziomie, szukam tego o największej częstości
         worst_effect = None
         worst_frequency = 0
         for effect in self.side_effects:
-            if effect[1] == max_level:
+            if risk_model.severity(effect[1]) == max_level:
                 if effect[2] > worst_frequency:
                     worst_frequency = effect[2]
                     worst_effect = effect
@@ -71,6 +183,36 @@ class Drug:
         return worst_effect[0] if worst_effect else None
 
 
+class SecondaryIndex:
+    '''
+        Bazowa klasa indeksu pomocniczego rejestrowanego w PharmDB (register_index).
+        Rdzeń wywołuje odpowiednie metody przy każdej zmianie danych, więc nowe indeksy
+        nie wymagają zmian w add_drug, a baza bez zarejestrowanych indeksów nie płaci za nie nic.
+        Podklasy nadpisują tylko potrzebne metody. PharmDB nie usuwa leków, więc indeksy nie mają metody usuwania.
+    '''
+
+    def on_insert(self, drug):
+        '''Wywoływana po dodaniu leku do bazy.'''
+
+    def on_bulk_insert(self, drugs):
+        '''Wywoływana dla wielu leków naraz (np. przy rejestracji indeksu); domyślnie po kolei on_insert.'''
+        for drug in drugs:
+            self.on_insert(drug)
+
+    def on_update(self, drug, disease, old_efficacy, new_efficacy):
+        '''Wywoływana po zmianie skuteczności leku dla choroby.'''
+
+    def on_substitute_added(self, drug, substitute):
+        '''Wywoływana po dodaniu relacji zamiany (add_substitutes): lek drug może zastąpić lek substitute.'''
+
+    def on_bulk_substitutes_added(self, pairs):
+        '''Wywoływana raz dla wszystkich nowych par (drug, substitute) z add_substitutes; domyślnie po kolei on_substitute_added.'''
+        for drug, substitute in pairs:
+            self.on_substitute_added(drug, substitute)
+
+    def on_risk_recomputed(self, db):
+        '''Wywoływana po przeliczeniu risk_score wszystkich leków (zmiana modelu ryzyka).'''
+
 
 class PharmDB:
     '''
@@ -80,6 +222,8 @@ class PharmDB:
 
         Kazdy lek jest opisany następującymi atrybutami:
             - id: unikalny identyfikator nadawany przez system (np. "D0001", "D0002")
+                    wewnętrznie lek jest kluczowany liczbą całkowitą (kolejnością dodania),
+                    zewnętrzny identyfikator to prefiks + numer o stałej szerokości (id_prefix, id_width)
             - name: unikalna nazwa leku (np. "Apap", "Ibuprom")
             - indications: lista wskazań terapeutycznych (chorób) wraz z poziomem skuteczności (skala 1-10)
             - substitutes: lista leków, które mogą być zastąpione przez dany lek
@@ -87,23 +231,287 @@ class PharmDB:
             - side_effects: lista działań niepożądanych (nazwa objawu, poziom dolegliwości 1-3, częstotliwość)
     '''
 
-    def __init__(self):
-        # Słownik leków po identyfikatorze
+    # Metody opakowywane pomiarem czasu po włączeniu instrumentacji
+    INSTRUMENTED_METHODS = (
+        "add_drug", "add_substitutes", "number_of_indications", "number_of_alternative_drugs", "worst_side_effect",
+        "risk_score", "find_best_alternative", "regimen_risk", "pareto_alternatives",
+        "similar_drugs", "similar_drugs_batch",
+        "can_replace", "cheapest_substitution_path", "substitution_path",
+        "longest_alternative_list", "chain_length", "longest_chain_from", "top_k_chains",
+        "most_replaceable_drugs", "most_versatile_drugs", "count_drugs_by_replacers", "count_drugs_by_substitutes",
+        "find_best_drug_for_indication", "top_k_drugs_for_indication", "update_best_indication",
+        "safest_drug_for_indication", "top_k_safest_drugs",
+        "recompute_risk_scores", "export_delta", "apply_delta",
+    )
+
+    def __init__(self, id_prefix="D", id_width=4):
+        # Format zewnętrznych identyfikatorów: prefiks + numer dopełniony zerami do id_width cyfr.
+        # Przy katalogach większych niż 10^id_width leków warto zwiększyć id_width, aby porządek
+        # leksykograficzny identyfikatorów nadal odpowiadał kolejności dodania
+        # (wewnętrznie i tak porównywane są wyłącznie liczby całkowite).
+        self.id_prefix = id_prefix
+        self.id_width = id_width
+
+        # Słownik leków po identyfikatorze zewnętrznym
         self.drugs_by_id = {}
 
-        # Relacje odwrotna zamienników jako graf
+        # Lista leków po kluczu wewnętrznym (kolejności dodania), indeks 0 nieużywany
+        self.drugs_by_order = [None]
+
+        # Relacje odwrotna zamienników jako graf (klucze wewnętrzne)
         self.reverse_substitutes = {}      # B → zbiór A
 
-        # Choroba → (efektywność, ID najnowszego leku)
-        self.best_drug_for_disease = {}
+        # Porządek topologiczny grafu zamian: klucz leku → pozycja (B przed A, jeśli A może zastąpić B).
+        # Dopóki krawędzie dodaje tylko add_drug (do leków starszych), jest nim kolejność dodania i tablica
+        # jest None; add_substitutes tworzy ją przy pierwszej krawędzi do leku nowszego
+        self.topological = None
+
+        # Słowniki nazw chorób i objawów: nazwa → numer, numer → nazwa.
+        # Wewnętrznie choroby i objawy są identyfikowane numerami, a każda nazwa przechowywana jest raz.
+        self.disease_ids = {}
+        self.disease_names = []
+        self.effect_ids = {}
+        self.effect_names = []
 
-        # Choroba → kopiec leków (efektywność, -kolejność, ID), do szybkiej aktualizacji najlepszego
-        self.indication_heap = {}
+        # Numer choroby → spakowany wpis (efektywność, klucz najnowszego leku) najlepszego leku, 0 = brak
+        self.best_drug_for_disease = array('q')
+
+        # Numer choroby → kopiec maksymalny spakowanych wpisów (efektywność, kolejność) w array('q'),
+        # do szybkiej aktualizacji najlepszego
+        self.indication_heap = []
 
         # Numer Generatora ID (numerowany jako D0001, D0002, itd.)
         # Potrzebny jest do rozstrzygania remisów (im większy, tym lek później dodany)
         self.next_id_number = 1
 
+        # Model ryzyka oraz kolumnowy zapis wszystkich skutków ubocznych (lek, poziom, częstotliwość, numer objawu),
+        # dzięki któremu zmiana modelu przelicza ryzyko całego katalogu w jednym przebiegu
+        self.risk_model = DEFAULT_RISK_MODEL
+        self.side_effect_drug = array('q')
+        self.side_effect_level = array('q')
+        self.side_effect_freq = array('d')
+        self.side_effect_effect = array('q')
+
+        # Instrumentacja (None = wyłączona)
+        self.stats = None
+
+        # Zarejestrowane indeksy pomocnicze (SecondaryIndex)
+        self.indexes = []
+
+        # Indeks osiągalności dla can_replace (tworzony przy pierwszym zapytaniu)
+        self.reachability = None
+
+        # Indeks długości ciągów zamienników (tworzony przy pierwszym zapytaniu o ciągi)
+        self.chains = None
+
+        # Rankingi leków według liczby zamienników (tworzone przy pierwszym zapytaniu o ranking)
+        self.degrees = None
+
+        # Macierz profili wskazań do wyszukiwania podobnych leków (tworzona przy pierwszym zapytaniu)
+        self.similarity = None
+
+        # Leki chorób według ryzyka i poziomu skuteczności (tworzony przy pierwszym zapytaniu)
+        self.safety = None
+
+        # Strumień zmian najlepszego leku dla choroby (None = brak subskrybentów)
+        self.feed = None
+
+        # Otwarta transakcja wsadowa (None = zapisy wykonywane od razu)
+        self.pending_batch = None
+
+        # Wersja bazy: rośnie o 1 przy każdej zmianie (dodanie leku, relacja zamiany, zmiana skuteczności,
+        # model ryzyka). drug_version: klucz leku → wersja, w której go dodano (rosnąco, więc leki nowsze niż
+        # wersja v to sufiks); pozostałe zmiany trafiają do kolumnowego dziennika (wersja, rodzaj, klucz leku,
+        # argument). Początek zmian od wersji v export_delta wyszukuje bisekcją w obu kolumnach wersji
+        self.version = 0
+        self.drug_version = array('q', [0])
+        self.change_version = array('q')
+        self.change_kind = array('b')
+        self.change_order = array('q')
+        self.change_arg = array('q')
+
+    def register_index(self, index):
+        '''
+            Rejestruje indeks pomocniczy. Leki już obecne w bazie są do niego wstawiane od razu,
+            kolejne — przy add_drug.
+
+            Args:
+                index (SecondaryIndex): indeks do zarejestrowania
+
+            Returns:
+                SecondaryIndex: zarejestrowany indeks
+        '''
+        index.on_bulk_insert(self.drugs_by_order[1:])
+        self.indexes.append(index)
+        return index
+
+    def batch(self):
+        '''
+            Transakcja wsadowa: with db.batch(): ... — add_drug wewnątrz bloku odkłada leki (zwraca już
+            ich identyfikatory), a struktury bazy są aktualizowane hurtowo przy wyjściu z bloku.
+            Wyjątek w bloku porzuca całą transakcję. Zapytania w bloku widzą stan sprzed transakcji.
+
+            Returns:
+                WriteBatch: menedżer kontekstu transakcji
+        '''
+        from pharmdb_batch import WriteBatch
+
+        return WriteBatch(self)
+
+    def freeze(self):
+        '''
+            Tworzy niezmienną kopię bazy zoptymalizowaną do odczytu (tablice zamiast obiektów Drug,
+            CSR grafu zamian, z góry policzone najlepsze leki, rankingi chorób i najdłuższe ciągi).
+            Późniejsze zmiany bazy nie wpływają na kopię.
+
+            Returns:
+                FrozenPharmDB: kopia z tym samym API zapytań
+
+            Złożoność czasowa: O(D + S + I + E log E)
+        '''
+        from pharmdb_frozen import FrozenPharmDB
+
+        return FrozenPharmDB(self)
+
+    def _log_change(self, kind, order, arg):
+        # Nowa wersja bazy i wpis dziennika zmian (patrz CHANGE_*)
+        self.version += 1
+        self.change_version.append(self.version)
+        self.change_kind.append(kind)
+        self.change_order.append(order)
+        self.change_arg.append(arg)
+
+    def export_delta(self, since_version):
+        '''
+            Zwraca binarny zestaw zmian od wersji since_version do bieżącej (self.version): nowe leki
+            (z wpisami indeksu częstotliwości, czyli skutkami ubocznymi), zmiany skuteczności, relacje
+            zamiany z add_substitutes i model ryzyka. Kolejne zmiany tej samej skuteczności są scalane,
+            a zmiany leków dodanych po since_version są zawarte w ich danych.
+
+            Args:
+                since_version (int): wersja repliki (0 = cały katalog)
+
+            Returns:
+                bytes: zestaw zmian dla apply_delta
+
+            Złożoność czasowa: O(log D + rozmiar zmian)
+        '''
+        from pharmdb_delta import export_delta
+
+        return export_delta(self, since_version)
+
+    def apply_delta(self, blob):
+        '''
+            Nakłada zestaw zmian z export_delta bazy źródłowej. Baza musi być w wersji, od której liczono
+            zmiany; po nałożeniu ma wersję bazy źródłowej z chwili eksportu (może więc sama eksportować
+            zmiany dla kolejnych replik). Zestaw jest sprawdzany w całości przed nałożeniem — uszkodzony
+            (ValueError) nie zmienia bazy.
+
+            Args:
+                blob (bytes): zestaw zmian
+
+            Returns:
+                int: nowa wersja bazy
+
+            Złożoność czasowa: O(rozmiar zmian + R), gdzie R to liczba leków, które mogą (pośrednio) zastąpić
+            leki z relacji zestawu (sprawdzenie cykli), poza zmianą modelu ryzyka (przeliczenie całego katalogu)
+        '''
+        from pharmdb_delta import apply_delta
+
+        return apply_delta(self, blob)
+
+    def subscribe(self, diseases=None, callback=None, batch_size=64, capacity=4096):
+        '''
+            Subskrybuje zmiany najlepszego leku dla chorób (zdarzenia BestDrugChange:
+            choroba, poprzedni najlepszy lek, nowy najlepszy lek, jego skuteczność).
+
+            Args:
+                diseases (iterable, optional): nazwy obserwowanych chorób (domyślnie wszystkie)
+                callback (callable, optional): wywoływana z listą zdarzeń co batch_size zdarzeń
+                batch_size (int, optional): rozmiar wsadu dla callback
+                capacity (int, optional): pojemność bufora cyklicznego subskrypcji
+
+            Returns:
+                Subscription: subskrypcja (poll, flush, close)
+        '''
+        from pharmdb_feed import ChangeFeed, Subscription
+
+        if self.feed is None:
+            self.feed = ChangeFeed(self)
+        return self.feed.subscribe(Subscription(self.feed, diseases, callback, batch_size, capacity))
+
+    def enable_instrumentation(self, window=10000):
+        '''
+            Włącza zbieranie statystyk: liczby wywołań i czasów metod z INSTRUMENTED_METHODS
+            (percentyle liczone z ostatnich window wywołań) oraz liczników algorytmów.
+            Metody są opakowywane tylko na tej instancji — po wyłączeniu narzut znika całkowicie.
+        '''
+        if self.stats is None:
+            self.stats = Instrumentation(window)
+            for name in self.INSTRUMENTED_METHODS:
+                setattr(self, name, self.stats.wrap(name, getattr(type(self), name).__get__(self)))
+        return self.stats
+
+    def disable_instrumentation(self):
+        '''
+            Wyłącza instrumentację i zwraca ostatni zrzut statystyk (lub None, jeśli była wyłączona).
+        '''
+        if self.stats is None:
+            return None
+        snapshot = self.stats.snapshot()
+        for name in self.INSTRUMENTED_METHODS:
+            self.__dict__.pop(name, None)
+        self.stats = None
+        return snapshot
+
+    def instrumentation_stats(self):
+        '''
+            Zwraca bieżące statystyki instrumentacji (patrz Instrumentation.snapshot) lub None, gdy wyłączona.
+        '''
+        if self.stats is None:
+            return None
+        return self.stats.snapshot()
+
+    def intern_disease(self, disease_name):
+        '''
+            Zwraca numer choroby, w razie potrzeby dopisując ją do słownika chorób.
+        '''
+        disease = self.disease_ids.get(disease_name)
+        if disease is None:
+            disease = len(self.disease_names)
+            self.disease_ids[disease_name] = disease
+            self.disease_names.append(disease_name)
+            self.indication_heap.append(array('q'))
+            self.best_drug_for_disease.append(0)
+        return disease
+
+    def intern_effect(self, effect_name):
+        '''
+            Zwraca numer objawu (skutku ubocznego), w razie potrzeby dopisując go do słownika objawów.
+        '''
+        effect = self.effect_ids.get(effect_name)
+        if effect is None:
+            effect = len(self.effect_names)
+            self.effect_ids[effect_name] = effect
+            self.effect_names.append(effect_name)
+        return effect
+
+    def format_drug_id(self, order):
+        '''
+            Zamienia klucz wewnętrzny (kolejność dodania) na zewnętrzny identyfikator leku.
+        '''
+        return f"{self.id_prefix}{order:0{self.id_width}d}"
+
+    def order_of(self, drug_id):
+        '''
+            Zwraca klucz wewnętrzny (kolejność dodania) leku o podanym identyfikatorze
+            lub None, jeśli leku nie ma w bazie.
+        '''
+        drug = self.drugs_by_id.get(drug_id)
+        if drug is None:
+            return None
+        return drug.insert_order
+
 
     def add_drug(self, drug_name, indications=None, substitutes=None, side_effects=None):
         '''
@@ -126,56 +534,231 @@ class PharmDB:
                - e to liczba działań niepożądanych
         '''
 
+        if self.pending_batch is not None:
+            return self.pending_batch.add_drug(drug_name, indications, substitutes, side_effects)
+
         # Generowanie ID
-        drug_id = f"D{self.next_id_number:04d}"
+        order = self.next_id_number
+        drug_id = self.format_drug_id(order)
+
+        # Zamiana identyfikatorów zamienników na klucze wewnętrzne
+        # Z warunków zadania musi być id już w bazie, ale wypada dodać sprawdzenie
+        substitute_orders = []
+        if substitutes:
+            for sub_id in substitutes:
+                sub_drug = self.drugs_by_id.get(sub_id)
+                if sub_drug is None:
+                    raise Exception("Dodany lek może być zamiennikiem tylko dla leków wcześniej dodanych do bazy danych!")
+                substitute_orders.append(sub_drug.insert_order)
+
+        # Lek przechowuje nazwy chorób ze słownika, więc każda nazwa jest w pamięci raz (nowa nazwa staje się
+        # wpisem słownika dopiero po utworzeniu leku — błędne dane nie zmieniają słownika chorób)
+        interned_indications = []
+        if indications:
+            disease_ids = self.disease_ids
+            disease_names = self.disease_names
+            for disease_name, efficacy in indications:
+                disease = disease_ids.get(disease_name)
+                interned_indications.append((disease_names[disease] if disease is not None else disease_name, efficacy))
+
+        # Skutki uboczne z nazwą objawu ze słownika (nowa nazwa trafia do słownika przy dopisywaniu kolumn)
+        interned_side_effects = []
+        if side_effects:
+            effect_ids = self.effect_ids
+            effect_names = self.effect_names
+            for effect_name, level, freq in side_effects:
+                effect = effect_ids.get(effect_name)
+                interned_side_effects.append((effect_names[effect] if effect is not None else effect_name, level, freq))
 
         # Stwórz obiekt Drug
         drug = Drug(
             drug_id=drug_id,
             name=drug_name,
-            insert_order=self.next_id_number,
-            indications=indications,
-            substitutes=substitutes,
-            side_effects=side_effects
+            insert_order=order,
+            indications=interned_indications,
+            substitutes=substitute_orders,
+            side_effects=interned_side_effects,
+            risk_model=self.risk_model
         )
 
-        # Zwiększ licznik dodanych leków
+        # Choroby zamieniam na numery
+        disease_numbers = [self.intern_disease(disease_name) for disease_name, _ in interned_indications]
+
+        # Zwiększ licznik dodanych leków i wersję bazy
         self.next_id_number += 1
+        self.version += 1
+        self.drug_version.append(self.version)
 
         # Dodaj lek do słownika leków
         self.drugs_by_id[drug_id] = drug
-
-        for sub_id in drug.substitutes:
-            # Z warunków zadania musi być id już w bazie, ale wypada dodać sprawdzenie
-            if sub_id in self.drugs_by_id:
-                # Zaktualizuj odwrotną relację
-                if sub_id not in self.reverse_substitutes:
-                    self.reverse_substitutes[sub_id] = set()
-                self.reverse_substitutes[sub_id].add(drug_id)
-                # Zaktualizuj także obiekt zamienianego leku
-                self.drugs_by_id[sub_id].replaced_by.add(drug_id)
-            else:
-                raise Exception("Dodany lek może być zamiennikiem tylko dla leków wcześniej dodanych do bazy danych!")
+        self.drugs_by_order.append(drug)
+
+        # Dopisz skutki uboczne do kolumn
+        for effect_name, level, freq in drug.side_effects:
+            self.side_effect_drug.append(order)
+            self.side_effect_level.append(level)
+            self.side_effect_freq.append(freq)
+            self.side_effect_effect.append(self.intern_effect(effect_name))
+
+        for sub in drug.substitutes:
+            # Zaktualizuj odwrotną relację
+            if sub not in self.reverse_substitutes:
+                self.reverse_substitutes[sub] = set()
+            self.reverse_substitutes[sub].add(order)
+            # Zaktualizuj także obiekt zamienianego leku
+            self.drugs_by_order[sub].replaced_by.add(order)
 
         # Aktualizuj struktury dotyczące wskazań
-        if indications:
-            for disease, efficacy in indications:
-                # Kopiec dla choroby
-                if disease not in self.indication_heap:
-                    self.indication_heap[disease] = []
-                # Dodaj z minusami, bo heapq to kopiec minimalny — symuluj działanie kopca maksymalnego
-                heapq.heappush(self.indication_heap[disease], (-efficacy, -drug.insert_order, drug_id))
-
-                # Aktualizuj najlepszy lek
-                if disease not in self.best_drug_for_disease:
-                    self.best_drug_for_disease[disease] = (efficacy, drug_id)
-                else:
-                    best_efficacy, best_id = self.best_drug_for_disease[disease]
-                    if (efficacy > best_efficacy) or (efficacy == best_efficacy and drug.insert_order > self.drugs_by_id[best_id].insert_order):
-                        self.best_drug_for_disease[disease] = (efficacy, drug_id)
+        best = self.best_drug_for_disease
+        for disease, (_, efficacy) in zip(disease_numbers, interned_indications):
+            # Spakowany wpis: porównanie liczb to porównanie (efektywność, kolejność)
+            key = (efficacy << ORDER_BITS) | order
+            _heap_push(self.indication_heap[disease], key)
+
+            # Aktualizuj najlepszy lek
+            if key > best[disease]:
+                if self.feed is not None:
+                    self.feed.publish(self.disease_names[disease], best[disease], key)
+                best[disease] = key
+
+        # Powiadom indeksy pomocnicze
+        for index in self.indexes:
+            index.on_insert(drug)
 
         return drug_id
 
+    def add_substitutes(self, pairs):
+        '''
+            Dodaje relacje zamiany między lekami już obecnymi w bazie (także do leków dodanych później
+            niż lek zastępujący). Wszystkie pary są dodawane albo żadna: jeśli któraś tworzy cykl
+            (lek pośrednio zastępowałby sam siebie), wcześniejsze pary wywołania są wycofywane.
+
+            Graf zamian pozostaje DAG-iem, a jego porządek topologiczny (topological) jest utrzymywany
+            algorytmem Pearce'a–Kelly'ego: krawędź zgodna z porządkiem to sprawdzenie O(1), a krawędź
+            przeciwna przeszukuje tylko leki o pozycjach między jej końcami i przenumerowuje je.
+            Indeksy pomocnicze dostają wszystkie nowe krawędzie naraz (on_bulk_substitutes_added).
+
+            Args:
+                pairs (iterable): pary (drug_id, substitute_id) — lek drug_id może zastąpić lek substitute_id
+
+            Returns:
+                int: liczba dodanych relacji (pary już istniejące są pomijane)
+
+            Złożoność czasowa: O(p + suma rozmiarów przenumerowanych obszarów), gdzie p to liczba par
+        '''
+        if self.pending_batch is not None:
+            raise RuntimeError("add_substitutes nie jest dostępne w otwartej transakcji wsadowej")
+
+        drugs_by_id = self.drugs_by_id
+        reverse = self.reverse_substitutes
+        topo = self.topological
+        if topo is not None and len(topo) < self.next_id_number:
+            topo.extend(range(len(topo), self.next_id_number))
+
+        added = []
+        try:
+            for drug_id, substitute_id in pairs:
+                drug = drugs_by_id.get(drug_id)
+                substitute = drugs_by_id.get(substitute_id)
+                if drug is None or substitute is None:
+                    raise Exception("Relacja zamiany może łączyć tylko leki obecne w bazie danych!")
+                order = drug.insert_order
+                sub = substitute.insert_order
+                if sub in drug.substitutes:
+                    continue
+                if order == sub:
+                    raise ValueError(f"Lek {drug_id} nie może zastępować samego siebie")
+
+                # Krawędź sub → order w reverse_substitutes wymaga pozycji sub < pozycji order
+                if topo is None:
+                    if sub > order:
+                        topo = self.topological = array('q', range(self.next_id_number))
+                if topo is not None and topo[sub] > topo[order] and not self._reorder_topological(sub, order):
+                    raise ValueError(f"Relacja {drug_id} → {substitute_id} tworzy cykl zamian")
+
+                drug.substitutes.add(sub)
+                substitute.replaced_by.add(order)
+                replacing = reverse.get(sub)
+                if replacing is None:
+                    reverse[sub] = {order}
+                else:
+                    replacing.add(order)
+                added.append((drug, substitute))
+        except Exception:
+            for drug, substitute in added:
+                drug.substitutes.discard(substitute.insert_order)
+                substitute.replaced_by.discard(drug.insert_order)
+                replacing = reverse[substitute.insert_order]
+                replacing.discard(drug.insert_order)
+                if not replacing:
+                    del reverse[substitute.insert_order]
+            raise
+
+        for drug, substitute in added:
+            self._log_change(CHANGE_SUBSTITUTE, drug.insert_order, substitute.insert_order)
+        if added:
+            for index in self.indexes:
+                index.on_bulk_substitutes_added(added)
+        return len(added)
+
+    def _reorder_topological(self, source, target):
+        # Pearce–Kelly dla nowej krawędzi source → target (w reverse_substitutes) przy pozycji source > target.
+        # Zwraca False, jeśli krawędź zamknęłaby cykl (porządek pozostaje wtedy bez zmian)
+        topo = self.topological
+        reverse = self.reverse_substitutes
+        drugs = self.drugs_by_order
+        lower = topo[target]
+        upper = topo[source]
+
+        # Wprzód od target: leki o pozycjach < upper; dojście do source oznacza cykl
+        forward = [target]
+        seen = {target}
+        stack = [target]
+        while stack:
+            current = stack.pop()
+            for neighbor in reverse.get(current, ()):
+                if neighbor == source:
+                    return False
+                if neighbor not in seen and topo[neighbor] < upper:
+                    seen.add(neighbor)
+                    forward.append(neighbor)
+                    stack.append(neighbor)
+
+        # Wstecz od source: leki o pozycjach > lower
+        backward = [source]
+        seen = {source}
+        stack = [source]
+        while stack:
+            current = stack.pop()
+            for sub in drugs[current].substitutes:
+                if sub not in seen and topo[sub] > lower:
+                    seen.add(sub)
+                    backward.append(sub)
+                    stack.append(sub)
+
+        # Zwolnione pozycje obu obszarów przydzielam ponownie: najpierw obszar wsteczny, potem wprzedni,
+        # każdy w dotychczasowej kolejności względnej
+        backward.sort(key=topo.__getitem__)
+        forward.sort(key=topo.__getitem__)
+        moved = backward + forward
+        for order, position in zip(moved, sorted(topo[order] for order in moved)):
+            topo[order] = position
+
+        if self.stats is not None:
+            self.stats.record("topological_reordered", len(moved))
+        return True
+
+    def topological_position(self, order):
+        '''Pozycja leku (klucz) w porządku topologicznym grafu zamian: leki, które może zastąpić, mają mniejsze.'''
+        topo = self.topological
+        return topo[order] if topo is not None and order < len(topo) else order
+
+    def topologically_sorted(self, drugs):
+        '''Leki (obiekty Drug) w porządku topologicznym: każdy lek po lekach, które może zastąpić.'''
+        if self.topological is None:
+            return list(drugs)
+        return sorted(drugs, key=lambda drug: self.topological_position(drug.insert_order))
+
 
     def number_of_indications(self, drug_id, min_efficacy):
         '''
@@ -255,6 +838,83 @@ class PharmDB:
         return drug.risk_score
 
 
+    def set_risk_model(self, risk_model):
+        '''
+            Ustawia model ryzyka dla całego katalogu i przelicza risk_score oraz najgorszy skutek uboczny
+            wszystkich leków (patrz recompute_risk_scores). Nowo dodawane leki używają tego modelu.
+
+            Args:
+                risk_model (RiskModel): model ryzyka
+        '''
+        if self.pending_batch is not None:
+            raise RuntimeError("set_risk_model nie jest dostępne w otwartej transakcji wsadowej")
+        self.risk_model = risk_model
+        self._log_change(CHANGE_RISK_MODEL, 0, 0)
+        self.recompute_risk_scores()
+
+    def recompute_risk_scores(self):
+        '''
+            Przelicza risk_score i najgorszy skutek uboczny wszystkich leków według bieżącego modelu
+            w jednym przebiegu po kolumnach skutków ubocznych. Jeśli dostępny jest NumPy, obliczenia są
+            wektorowe (bincount dla sum, lexsort dla najgorszego skutku), w przeciwnym razie w czystym Pythonie.
+
+            Złożoność czasowa: O(E log E) z NumPy, O(E + D) bez, gdzie E to liczba skutków ubocznych, D liczba leków
+        '''
+        try:
+            import numpy as np
+        except ImportError:
+            np = None
+
+        model = self.risk_model
+        n = self.next_id_number
+        scores = [0.0] * n
+        worst = [None] * n
+
+        if np is not None and self.side_effect_effect:
+            drug_col = np.frombuffer(self.side_effect_drug, dtype=np.int64)
+            level_col = np.frombuffer(self.side_effect_level, dtype=np.int64)
+            freq_col = np.frombuffer(self.side_effect_freq, dtype=np.float64)
+
+            # bincount sumuje wagi w kolejności wejścia, więc wynik jest identyczny z obliczeniem w Drug
+            scores = np.bincount(drug_col, weights=model.contributions(np, level_col, freq_col), minlength=n).tolist()
+
+            # Najgorszy skutek: skutki leku leżą w kolumnach obok siebie (lek dopisuje je naraz),
+            # więc wystarczą redukcje po segmentach — max dotkliwości, potem max częstotliwości, potem pierwszy
+            sev_col = model.severities(np, level_col)
+            starts = np.flatnonzero(np.r_[True, drug_col[1:] != drug_col[:-1]])
+            segment = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, len(drug_col)]))
+            at_max = sev_col == np.maximum.reduceat(sev_col, starts)[segment]
+            masked_freq = np.where(at_max, freq_col, -np.inf)
+            max_freq = np.maximum.reduceat(masked_freq, starts)
+            candidates = np.flatnonzero(masked_freq == max_freq[segment])
+            first = candidates[np.r_[True, segment[candidates][1:] != segment[candidates][:-1]]]
+            names = self.effect_names
+            effects = self.side_effect_effect
+            for order, idx, freq in zip(drug_col[starts].tolist(), first.tolist(), max_freq.tolist()):
+                if freq > 0:
+                    worst[order] = names[effects[idx]]
+        else:
+            # Wersja bez NumPy — jeden przebieg, dla każdego leku pamiętam (dotkliwość, częstotliwość) najgorszego
+            best_key = [None] * n
+            names = self.effect_names
+            for order, level, freq, effect in zip(self.side_effect_drug, self.side_effect_level,
+                                                  self.side_effect_freq, self.side_effect_effect):
+                scores[order] += model.weight(level, freq)
+                severity = model.severity(level)
+                key = best_key[order]
+                if key is None or severity > key[0] or (severity == key[0] and freq > key[1]):
+                    best_key[order] = (severity, freq)
+                    worst[order] = names[effect] if freq > 0 else None
+
+        # Odśwież wartości zapamiętane w obiektach Drug (z nich korzystają zapytania, np. find_best_alternative)
+        for drug, score, worst_name in zip(self.drugs_by_order, scores, worst):
+            if drug is not None:
+                drug.risk_score = score
+                drug.worst_effect_name = worst_name
+
+        for index in self.indexes:
+            index.on_risk_recomputed(self)
+
     def find_best_alternative(self, drug_id, max_steps=2):
         '''
             Zwraca identyfikator leku o minimalnym ryzyku spośród leków, które można zastosować 
@@ -270,35 +930,514 @@ class PharmDB:
             Wymagana złożoność czasowa: funkcja powinna działać istotnie szybciej niż O(D+S)
         '''
 
-        if drug_id not in self.drugs_by_id:
+        start = self.order_of(drug_id)
+        if start is None:
             return None
 
-        # BFS (lek_id, liczba wykonanych kroków)
+        drugs = self.drugs_by_order
+
+        # BFS (klucz leku, liczba wykonanych kroków) — wyłącznie na kluczach całkowitych
         visited = set()
-        queue = deque([(drug_id, 0)])
-        visited.add(drug_id)
+        queue = deque([(start, 0)])
+        visited.add(start)
 
-        best_id = drug_id
-        best_score = self.drugs_by_id[drug_id].risk_score
+        best = start
+        best_score = drugs[start].risk_score
 
         while queue:
-            current_id, steps = queue.popleft()
-            current_score = self.drugs_by_id[current_id].risk_score
+            current, steps = queue.popleft()
+            current_score = drugs[current].risk_score
 
-            # Aktualizuj najlepszy lek
-            if (current_score < best_score) or (current_score == best_score and current_id < best_id):
+            # Aktualizuj najlepszy lek (przy remisie wcześniej dodany)
+            if (current_score < best_score) or (current_score == best_score and current < best):
                 best_score = current_score
-                best_id = current_id
+                best = current
 
             # Przejdź do sąsiadów, jeśli nie przekroczono max_steps
             if steps < max_steps:
-                for neighbor in self.reverse_substitutes.get(current_id, []):
+                for neighbor in self.reverse_substitutes.get(current, ()):
                     if neighbor not in visited:
                         visited.add(neighbor)
                         queue.append((neighbor, steps + 1))
 
-        return best_id
+        if self.stats is not None:
+            self.stats.record("bfs_nodes_visited", len(visited))
+
+        return drugs[best].id
+
+
+    def _best_alternatives(self, starts, max_steps=2):
+        '''
+            Wsadowa wersja find_best_alternative dla wielu leków naraz (klucze wewnętrzne).
+            Jeden BFS poziomami: przy każdym leku pamiętana jest maska bitowa startów, które już do niego
+            dotarły, więc wspólne fragmenty sąsiedztw przechodzone są raz dla całego wsadu.
+            Zwraca listę kluczy najlepszych leków, w kolejności starts.
+        '''
+        drugs = self.drugs_by_order
+        reverse = self.reverse_substitutes
+        best = list(starts)
+
+        visited = {}                    # klucz leku → maska startów, które już go odwiedziły
+        frontier = {}
+        for bit, start in enumerate(starts):
+            frontier[start] = frontier.get(start, 0) | (1 << bit)
+
+        steps = 0
+        while frontier:
+            next_frontier = {}
+            for current, mask in frontier.items():
+                visited[current] = visited.get(current, 0) | mask
+                score = drugs[current].risk_score
+                # Aktualizuj najlepszy lek każdego startu z maski (przy remisie wcześniej dodany)
+                remaining = mask
+                while remaining:
+                    low = remaining & -remaining
+                    bit = low.bit_length() - 1
+                    remaining ^= low
+                    best_score = drugs[best[bit]].risk_score
+                    if score < best_score or (score == best_score and current < best[bit]):
+                        best[bit] = current
+                if steps < max_steps:
+                    for neighbor in reverse.get(current, ()):
+                        next_frontier[neighbor] = next_frontier.get(neighbor, 0) | mask
+            steps += 1
+            # Do kolejnego poziomu przechodzą tylko starty, które jeszcze nie odwiedziły danego leku
+            frontier = {}
+            for neighbor, mask in next_frontier.items():
+                mask &= ~visited.get(neighbor, 0)
+                if mask:
+                    frontier[neighbor] = mask
+
+        if self.stats is not None:
+            self.stats.record("bfs_nodes_visited", len(visited))
+
+        return best
+
+    def regimen_risk(self, drug_ids, max_steps=2):
+        '''
+            Ocena całego schematu leczenia (listy leków pacjenta) w jednym wywołaniu.
+
+            Args:
+                drug_ids (list): identyfikatory leków schematu (nieznane identyfikatory są pomijane)
+                max_steps (int, optional): maksymalna liczba zamian przy szukaniu zamienników, domyślnie 2
+
+            Returns:
+                dict: {
+                    "risk": suma risk_score leków schematu,
+                    "worst_effects": najgorsze skutki uboczne leków (bez powtórzeń, w kolejności leków),
+                    "overlapping_effects": {skutek: [identyfikatory leków]} dla skutków występujących w co najmniej dwóch lekach,
+                    "alternatives": {identyfikator: lek o mniejszym ryzyku (jak w find_best_alternative) lub None}
+                }
+
+            Złożoność czasowa: O(n + E_n) dla agregatów, gdzie E_n to liczba skutków ubocznych leków schematu,
+            oraz jeden wsadowy BFS dla zamienników
+        '''
+        drugs = self.drugs_by_order
+        orders = []
+        seen = set()
+        for drug_id in drug_ids:
+            order = self.order_of(drug_id)
+            if order is not None and order not in seen:
+                seen.add(order)
+                orders.append(order)
+
+        risk = 0.0
+        worst_effects = []
+        effect_drugs = {}
+        for order in orders:
+            drug = drugs[order]
+            risk += drug.risk_score
+            worst = drug.worst_effect_name
+            if worst is not None and worst not in worst_effects:
+                worst_effects.append(worst)
+            for effect_name, _, _ in drug.side_effects:
+                holders = effect_drugs.setdefault(effect_name, [])
+                if not holders or holders[-1] != drug.id:
+                    holders.append(drug.id)
+
+        alternatives = {}
+        for order, best in zip(orders, self._best_alternatives(orders, max_steps)):
+            alternatives[drugs[order].id] = drugs[best].id if best != order else None
+
+        return {
+            "risk": risk,
+            "worst_effects": worst_effects,
+            "overlapping_effects": {effect: holders for effect, holders in effect_drugs.items() if len(holders) > 1},
+            "alternatives": alternatives,
+        }
+
+
+    def pareto_alternatives(self, drug_id, disease_name, max_steps=2):
+        '''
+            Zwraca front Pareto leków, którymi można zastąpić lek drug_id (co najwyżej max_steps zamian)
+            i które leczą chorobę disease_name: żaden lek frontu nie ma jednocześnie mniejszej skuteczności
+            i nie mniejszego ryzyka niż inny lek frontu. Przy identycznych parach zostaje lek osiągalny mniejszą
+            liczbą zamian, a przy równej liczbie zamian lek dodany wcześniej.
+
+            Args:
+                drug_id (str): identyfikator leku zastępowanego
+                disease_name (str): nazwa choroby
+                max_steps (int, optional): maksymalna liczba zamian, domyślnie 2
+
+            Returns:
+                list: krotki (identyfikator, skuteczność, risk_score) malejąco po skuteczności
+                      (a więc i po ryzyku); None, jeśli lek lub choroba nie istnieje
+
+            Złożoność czasowa: O(V + S_V + C log C), gdzie V to liczba odwiedzonych leków, S_V liczba ich
+            krawędzi, a C liczba odwiedzonych leków leczących chorobę
+        '''
+        start = self.order_of(drug_id)
+        disease = self.disease_ids.get(disease_name)
+        if start is None or disease is None:
+            return None
+        drugs = self.drugs_by_order
+        reverse = self.reverse_substitutes
+
+        # Front: krotki (-skuteczność, ryzyko, poziom BFS, klucz leku) rosnąco, ryzyko ściśle malejące.
+        # Każdy poziom BFS daje posortowaną listę kandydatów, którą scalam z frontem poprzednich poziomów;
+        # kandydaci zdominowani odpadają od razu, więc front nigdy nie rośnie ponad liczbę różnych skuteczności.
+        front = []
+        # Punkt idealny: największa skuteczność dla choroby przy zerowym ryzyku — jeśli trafi do frontu,
+        # dominuje wszystkie pozostałe leki i dalsze poziomy nie są przeszukiwane
+        best_eff = self.best_drug_for_disease[disease] >> ORDER_BITS
+
+        visited = {start}
+        frontier = [start]
+        steps = 0
+        while frontier and steps < max_steps:
+            next_frontier = []
+            for current in frontier:
+                for neighbor in reverse.get(current, ()):
+                    if neighbor not in visited:
+                        visited.add(neighbor)
+                        next_frontier.append(neighbor)
+            frontier = next_frontier
+            steps += 1
+
+            candidates = sorted((-drug.indications[disease_name], drug.risk_score, steps, order)
+                                for order in next_frontier for drug in (drugs[order],)
+                                if disease_name in drug.indications)
+            if not candidates:
+                continue
+            merged = []
+            for point in heapq.merge(front, candidates):
+                if not merged or point[1] < merged[-1][1]:
+                    merged.append(point)
+            front = merged
+            if -front[0][0] >= best_eff and front[0][1] <= 0:
+                break
+
+        if self.stats is not None:
+            self.stats.record("bfs_nodes_visited", len(visited))
+
+        return [(drugs[order].id, -neg, risk) for neg, risk, _, order in front]
+
+
+    def similar_drugs(self, drug_id, k, missing_only=False):
+        '''
+            Zwraca k leków o profilu wskazań najbardziej podobnym do leku drug_id (podobieństwo cosinusowe
+            wektorów skuteczności po chorobach), malejąco po podobieństwie, przy remisie wcześniej dodane.
+            Brane są pod uwagę tylko leki mające z drug_id co najmniej jedną wspólną chorobę.
+
+            Przy pierwszym wywołaniu budowana jest macierz profili (SimilarityIndex), którą add_drug
+            i update_best_indication utrzymują dalej przyrostowo.
+
+            Args:
+                drug_id (str): identyfikator leku
+                k (int): liczba leków
+                missing_only (bool, optional): pomiń leki połączone już z drug_id bezpośrednią zamianą
+                    (w którąkolwiek stronę) — kandydaci na brakujące zamienniki
+
+            Returns:
+                list: krotki (identyfikator, podobieństwo); None, jeśli leku nie ma w bazie
+
+            Złożoność czasowa: O(C + c log k), gdzie C to łączna liczba leków w chorobach leku drug_id,
+            a c liczba różnych spośród nich
+        '''
+        result = self.similar_drugs_batch([drug_id], k, missing_only)
+        return result.get(drug_id)
+
+    def similar_drugs_batch(self, drug_ids, k, missing_only=False):
+        '''
+            Wsadowa wersja similar_drugs: przy długich kolumnach chorób składki wszystkich zapytań sumowane są
+            razem (z NumPy — jednym sortowaniem i reduceat). Nieznane identyfikatory są pomijane.
+
+            Returns:
+                dict: identyfikator → lista krotek (identyfikator, podobieństwo) jak w similar_drugs
+        '''
+        if self.similarity is None:
+            from pharmdb_similarity import SimilarityIndex
+            self.similarity = self.register_index(SimilarityIndex(self))
+        drugs = self.drugs_by_order
+        orders = []
+        seen = set()
+        for drug_id in drug_ids:
+            order = self.order_of(drug_id)
+            if order is not None and order not in seen:
+                seen.add(order)
+                orders.append(order)
+
+        exclude = None
+        if missing_only:
+            def exclude(order):
+                return drugs[order].substitutes | drugs[order].replaced_by
+
+        return {drugs[order].id: [(drugs[other].id, sim) for other, sim in top]
+                for order, top in zip(orders, self.similarity.top_k(orders, k, exclude))}
+
+    def query(self, disease=None, min_efficacy=1, max_risk=None, max_side_effect_level=None, replaces=None,
+              max_steps=2, side_effect_frequency=None):
+        '''
+            Zapytanie złożone: leki spełniające jednocześnie wszystkie podane warunki.
+            Przykład: db.query(disease="grypa", min_efficacy=7, max_risk=1.5, max_side_effect_level=2,
+            replaces="D0003", max_steps=2).
+
+            Planer wybiera źródło kandydatów o najmniejszej szacowanej liczności (kopiec choroby, BFS od leku
+            replaces, w PharmaDB także indeks częstotliwości, w ostateczności wszystkie leki), a pozostałe
+            warunki sprawdza jako filtry. Plan można obejrzeć przez query(...).plan().
+
+            Args:
+                disease (str, optional): nazwa choroby, którą lek musi leczyć
+                min_efficacy (int, optional): minimalna skuteczność dla disease
+                max_risk (float, optional): największy dopuszczalny risk_score
+                max_side_effect_level (int, optional): największy dopuszczalny poziom skutku ubocznego
+                replaces (str, optional): identyfikator leku, który lek musi móc zastąpić
+                max_steps (int, optional): maksymalna liczba zamian dla replaces, domyślnie 2
+                side_effect_frequency (tuple, optional): (min, max) — lek musi mieć skutek uboczny
+                    o częstotliwości z tego przedziału
+
+            Returns:
+                Query: iterowalne zapytanie; wyniki (identyfikatory leków) są wyliczane przy iterowaniu
+
+            Złożoność czasowa: O(C * f), gdzie C to liczba kandydatów wybranego źródła, a f koszt filtrów
+        '''
+        from pharmdb_query import Query
+
+        return Query(self, disease, min_efficacy, max_risk, max_side_effect_level, replaces, max_steps,
+                     side_effect_frequency)
+
+    def _query_drivers(self, query):
+        '''
+            Źródła kandydatów dla planera zapytań (QueryDriver); podklasy z dodatkowymi indeksami rozszerzają listę.
+        '''
+        from pharmdb_query import core_drivers
+
+        return core_drivers(self, query)
+
+
+    def can_replace(self, drug_id, other_id):
+        '''
+            Sprawdza, czy lek drug_id może ostatecznie zastąpić lek other_id przez dowolny ciąg zamian.
+
+            Przy pierwszym wywołaniu budowany jest indeks osiągalności (ReachabilityIndex), który
+            add_drug utrzymuje dalej przyrostowo.
+
+            Args:
+                drug_id (str): identyfikator leku zastępującego
+                other_id (str): identyfikator leku zastępowanego
+
+            Returns:
+                bool: True, jeśli istnieje ciąg zamian od other_id do drug_id
+
+            Złożoność czasowa: O(1) dla leków z pełną etykietą, w przeciwnym razie przeszukiwanie
+            ograniczone do leków dodanych po other_id
+        '''
+        x = self.order_of(drug_id)
+        y = self.order_of(other_id)
+        if x is None or y is None:
+            return False
+        if self.reachability is None:
+            from pharmdb_reachability import ReachabilityIndex
+            self.reachability = self.register_index(ReachabilityIndex(self))
+        return self.reachability.can_reach(y, x)
+
+    def cheapest_substitution_path(self, drug_id, disease_name, min_efficacy=1, cost="sum", max_risk=None):
+        '''
+            Zwraca najtańszy ciąg zamian od leku drug_id do dowolnego leku leczącego wskazaną chorobę
+            (ze skutecznością co najmniej min_efficacy). Koszt ciągu liczony jest z risk_score leków,
+            na które pacjent jest kolejno przestawiany (bez leku startowego):
+                - cost="sum": suma ryzyka (Dijkstra)
+                - cost="max": największe ryzyko po drodze (ścieżka o najmniejszym wąskim gardle)
+
+            Args:
+                drug_id (str): identyfikator leku startowego
+                disease_name (str): nazwa choroby
+                min_efficacy (int, optional): minimalna skuteczność leku docelowego
+                cost (str, optional): "sum" lub "max"
+                max_risk (float, optional): leki o większym risk_score nie mogą wystąpić w ciągu
+
+            Returns:
+                tuple: (lista identyfikatorów od drug_id do leku docelowego, koszt) lub None, gdy brak ścieżki
 
+            Złożoność czasowa: O((V' + E') log V'), gdzie V', E' to leki i krawędzie przejrzane
+            przed zdjęciem z kopca pierwszego leku docelowego (zakładamy nieujemne risk_score)
+        '''
+        start = self.order_of(drug_id)
+        disease = self.disease_ids.get(disease_name)
+        if start is None or disease is None:
+            return None
+        drugs = self.drugs_by_order
+
+        def is_target(order):
+            efficacy = drugs[order].indications.get(disease_name)
+            return efficacy is not None and efficacy >= min_efficacy
+
+        return self._dijkstra_path(start, is_target, cost, max_risk)
+
+    def substitution_path(self, drug_id, target_id, cost="sum", max_risk=None, bidirectional=True):
+        '''
+            Zwraca najtańszy ciąg zamian od leku drug_id do leku target_id (koszt jak w
+            cheapest_substitution_path). Dla cost="sum" domyślnie używany jest dwukierunkowy Dijkstra:
+            wprzód po reverse_substitutes i wstecz po substitutes, z zatrzymaniem, gdy suma wierzchołków
+            obu kopców nie może już poprawić najlepszej znalezionej ścieżki.
+
+            Args:
+                drug_id (str): identyfikator leku startowego
+                target_id (str): identyfikator leku docelowego
+                cost (str, optional): "sum" lub "max"
+                max_risk (float, optional): leki o większym risk_score nie mogą wystąpić w ciągu
+                bidirectional (bool, optional): czy używać wersji dwukierunkowej (tylko dla cost="sum")
+
+            Returns:
+                tuple: (lista identyfikatorów od drug_id do target_id, koszt) lub None, gdy brak ścieżki
+        '''
+        start = self.order_of(drug_id)
+        target = self.order_of(target_id)
+        if start is None or target is None:
+            return None
+        if bidirectional and cost == "sum" and start != target:
+            return self._bidirectional_path(start, target, max_risk)
+        return self._dijkstra_path(start, lambda order: order == target, cost, max_risk)
+
+    def _dijkstra_path(self, start, is_target, cost, max_risk):
+        if cost not in ("sum", "max"):
+            raise ValueError("Koszt ścieżki musi być równy 'sum' lub 'max'")
+        use_sum = cost == "sum"
+        drugs = self.drugs_by_order
+        reverse = self.reverse_substitutes
+
+        # Kopiec (koszt, klucz leku) — przy równym koszcie wygrywa lek dodany wcześniej
+        dist = {start: 0.0}
+        parent = {start: None}
+        heap = [(0.0, start)]
+        settled = 0
+        found = None
+
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue                        # nieaktualny wpis
+            settled += 1
+            if is_target(u):
+                found = u
+                break
+            for v in reverse.get(u, ()):
+                risk = drugs[v].risk_score
+                if max_risk is not None and risk > max_risk:
+                    continue
+                nd = d + risk if use_sum else (d if d > risk else risk)
+                if nd < dist.get(v, float("inf")):
+                    dist[v] = nd
+                    parent[v] = u
+                    heapq.heappush(heap, (nd, v))
+
+        if self.stats is not None:
+            self.stats.record("dijkstra_nodes_settled", settled)
+
+        if found is None:
+            return None
+        path = []
+        current = found
+        while current is not None:
+            path.append(drugs[current].id)
+            current = parent[current]
+        path.reverse()
+        return path, dist[found]
+
+    def _bidirectional_path(self, start, target, max_risk):
+        drugs = self.drugs_by_order
+        reverse = self.reverse_substitutes
+        inf = float("inf")
+
+        if max_risk is not None and drugs[target].risk_score > max_risk:
+            return None
+
+        # Kierunek wprzód: koszt dojścia do leku (z jego ryzykiem).
+        # Kierunek wstecz: koszt dalszej części ścieżki od leku do celu (bez jego ryzyka).
+        dist_f = {start: 0.0}
+        dist_b = {target: 0.0}
+        parent_f = {start: None}
+        parent_b = {target: None}
+        heap_f = [(0.0, start)]
+        heap_b = [(0.0, target)]
+        done_f = set()
+        done_b = set()
+        best = inf
+        meet = None
+        settled = 0
+
+        while heap_f and heap_b:
+            if heap_f[0][0] + heap_b[0][0] >= best:
+                break
+            # Rozwijam stronę z mniejszym kopcem
+            if len(heap_f) <= len(heap_b):
+                d, u = heapq.heappop(heap_f)
+                if u in done_f:
+                    continue
+                done_f.add(u)
+                settled += 1
+                for v in reverse.get(u, ()):
+                    risk = drugs[v].risk_score
+                    if max_risk is not None and risk > max_risk:
+                        continue
+                    nd = d + risk
+                    if nd < dist_f.get(v, inf):
+                        dist_f[v] = nd
+                        parent_f[v] = u
+                        heapq.heappush(heap_f, (nd, v))
+                    if v in dist_b and dist_f[v] + dist_b[v] < best:
+                        best = dist_f[v] + dist_b[v]
+                        meet = v
+            else:
+                d, v = heapq.heappop(heap_b)
+                if v in done_b:
+                    continue
+                done_b.add(v)
+                settled += 1
+                nd = d + drugs[v].risk_score
+                for u in drugs[v].substitutes:
+                    if max_risk is not None and u != start and drugs[u].risk_score > max_risk:
+                        continue
+                    if nd < dist_b.get(u, inf):
+                        dist_b[u] = nd
+                        parent_b[u] = v
+                        heapq.heappush(heap_b, (nd, u))
+                    if u in dist_f and dist_f[u] + dist_b[u] < best:
+                        best = dist_f[u] + dist_b[u]
+                        meet = u
+
+        if self.stats is not None:
+            self.stats.record("dijkstra_nodes_settled", settled)
+
+        if meet is None:
+            return None
+        path = []
+        current = meet
+        while current is not None:
+            path.append(drugs[current].id)
+            current = parent_f[current]
+        path.reverse()
+        current = parent_b[meet]
+        while current is not None:
+            path.append(drugs[current].id)
+            current = parent_b[current]
+        return path, best
+
+    def _chain_index(self):
+        if self.chains is None:
+            from pharmdb_chains import ChainIndex
+            self.chains = self.register_index(ChainIndex(self))
+        return self.chains
 
     def longest_alternative_list(self):
         '''
@@ -313,47 +1452,120 @@ class PharmDB:
 
             Wymagana złożoność czasowa: O(d), gdzie d to długość zwracanej listy
         '''
-        memo = {}  # drug_id: (długość ścieżki, następny lek w najdłuższej ścieżce)
-
-        # DFS z zapamiętywaniem przebytej ścieżki
-        def dfs(drug_id):
-            if drug_id in memo:
-                return memo[drug_id]
-
-            max_len = 1
-            next_id = None
-
-            # Przechodzę po lekach, które mogą zastąpić dany lek (graf skierowany)
-            # Sortuję, aby przy remisie wybrać leksykograficznie najmniejszy ciąg
-            for neighbor in sorted(self.reverse_substitutes.get(drug_id, [])):
-                path_len, _ = dfs(neighbor)
-                if path_len + 1 > max_len:
-                    max_len = path_len + 1
-                    next_id = neighbor
-                elif path_len + 1 == max_len:
-                    if next_id is None or neighbor < next_id:
-                        next_id = neighbor
-
-            memo[drug_id] = (max_len, next_id)
-            return memo[drug_id]
-
-        # Szukam najlepszego startowego leku
-        best_start = None
-        best_len = 0
-        for drug_id in sorted(self.drugs_by_id):  # sortowanie dla remisu
-            length, _ = dfs(drug_id)
-            if length > best_len:
-                best_len = length
-                best_start = drug_id
-
-        # Odtwarzam najdłuższą ścieżkę za pomocą memo
-        path = []
-        current = best_start
-        while current:
-            path.append(current)
-            _, current = memo[current]
+        # Długości i następniki ciągów są utrzymywane przyrostowo przez ChainIndex
+        # (przy remisie wybierany jest ciąg leków najwcześniej dodanych), więc wystarczy przejść po następnikach
+        chains = self._chain_index()
+        if chains.best_start is None:
+            return []
+        return [self.drugs_by_order[order].id for order in chains.chain_from(chains.best_start)]
+
+    def chain_length(self, drug_id):
+        '''
+            Zwraca długość najdłuższego ciągu zamienników zaczynającego się od podanego leku
+            (1, jeśli leku nic nie zastępuje; 0, jeśli leku nie ma w bazie).
+
+            Wymagana złożoność czasowa: O(1)
+        '''
+        order = self.order_of(drug_id)
+        if order is None:
+            return 0
+        return self._chain_index().length[order]
+
+    def longest_chain_from(self, drug_id):
+        '''
+            Zwraca najdłuższy ciąg zamienników zaczynający się od podanego leku
+            (przy remisie ciąg leków najwcześniej dodanych).
+
+            Wymagana złożoność czasowa: O(d), gdzie d to długość zwracanej listy
+        '''
+        order = self.order_of(drug_id)
+        if order is None:
+            return []
+        drugs = self.drugs_by_order
+        return [drugs[o].id for o in self._chain_index().chain_from(order)]
+
+    def top_k_chains(self, k, disjoint=False):
+        '''
+            Zwraca k najdłuższych ciągów zamienników o różnych początkach (malejąco po długości,
+            przy remisie wcześniej dodane leki). Przy disjoint=True ciągi nie mają wspólnych leków
+            (wybór zachłanny od najdłuższych).
+
+            Args:
+                k (int): liczba ciągów
+                disjoint (bool, optional): czy ciągi mają być rozłączne
+
+            Returns:
+                list: lista ciągów (list identyfikatorów leków)
+
+            Złożoność czasowa: O(L + suma długości zwróconych ciągów), gdzie L to długość
+            najdłuższego ciągu (dla disjoint=True dochodzi koszt odrzuconych kandydatów)
+        '''
+        chains = self._chain_index()
+        drugs = self.drugs_by_order
+        return [[drugs[o].id for o in chains.chain_from(start)] for start in chains.top_k_starts(k, disjoint)]
+
+    def _degree_ranking(self, kind, disease_name):
+        if self.degrees is None:
+            from pharmdb_degrees import DegreeIndex
+            self.degrees = self.register_index(DegreeIndex(self))
+        return self.degrees.ranking(kind, disease_name)
+
+    def most_replaceable_drugs(self, k, disease_name=None):
+        '''
+            Zwraca identyfikatory k leków, które może zastąpić najwięcej innych leków (malejąco po
+            number_of_alternative_drugs, przy remisie wcześniej dodane), spośród wszystkich leków
+            lub leków leczących disease_name.
+
+            Przy pierwszym wywołaniu budowany jest indeks rankingów (DegreeIndex), który add_drug
+            utrzymuje dalej przyrostowo.
+
+            Args:
+                k (int): liczba leków
+                disease_name (str, optional): nazwa choroby
+
+            Returns:
+                list: identyfikatory leków
+
+            Złożoność czasowa: O(log N + k)
+        '''
+        ranking = self._degree_ranking("replaced_by", disease_name)
+        if ranking is None:
+            return []
+        drugs = self.drugs_by_order
+        return [drugs[order].id for order in ranking.top_k(k)]
+
+    def most_versatile_drugs(self, k, disease_name=None):
+        '''
+            Zwraca identyfikatory k leków, które same mogą zastąpić najwięcej leków (malejąco po liczbie
+            substitutes, przy remisie wcześniej dodane), spośród wszystkich leków lub leków leczących disease_name.
+
+            Złożoność czasowa: O(log N + k)
+        '''
+        ranking = self._degree_ranking("substitutes", disease_name)
+        if ranking is None:
+            return []
+        drugs = self.drugs_by_order
+        return [drugs[order].id for order in ranking.top_k(k)]
+
+    def count_drugs_by_replacers(self, min_count, max_count, disease_name=None):
+        '''
+            Zwraca liczbę leków (wszystkich lub leczących disease_name), które może zastąpić od min_count
+            do max_count innych leków (obustronnie domknięty przedział).
+
+            Złożoność czasowa: O(log N)
+        '''
+        ranking = self._degree_ranking("replaced_by", disease_name)
+        return ranking.count(min_count, max_count) if ranking is not None else 0
 
-        return path
+    def count_drugs_by_substitutes(self, min_count, max_count, disease_name=None):
+        '''
+            Zwraca liczbę leków (wszystkich lub leczących disease_name), które same mogą zastąpić od min_count
+            do max_count leków (obustronnie domknięty przedział).
+
+            Złożoność czasowa: O(log N)
+        '''
+        ranking = self._degree_ranking("substitutes", disease_name)
+        return ranking.count(min_count, max_count) if ranking is not None else 0
 
     def find_best_drug_for_indication(self, disease_name):
         '''
@@ -368,10 +1580,100 @@ class PharmDB:
         
             Wymagana złożoność czasowa: O(1)
         '''
-        if disease_name not in self.best_drug_for_disease:
+        disease = self.disease_ids.get(disease_name)
+        if disease is None or not self.best_drug_for_disease[disease]:
             return None
-        return self.best_drug_for_disease[disease_name][1]  # (efficacy, drug_id)
+        return self.drugs_by_order[self.best_drug_for_disease[disease] & ORDER_MASK].id
+
+
+    def top_k_drugs_for_indication(self, disease_name, k):
+        '''
+            Zwraca identyfikatory k leków o największej efektywności dla wskazanej choroby
+            (malejąco; przy remisie najpóźniej dodane najpierw, jak w find_best_drug_for_indication).
+
+            Kopiec choroby przeglądany jest od korzenia kolejką priorytetową pozycji, więc nie jest
+            modyfikowany; nieaktualne wpisy (po update_best_indication) i powtórzenia są pomijane.
+
+            Args:
+                disease_name (str): nazwa choroby
+                k (int): liczba leków
+
+            Returns:
+                list: identyfikatory leków (mniej niż k, jeśli chorobę leczy mniej leków)
+
+            Złożoność czasowa: O((k + s) log (k + s)), gdzie s to liczba pominiętych nieaktualnych wpisów
+        '''
+        result = []
+        for order in self._indication_orders(disease_name):
+            if len(result) == k:
+                break
+            result.append(self.drugs_by_order[order].id)
+        return result
+
+    def _indication_orders(self, disease_name, min_efficacy=1):
+        '''
+            Generator kluczy leków leczących chorobę ze skutecznością co najmniej min_efficacy, malejąco po
+            skuteczności (przy remisie najpóźniej dodane najpierw). Kopiec choroby przeglądany jest od korzenia
+            kolejką priorytetową pozycji i nie jest modyfikowany; nieaktualne wpisy i powtórzenia są pomijane,
+            a przegląd kończy się na pierwszym wpisie poniżej min_efficacy.
+        '''
+        disease = self.disease_ids.get(disease_name)
+        if disease is None:
+            return
+        heap = self.indication_heap[disease]
+        drugs = self.drugs_by_order
+        seen = set()
+        candidates = [(-heap[0], 0)] if heap else []
+        while candidates:
+            neg_key, pos = heapq.heappop(candidates)
+            key = -neg_key
+            efficacy = key >> ORDER_BITS
+            if efficacy < min_efficacy:
+                return
+            order = key & ORDER_MASK
+            if order not in seen and drugs[order].indications.get(disease_name) == efficacy:
+                seen.add(order)
+                yield order
+            for child in (2 * pos + 1, 2 * pos + 2):
+                if child < len(heap):
+                    heapq.heappush(candidates, (-heap[child], child))
+
+
+    def _safety_index(self):
+        if self.safety is None:
+            from pharmdb_safety import SafetyIndex
+            self.safety = self.register_index(SafetyIndex(self))
+        return self.safety
+
+    def safest_drug_for_indication(self, disease_name, min_efficacy=1):
+        '''
+            Zwraca identyfikator leku o najmniejszym risk_score spośród leków leczących chorobę ze skutecznością
+            co najmniej min_efficacy (przy remisie wcześniej dodany) lub None, jeśli takiego leku nie ma.
+
+            Przy pierwszym wywołaniu budowany jest indeks ryzyka (SafetyIndex), który add_drug,
+            update_best_indication i zmiana modelu ryzyka utrzymują dalej.
+
+            Args:
+                disease_name (str): nazwa choroby
+                min_efficacy (int, optional): minimalna skuteczność
 
+            Returns:
+                str: identyfikator leku
+
+            Złożoność czasowa: O(log K)
+        '''
+        orders = self._safety_index().safest(disease_name, min_efficacy, 1)
+        return self.drugs_by_order[orders[0]].id if orders else None
+
+    def top_k_safest_drugs(self, disease_name, k, min_efficacy=1):
+        '''
+            Zwraca identyfikatory k leków o najmniejszym risk_score (rosnąco, przy remisie wcześniej dodane)
+            spośród leków leczących chorobę ze skutecznością co najmniej min_efficacy.
+
+            Złożoność czasowa: O(log K + k)
+        '''
+        drugs = self.drugs_by_order
+        return [drugs[order].id for order in self._safety_index().safest(disease_name, min_efficacy, k)]
 
     def update_best_indication(self, disease_name, new_efficacy):
         '''
@@ -384,14 +1686,29 @@ class PharmDB:
         
             Wymagana złożoność czasowa: O(log K)
         '''
-        if disease_name not in self.best_drug_for_disease:
+        if self.pending_batch is not None:
+            raise RuntimeError("update_best_indication nie jest dostępne w otwartej transakcji wsadowej")
+        disease = self.disease_ids.get(disease_name)
+        if disease is None or not self.best_drug_for_disease[disease]:
             return
 
         # Pobieram lek aktualnie najlepszy dla choroby
-        _, drug_id = self.best_drug_for_disease[disease_name]
-        drug = self.drugs_by_id[drug_id]
+        self._set_efficacy(self.best_drug_for_disease[disease] & ORDER_MASK, disease, new_efficacy)
+
+    def _set_efficacy(self, order, disease, new_efficacy):
+        '''
+            Zmienia skuteczność leku order dla choroby o numerze disease (lek musi ją leczyć): histogram,
+            kopiec i najlepszy lek choroby, strumień zmian, indeksy pomocnicze i dziennik zmian.
+            Używana przez update_best_indication oraz apply_delta.
+
+            Złożoność czasowa: O(log K) (plus zdjęcie nieaktualnych wpisów ze szczytu kopca)
+        '''
+        disease_name = self.disease_names[disease]
+        drug = self.drugs_by_order[order]
 
         old_eff = drug.indications[disease_name]
+        if old_eff != new_efficacy:
+            self._log_change(CHANGE_EFFICACY, order, disease)
         drug.indications[disease_name] = new_efficacy
 
         # Aktualizuję histogram skuteczności. Odejmuję stare poziomy i dodaję nowe
@@ -401,14 +1718,27 @@ class PharmDB:
             drug.efficacy_histogram[level] += 1
 
         # Dodaję nową wartość do kopca bez usuwania starej wartości
-        heapq.heappush(self.indication_heap[disease_name], (-new_efficacy, -drug.insert_order, drug_id))
+        heap = self.indication_heap[disease]
+        _heap_push(heap, (new_efficacy << ORDER_BITS) | order)
 
         # Czyszczę górę kopca tylko jeśli jest nieaktualny
-        while self.indication_heap[disease_name]:
-            eff, neg_order, top_id = self.indication_heap[disease_name][0]
-            current_eff = self.drugs_by_id[top_id].indications.get(disease_name)
-            if current_eff is not None and -eff == current_eff:
+        old_key = self.best_drug_for_disease[disease]
+        stale = 0
+        while heap:
+            key = heap[0]
+            top = key & ORDER_MASK
+            current_eff = self.drugs_by_order[top].indications.get(disease_name)
+            if current_eff is not None and key >> ORDER_BITS == current_eff:
                 # Aktualizuję najlepszy lek dla choroby
-                self.best_drug_for_disease[disease_name] = (current_eff, top_id)
+                self.best_drug_for_disease[disease] = key
                 break
-            heapq.heappop(self.indication_heap[disease_name])  # usuwam nieaktualny wpis
\ No newline at end of file
+            _heap_pop(heap)  # usuwam nieaktualny wpis
+            stale += 1
+
+        if self.stats is not None:
+            self.stats.record("stale_heap_pops", stale)
+        if self.feed is not None and self.best_drug_for_disease[disease] != old_key:
+            self.feed.publish(disease_name, old_key, self.best_drug_for_disease[disease])
+
+        for index in self.indexes:
+            index.on_update(drug, disease_name, old_eff, new_efficacy)
@@ -0,0 +1,111 @@
+# Testy transakcji wsadowych
+from pharmdb import PharmDB
+from pharma_db_extended import PharmaDB
+from pharmdb_bench import generate_catalogue, load_catalogue
+
+
+def snapshot(db):
+    return ([(d.id, d.name, d.indications, d.efficacy_histogram, sorted(d.substitutes), sorted(d.replaced_by),
+              d.side_effects, d.risk_score, d.worst_effect_name) for d in db.drugs_by_order[1:]],
+            {k: sorted(v) for k, v in db.reverse_substitutes.items()},
+            list(db.best_drug_for_disease), db.disease_names, db.effect_names,
+            list(db.side_effect_drug), list(db.side_effect_effect), list(db.side_effect_freq))
+
+
+def add_rows(db, rows, first):
+    # Wiersze generatora od pozycji first katalogu (zamienniki to indeksy w całym katalogu)
+    return [db.add_drug(name, indications, [db.format_drug_id(j + 1) for j in substitutes], side_effects)
+            for name, indications, substitutes, side_effects in rows[first:]]
+
+
+rows = generate_catalogue(600, substitution_degree=4, n_diseases=25, seed=9)
+
+for cls in (PharmDB, PharmaDB):
+    sequential = cls()
+    load_catalogue(sequential, rows[:200])
+    add_rows(sequential, rows, 200)
+    sequential.update_best_indication("choroba_2", 1)
+
+    batched = cls()
+    batched.can_replace("D0001", "D0001")               # indeksy przyrostowe już istnieją
+    batched.longest_alternative_list()
+    with batched.batch():
+        load_catalogue(batched, rows[:200])             # wsad na pustej bazie
+    with batched.batch():
+        ids = add_rows(batched, rows, 200)
+        # Zapytania w transakcji widzą stan sprzed niej
+        assert batched.order_of(ids[0]) is None and batched.next_id_number == 201
+    assert ids == [sequential.format_drug_id(o) for o in range(201, 601)]
+    batched.update_best_indication("choroba_2", 1)
+
+    assert snapshot(batched) == snapshot(sequential)
+    for disease in batched.disease_names:
+        assert batched.top_k_drugs_for_indication(disease, 10) == sequential.top_k_drugs_for_indication(disease, 10)
+    assert batched.longest_alternative_list() == sequential.longest_alternative_list()
+    assert batched.top_k_chains(5) == sequential.top_k_chains(5)
+    for x in range(1, 601, 37):
+        for y in range(1, 601, 41):
+            a, b = batched.format_drug_id(x), batched.format_drug_id(y)
+            assert batched.can_replace(a, b) == sequential.can_replace(a, b)
+    if cls is PharmaDB:
+        assert list(batched.side_effect_freq_map.items()) == list(sequential.side_effect_freq_map.items())
+
+# Transakcja jest atomowa: błędny zamiennik porzuca wszystkie odłożone leki
+db = PharmaDB()
+load_catalogue(db, rows[:50])
+before = snapshot(db)
+frequencies = list(db.side_effect_freq_map.items())
+try:
+    with db.batch():
+        first = db.add_drug("Nowy", [("nowa_choroba", 10)], ["D0001"], [("nowy_objaw", 3, 99.0)])
+        db.add_drug("Drugi", [], [first], [])           # zamiennik z tego samego wsadu jest poprawny
+        db.add_drug("Zły", [("choroba_1", 10)], ["D9999"], [])
+    assert False
+except Exception as error:
+    assert "zamiennikiem" in str(error)
+assert snapshot(db) == before and list(db.side_effect_freq_map.items()) == frequencies
+assert db.pending_batch is None and db.find_best_drug_for_indication("nowa_choroba") is None
+
+# Wyjątek użytkownika w bloku również wycofuje transakcję
+try:
+    with db.batch():
+        db.add_drug("Nowy", [("choroba_1", 10)], [], [])
+        raise KeyError("przerwane")
+except KeyError:
+    pass
+assert snapshot(db) == before
+
+# Transakcji nie można zagnieżdżać; pusty wsad nic nie zmienia
+with db.batch():
+    try:
+        with db.batch():
+            pass
+        assert False
+    except RuntimeError:
+        pass
+assert snapshot(db) == before
+
+# Zapisy, których nie da się odłożyć, są w transakcji odrzucane — wyjątek porzuca wtedy cały wsad
+from pharmdb import RiskModel
+
+version = db.version
+for write in (lambda: db.update_best_indication("choroba_1", 1),
+              lambda: db.set_risk_model(RiskModel({1: 1, 2: 4, 3: 9}))):
+    try:
+        with db.batch():
+            db.add_drug("B", [("choroba_1", 10)], [], [])
+            write()
+        assert False
+    except RuntimeError:
+        pass
+    assert snapshot(db) == before and db.version == version and db.risk_model.level_weights is None
+
+# Strumień zmian: co najwyżej jedno zdarzenie na chorobę na transakcję
+subscription = db.subscribe()
+old = db.find_best_drug_for_indication("choroba_1")
+with db.batch():
+    a = db.add_drug("A", [("choroba_1", 10)], [], [])
+    b = db.add_drug("B", [("choroba_1", 10)], [], [])
+events = subscription.poll()
+assert [(e.disease, e.old_best, e.new_best, e.efficacy) for e in events] == [("choroba_1", old, b, 10)]
+print("Testy transakcji wsadowych zakończone sukcesem!")
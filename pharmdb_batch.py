@@ -0,0 +1,159 @@
+# Wsadowe transakcje zapisu PharmDB (with db.batch(): ...)
+#
+# Wewnątrz transakcji add_drug tylko sprawdza dane i odkłada lek (identyfikator jest nadawany od razu, więc
+# kolejne leki wsadu mogą wskazywać wcześniejsze jako zamienniki). Zapytania widzą stan sprzed transakcji.
+# Przy zatwierdzeniu cała obsługa struktur odbywa się hurtowo:
+#   - jeden heapify (lub dopisanie, gdy nowych wpisów jest mało) na każdą dotkniętą chorobę,
+#   - jedna aktualizacja best_drug_for_disease i co najwyżej jedno zdarzenie strumienia zmian na chorobę,
+#   - jedno on_bulk_insert na indeks pomocniczy (np. scalenie posortowanych częstotliwości w PharmaDB).
+# Transakcja jest atomowa: wyjątek wewnątrz bloku with (np. nieznany zamiennik) lub przy budowie obiektów Drug
+# porzuca wszystkie odłożone leki i baza pozostaje bez zmian. Pozostałe zapisy (update_best_indication,
+# set_risk_model, add_substitutes, apply_delta) zmieniałyby bazę od razu, więc w otwartej transakcji
+# zgłaszają RuntimeError.
+
+from math import log2
+
+from pharmdb import ORDER_BITS, Drug, _heap_push, _heapify
+
+
+class WriteBatch:
+    '''
+        Transakcja wsadowa (tworzona przez PharmDB.batch()).
+    '''
+
+    def __init__(self, db):
+        self.db = db
+        self.first_order = db.next_id_number
+        self.staged = []                # (identyfikator, nazwa, wskazania, klucze zamienników, skutki uboczne)
+        self.staged_ids = {}            # identyfikator → klucz dla leków wsadu
+
+    def __enter__(self):
+        if self.db.pending_batch is not None:
+            raise RuntimeError("Transakcja wsadowa jest już otwarta")
+        self.db.pending_batch = self
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.db.pending_batch = None
+        if exc_type is None:
+            self.commit()
+        return False
+
+    def add_drug(self, drug_name, indications=None, substitutes=None, side_effects=None):
+        db = self.db
+        order = self.first_order + len(self.staged)
+        drug_id = db.format_drug_id(order)
+
+        substitute_orders = []
+        if substitutes:
+            for sub_id in substitutes:
+                sub_order = self.staged_ids.get(sub_id)
+                if sub_order is None:
+                    sub_order = db.order_of(sub_id)
+                if sub_order is None:
+                    raise Exception("Dodany lek może być zamiennikiem tylko dla leków wcześniej dodanych do bazy danych!")
+                substitute_orders.append(sub_order)
+
+        self.staged.append((drug_id, drug_name, indications, substitute_orders, side_effects))
+        self.staged_ids[drug_id] = order
+        return drug_id
+
+    def commit(self):
+        db = self.db
+        if not self.staged:
+            return
+
+        # Faza 1: obiekty Drug (tu mogą wystąpić błędy danych) — baza jeszcze nie jest zmieniana.
+        # Nowe nazwy chorób i objawów dostają kanoniczny egzemplarz napisu od pierwszego wystąpienia we wsadzie.
+        disease_ids = db.disease_ids
+        disease_names = db.disease_names
+        effect_ids = db.effect_ids
+        effect_names = db.effect_names
+        risk_model = db.risk_model
+        new_diseases = {}
+        new_effects = {}
+        drugs = []
+        order = self.first_order
+        for drug_id, name, indications, substitute_orders, side_effects in self.staged:
+            interned = []
+            if indications:
+                for disease_name, efficacy in indications:
+                    disease = disease_ids.get(disease_name)
+                    if disease is not None:
+                        interned.append((disease_names[disease], efficacy))
+                    else:
+                        interned.append((new_diseases.setdefault(disease_name, disease_name), efficacy))
+            interned_effects = []
+            if side_effects:
+                for effect_name, level, freq in side_effects:
+                    effect = effect_ids.get(effect_name)
+                    if effect is not None:
+                        effect_name = effect_names[effect]
+                    else:
+                        effect_name = new_effects.setdefault(effect_name, effect_name)
+                    interned_effects.append((effect_name, level, freq))
+            drugs.append(Drug(drug_id=drug_id, name=name, insert_order=order, indications=interned,
+                              substitutes=substitute_orders, side_effects=interned_effects, risk_model=risk_model))
+            order += 1
+
+        # Faza 2: dopisanie leków, kolumn skutków ubocznych i relacji zamian
+        drugs_by_id = db.drugs_by_id
+        drugs_by_order = db.drugs_by_order
+        reverse = db.reverse_substitutes
+        intern_disease = db.intern_disease
+        intern_effect = db.intern_effect
+        effect_drug = []
+        effect_level = []
+        effect_freq = []
+        effect_effect = []
+        touched = {}                    # numer choroby → nowe spakowane wpisy kopca
+        for drug in drugs:
+            order = drug.insert_order
+            drugs_by_id[drug.id] = drug
+            drugs_by_order.append(drug)
+            for effect_name, level, freq in drug.side_effects:
+                effect_drug.append(order)
+                effect_level.append(level)
+                effect_freq.append(freq)
+                effect_effect.append(intern_effect(effect_name))
+            for sub in drug.substitutes:
+                replacing = reverse.get(sub)
+                if replacing is None:
+                    reverse[sub] = {order}
+                else:
+                    replacing.add(order)
+                drugs_by_order[sub].replaced_by.add(order)
+            for disease_name, efficacy in drug.indications.items():
+                disease = intern_disease(disease_name)
+                keys = touched.get(disease)
+                if keys is None:
+                    touched[disease] = [(efficacy << ORDER_BITS) | order]
+                else:
+                    keys.append((efficacy << ORDER_BITS) | order)
+        db.side_effect_drug.extend(effect_drug)
+        db.side_effect_level.extend(effect_level)
+        db.side_effect_freq.extend(effect_freq)
+        db.side_effect_effect.extend(effect_effect)
+        db.next_id_number += len(drugs)
+        db.drug_version.extend(range(db.version + 1, db.version + 1 + len(drugs)))
+        db.version += len(drugs)
+
+        # Faza 3: kopce i najlepsze leki — raz na chorobę
+        best = db.best_drug_for_disease
+        for disease, keys in touched.items():
+            heap = db.indication_heap[disease]
+            if len(keys) * log2(len(heap) + 2) > len(heap) + len(keys):
+                heap.extend(keys)
+                _heapify(heap)
+            else:
+                for key in keys:
+                    _heap_push(heap, key)
+            top = max(keys)
+            if top > best[disease]:
+                if db.feed is not None:
+                    db.feed.publish(db.disease_names[disease], best[disease], top)
+                best[disease] = top
+
+        # Faza 4: indeksy pomocnicze
+        for index in db.indexes:
+            index.on_bulk_insert(drugs)
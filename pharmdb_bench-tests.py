@@ -0,0 +1,131 @@
+# Testy zestawu benchmarków (mały katalog, sprawdzenie struktury wyników)
+import json
+import os
+import tempfile
+
+from pharmdb_bench import generate_catalogue, load_catalogue, run_suite, compare, main
+from pharmdb import PharmDB
+
+# Generator jest deterministyczny i zamienniki wskazują tylko na wcześniejsze leki
+rows = generate_catalogue(200, substitution_degree=4, n_diseases=10, n_side_effects=20, seed=7)
+assert rows == generate_catalogue(200, substitution_degree=4, n_diseases=10, n_side_effects=20, seed=7)
+assert rows != generate_catalogue(200, substitution_degree=4, n_diseases=10, n_side_effects=20, seed=8)
+assert all(j < i for i, row in enumerate(rows) for j in row[2])
+assert all(len(row[2]) <= 4 for row in rows)
+
+db = PharmDB()
+ids = load_catalogue(db, rows)
+assert len(ids) == 200 and len(db.drugs_by_id) == 200
+assert sum(len(s) for s in db.reverse_substitutes.values()) == sum(len(row[2]) for row in rows)
+
+# Punkt odniesienia frontu Pareto zwraca te same leki co pareto_alternatives (także przy remisach)
+from pharmdb_bench import naive_pareto_alternatives
+
+for seed in (7, 13):
+    pareto_db = PharmDB()
+    load_catalogue(pareto_db, generate_catalogue(300, substitution_degree=3, n_diseases=5, n_side_effects=3,
+                                                 side_effects_per_drug=1, seed=seed))
+    for order in range(1, 301, 3):
+        drug_id = pareto_db.format_drug_id(order)
+        for disease in ("choroba_0", "choroba_3"):
+            for steps in (1, 2, 4):
+                expected = pareto_db.pareto_alternatives(drug_id, disease, steps)
+                assert naive_pareto_alternatives(pareto_db, drug_id, disease, steps) == expected
+
+report = run_suite("core", n_drugs=300, ops=200, seed=1)
+assert report["meta"]["drugs"] == 300
+for name in ["add_drug", "risk_score", "find_best_alternative", "longest_alternative_list",
+             "find_best_drug_for_indication", "update_best_indication"]:
+    stats = report["results"][name]
+    assert stats["ops"] > 0 and stats["p50_us"] <= stats["p95_us"] <= stats["p99_us"] <= stats["max_us"]
+assert "count_drugs_with_side_effect_frequency" not in report["results"]
+assert report["results"]["memory"]["peak_bytes_build"] > 0
+
+extended = run_suite("extended", n_drugs=300, ops=200, seed=1, only=["list_drugs_with_side_effect_frequency"],
+                     measure_memory=False)
+assert list(extended["results"]) == ["list_drugs_with_side_effect_frequency"]
+
+# Benchmarki zapytań o ciągi, rankingi stopni, bezpieczeństwo, zapytań złożonych i rozkładu częstotliwości
+queries = ["chain_length", "longest_chain_from", "top_k_chains", "most_replaceable_drugs", "most_versatile_drugs",
+           "count_drugs_by_replacers", "count_drugs_by_substitutes", "safest_drug_for_indication",
+           "top_k_safest_drugs", "similar_drugs", "query"]
+assert all(report["results"][name]["ops"] > 0 for name in queries)
+assert "frequency_rank" not in report["results"]
+frequency = ["frequency_rank", "frequency_quantile", "kth_side_effect"]
+extended = run_suite("extended", n_drugs=300, ops=200, seed=1, only=frequency + ["query"], measure_memory=False)
+assert list(extended["results"]) == ["query"] + frequency
+
+assert set(compare(report, report).values()) == {1.0}
+
+# Zapis do JSON przez interfejs wiersza poleceń
+with tempfile.TemporaryDirectory() as tmp:
+    out = os.path.join(tmp, "wyniki.json")
+    assert main(["--drugs", "100", "--ops", "50", "--no-memory", "--out", out]) == 0
+    with open(out, encoding="utf-8") as f:
+        saved = json.load(f)
+    assert saved["meta"]["seed"] == 0 and "risk_score" in saved["results"]
+
+# Przepustowość aktualizacji w wersji z shardami
+from pharmdb_bench import run_sharded_updates
+
+sharded = run_sharded_updates([1, 2], n_drugs=200, n_diseases=20, ops=300, batch_size=100)
+assert list(sharded["results"]) == ["shards_0", "shards_1", "shards_2"]
+assert all(stats["ops"] == 300 and stats["ops_per_sec"] > 0 for stats in sharded["results"].values())
+
+# Wczytanie katalogu: add_drug kontra transakcja wsadowa
+from pharmdb_bench import run_batch_insert
+
+batch_report = run_batch_insert("extended", n_drugs=300)
+assert set(batch_report["results"]) == {"sequential_insert", "batch_insert"}
+assert all(stats["ops"] == 300 for stats in batch_report["results"].values())
+
+# Indeks posortowany: SortedKeyDict kontra SortedDict oraz zimny import
+from pharmdb_bench import run_sorted_index
+
+sorted_report = run_sorted_index(n_keys=2000, ops=50)
+for name in ("insert_sortedkeydict", "range_count_sortedkeydict", "range_list_sortedkeydict"):
+    assert sorted_report["results"][name]["ops_per_sec"] > 0
+assert sorted_report["results"]["cold_import"]["import_ms"]["pharma_db_extended"] > 0
+
+# Wyszukiwanie podobnych profili wskazań
+from pharmdb_bench import run_similarity
+
+similarity_report = run_similarity(n_drugs=500, n_diseases=40, ops=60, batch_size=20)
+assert set(similarity_report["results"]) == {"similarity_index_build", "similar_drugs", "similar_drugs_batch"}
+assert similarity_report["results"]["similar_drugs_batch"]["ops"] == 60
+
+from pharmdb_bench import run_add_substitutes
+
+substitutes_report = run_add_substitutes(n_drugs=300, n_edges=2000, batch_size=500)
+assert substitutes_report["results"]["add_substitutes"]["ops"] == 2000
+assert substitutes_report["results"]["add_substitutes"]["batches"] == 4
+
+# Słowniki nazw przy wielu chorobach: każda nazwa przechowywana w lekach jednym obiektem napisu
+from pharmdb_bench import run_vocabulary
+
+vocabulary_report = run_vocabulary(n_drugs=400, n_diseases=300, n_side_effects=200, ops=50)
+memory = vocabulary_report["results"]["memory"]
+assert memory["disease_name_objects"] == memory["diseases"] and memory["effect_name_objects"] == memory["effects"]
+assert memory["retained_bytes"] > 0 and vocabulary_report["results"]["update_best_indication"]["ops"] == 50
+
+# Baza zmienna kontra zamrożona
+from pharmdb_bench import run_freeze
+
+freeze_report = run_freeze("extended", n_drugs=300, n_diseases=20, n_side_effects=30, ops=50)
+assert freeze_report["results"]["freeze"]["ops"] == 1
+assert freeze_report["results"]["freeze_memory"]["frozen_bytes"] > 0
+assert "update_best_indication" not in freeze_report["speedup"]
+for name in ("top_k_drugs_for_indication", "can_replace", "count_drugs_with_side_effect_frequency", "pareto_alternatives",
+             "similar_drugs", "top_k_safest_drugs", "most_replaceable_drugs", "top_k_chains", "total"):
+    assert freeze_report["speedup"][name] > 0
+assert freeze_report["results"]["top_k_drugs_for_indication_frozen"]["ops"] == 50
+
+# Replikacja przyrostowa kontra pełne przeładowanie katalogu
+from pharmdb_bench import run_delta
+
+delta_report = run_delta(n_drugs=300, n_new=20, n_updates=30, n_diseases=20, n_side_effects=30)
+assert set(delta_report["results"]) == {"initial_sync", "export_delta", "apply_delta", "full_reload"}
+assert delta_report["results"]["apply_delta"]["ops"] >= 20 and delta_report["results"]["export_delta"]["bytes"] > 0
+assert delta_report["speedup"]["delta_vs_full_reload"] > 0
+
+print("Testy benchmarków zakończone sukcesem!")
@@ -0,0 +1,905 @@
+# Zestaw benchmarków dla PharmDB / PharmaDB
+#
+# Przykłady użycia:
+#   python pharmdb_bench.py --drugs 100000 --degree 5 --out wyniki.json
+#   python pharmdb_bench.py --db extended --drugs 20000 --compare poprzednie.json
+#   python pharmdb_bench.py --drugs 100000 --degree 300 --only find_best_alternative substitution_path
+#   python pharmdb_bench.py --drugs 200000 --diseases 50000 --only find_best_drug_for_indication update_best_indication
+#   python pharmdb_bench.py --drugs 200000 --diseases 50000 --side-effects 50000 --vocabulary
+#   python pharmdb_bench.py --drugs 100000 --diseases 5000 --ops 200000 --shards 1 2 4 8
+#   python pharmdb_bench.py --db extended --drugs 100000 --batch
+#   python pharmdb_bench.py --drugs 10000 --ops 20000 --sorted-index
+#   python pharmdb_bench.py --drugs 1000000 --diseases 50000 --ops 2000 --similarity
+#   python pharmdb_bench.py --drugs 100000 --substitutes 1000000
+#   python pharmdb_bench.py --db extended --drugs 100000 --freeze
+#   python pharmdb_bench.py --db extended --drugs 200000 --diseases 1000 --delta 4000
+#
+# Katalog testowy jest generowany deterministycznie z ziarna (--seed), więc wyniki z różnych
+# commitów można porównywać (--compare). Dla każdej operacji raportowane są: liczba operacji na sekundę
+# oraz percentyle opóźnień (p50/p95/p99, w mikrosekundach). Szczytowe zużycie pamięci mierzone jest
+# (tracemalloc) w osobnym przebiegu budowania katalogu, aby nie zaburzać pomiarów czasu.
+
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+
+def generate_catalogue(n_drugs, substitution_degree=3, n_diseases=100, n_side_effects=200,
+                       indications_per_drug=3, side_effects_per_drug=3, seed=0):
+    '''
+        Generuje deterministyczny syntetyczny katalog leków.
+
+        Args:
+            n_drugs (int): liczba leków
+            substitution_degree (int): maksymalna liczba leków zastępowanych przez każdy lek
+                    (zamienniki losowane spośród leków dodanych wcześniej)
+            n_diseases (int): liczba różnych chorób
+            n_side_effects (int): liczba różnych nazw skutków ubocznych
+            indications_per_drug (int): maksymalna liczba wskazań leku
+            side_effects_per_drug (int): maksymalna liczba skutków ubocznych leku
+            seed (int): ziarno generatora
+
+        Returns:
+            list: krotki (nazwa, wskazania, indeksy zastępowanych leków, skutki uboczne)
+    '''
+    rng = random.Random(seed)
+    diseases = [f"choroba_{i}" for i in range(n_diseases)]
+    effects = [f"objaw_{i}" for i in range(n_side_effects)]
+
+    rows = []
+    for i in range(n_drugs):
+        indications = [(disease, rng.randint(1, 10))
+                       for disease in rng.sample(diseases, rng.randint(0, min(indications_per_drug, n_diseases)))]
+        substitutes = rng.sample(range(i), rng.randint(0, min(substitution_degree, i))) if i else []
+        side_effects = [(effect, rng.randint(1, 3), round(rng.uniform(0.1, 50.0), 1))
+                        for effect in rng.sample(effects, rng.randint(0, min(side_effects_per_drug, n_side_effects)))]
+        rows.append((f"Drug_{i}", indications, substitutes, side_effects))
+    return rows
+
+
+def load_catalogue(db, rows):
+    '''
+        Wstawia wygenerowany katalog do bazy (add_drug) i zwraca listę identyfikatorów leków.
+    '''
+    ids = []
+    for name, indications, substitutes, side_effects in rows:
+        ids.append(db.add_drug(name, indications, [ids[j] for j in substitutes], side_effects))
+    return ids
+
+
+def _summary(latencies_ns):
+    latencies_ns.sort()
+    n = len(latencies_ns)
+    total = sum(latencies_ns)
+
+    def percentile(p):
+        return latencies_ns[min(n - 1, int(p * n))] / 1000.0
+
+    return {
+        "ops": n,
+        "total_s": total / 1e9,
+        "ops_per_sec": n / (total / 1e9) if total else float("inf"),
+        "p50_us": percentile(0.50),
+        "p95_us": percentile(0.95),
+        "p99_us": percentile(0.99),
+        "max_us": latencies_ns[-1] / 1000.0,
+    }
+
+
+def _timed(func, calls):
+    clock = time.perf_counter_ns
+    latencies = []
+    for args in calls:
+        start = clock()
+        func(*args)
+        latencies.append(clock() - start)
+    return _summary(latencies)
+
+
+# Rejestr benchmarków zapytań: nazwa → (wymaga PharmaDB, funkcja budująca (metoda, lista argumentów))
+QUERY_BENCHMARKS = {}
+
+
+def query_benchmark(name, extended_only=False):
+    def register(builder):
+        QUERY_BENCHMARKS[name] = (extended_only, builder)
+        return builder
+    return register
+
+
+@query_benchmark("number_of_indications")
+def _bench_number_of_indications(db, ids, diseases, rng, ops):
+    return db.number_of_indications, [(rng.choice(ids), rng.randint(1, 10)) for _ in range(ops)]
+
+
+@query_benchmark("number_of_alternative_drugs")
+def _bench_number_of_alternative_drugs(db, ids, diseases, rng, ops):
+    return db.number_of_alternative_drugs, [(rng.choice(ids),) for _ in range(ops)]
+
+
+@query_benchmark("worst_side_effect")
+def _bench_worst_side_effect(db, ids, diseases, rng, ops):
+    return db.worst_side_effect, [(rng.choice(ids),) for _ in range(ops)]
+
+
+@query_benchmark("risk_score")
+def _bench_risk_score(db, ids, diseases, rng, ops):
+    return db.risk_score, [(rng.choice(ids),) for _ in range(ops)]
+
+
+@query_benchmark("find_best_alternative")
+def _bench_find_best_alternative(db, ids, diseases, rng, ops):
+    return db.find_best_alternative, [(rng.choice(ids), 2) for _ in range(max(1, ops // 100))]
+
+
+@query_benchmark("regimen_risk")
+def _bench_regimen_risk(db, ids, diseases, rng, ops):
+    return db.regimen_risk, [(rng.sample(ids, min(20, len(ids))), 2) for _ in range(max(1, ops // 100))]
+
+
+def naive_pareto_alternatives(db, drug_id, disease_name, max_steps=2):
+    '''
+        Punkt odniesienia dla pareto_alternatives: pełny BFS, filtrowanie leków leczących chorobę
+        i wyznaczenie frontu dopiero na końcu (sortowanie po skuteczności).
+    '''
+    start = db.order_of(drug_id)
+    drugs = db.drugs_by_order
+    visited = {start}
+    frontier = [start]
+    reached = []                    # (klucz leku, liczba zamian)
+    for steps in range(1, max_steps + 1):
+        next_frontier = []
+        for current in frontier:
+            for neighbor in db.reverse_substitutes.get(current, ()):
+                if neighbor not in visited:
+                    visited.add(neighbor)
+                    next_frontier.append(neighbor)
+        reached.extend((o, steps) for o in next_frontier)
+        frontier = next_frontier
+    # Przy identycznych parach (skuteczność, ryzyko) — jak w pareto_alternatives — mniej zamian, potem wcześniej dodany
+    candidates = sorted((-drugs[o].indications[disease_name], drugs[o].risk_score, steps, o)
+                        for o, steps in reached if disease_name in drugs[o].indications)
+    front = []
+    for neg, risk, _, order in candidates:
+        if not front or risk < front[-1][2]:
+            front.append((drugs[order].id, -neg, risk))
+    return front
+
+
+@query_benchmark("pareto_alternatives")
+def _bench_pareto_alternatives(db, ids, diseases, rng, ops):
+    return db.pareto_alternatives, [(rng.choice(ids), rng.choice(diseases), 5) for _ in range(max(1, ops // 100))]
+
+
+@query_benchmark("pareto_alternatives_naive")
+def _bench_pareto_alternatives_naive(db, ids, diseases, rng, ops):
+    calls = [(db, rng.choice(ids), rng.choice(diseases), 5) for _ in range(max(1, ops // 100))]
+    return naive_pareto_alternatives, calls
+
+
+@query_benchmark("can_replace")
+def _bench_can_replace(db, ids, diseases, rng, ops):
+    db.can_replace(ids[0], ids[0])     # budowa indeksu osiągalności poza pomiarem
+    return db.can_replace, [(rng.choice(ids), rng.choice(ids)) for _ in range(ops)]
+
+
+@query_benchmark("cheapest_substitution_path")
+def _bench_cheapest_substitution_path(db, ids, diseases, rng, ops):
+    return db.cheapest_substitution_path, [(rng.choice(ids), rng.choice(diseases), 8) for _ in range(max(1, ops // 100))]
+
+
+@query_benchmark("substitution_path")
+def _bench_substitution_path(db, ids, diseases, rng, ops):
+    calls = []
+    for _ in range(max(1, ops // 100)):
+        # Cel z drugiej połowy katalogu, start z pierwszej — ścieżki w grafie prowadzą do nowszych leków
+        start = rng.randrange(len(ids) // 2 + 1)
+        calls.append((ids[start], ids[rng.randrange(start, len(ids))]))
+    return db.substitution_path, calls
+
+
+@query_benchmark("longest_alternative_list")
+def _bench_longest_alternative_list(db, ids, diseases, rng, ops):
+    return db.longest_alternative_list, [() for _ in range(3)]
+
+
+@query_benchmark("chain_length")
+def _bench_chain_length(db, ids, diseases, rng, ops):
+    db.chain_length(ids[0])            # budowa indeksu ciągów poza pomiarem
+    return db.chain_length, [(rng.choice(ids),) for _ in range(ops)]
+
+
+@query_benchmark("longest_chain_from")
+def _bench_longest_chain_from(db, ids, diseases, rng, ops):
+    db.chain_length(ids[0])
+    return db.longest_chain_from, [(rng.choice(ids),) for _ in range(ops)]
+
+
+@query_benchmark("top_k_chains")
+def _bench_top_k_chains(db, ids, diseases, rng, ops):
+    db.chain_length(ids[0])
+    return db.top_k_chains, [(10, rng.random() < 0.5) for _ in range(max(1, ops // 100))]
+
+
+@query_benchmark("find_best_drug_for_indication")
+def _bench_find_best_drug_for_indication(db, ids, diseases, rng, ops):
+    return db.find_best_drug_for_indication, [(rng.choice(diseases),) for _ in range(ops)]
+
+
+@query_benchmark("top_k_drugs_for_indication")
+def _bench_top_k_drugs_for_indication(db, ids, diseases, rng, ops):
+    return db.top_k_drugs_for_indication, [(rng.choice(diseases), 10) for _ in range(ops)]
+
+
+@query_benchmark("update_best_indication")
+def _bench_update_best_indication(db, ids, diseases, rng, ops):
+    return db.update_best_indication, [(rng.choice(diseases), rng.randint(1, 10)) for _ in range(ops)]
+
+
+# Zapytania korzystające z leniwych indeksów (rankingi stopni, bezpieczeństwo, podobieństwo) mierzone są po
+# update_best_indication, tak aby jego czas nie obejmował utrzymania indeksów zbudowanych przez te benchmarki
+
+@query_benchmark("most_replaceable_drugs")
+def _bench_most_replaceable_drugs(db, ids, diseases, rng, ops):
+    db.most_replaceable_drugs(1)       # budowa indeksu rankingów poza pomiarem
+    calls = [(10, rng.choice(diseases) if rng.random() < 0.5 else None) for _ in range(max(1, ops // 10))]
+    return db.most_replaceable_drugs, calls
+
+
+@query_benchmark("most_versatile_drugs")
+def _bench_most_versatile_drugs(db, ids, diseases, rng, ops):
+    db.most_versatile_drugs(1)
+    calls = [(10, rng.choice(diseases) if rng.random() < 0.5 else None) for _ in range(max(1, ops // 10))]
+    return db.most_versatile_drugs, calls
+
+
+@query_benchmark("count_drugs_by_replacers")
+def _bench_count_drugs_by_replacers(db, ids, diseases, rng, ops):
+    db.count_drugs_by_replacers(0, 0)
+    calls = []
+    for _ in range(ops):
+        low = rng.randint(0, 4)
+        calls.append((low, low + rng.randint(0, 4), rng.choice(diseases) if rng.random() < 0.5 else None))
+    return db.count_drugs_by_replacers, calls
+
+
+@query_benchmark("count_drugs_by_substitutes")
+def _bench_count_drugs_by_substitutes(db, ids, diseases, rng, ops):
+    db.count_drugs_by_substitutes(0, 0)
+    calls = []
+    for _ in range(ops):
+        low = rng.randint(0, 4)
+        calls.append((low, low + rng.randint(0, 4), rng.choice(diseases) if rng.random() < 0.5 else None))
+    return db.count_drugs_by_substitutes, calls
+
+
+@query_benchmark("safest_drug_for_indication")
+def _bench_safest_drug_for_indication(db, ids, diseases, rng, ops):
+    db.safest_drug_for_indication(diseases[0])     # budowa indeksu bezpieczeństwa poza pomiarem
+    return db.safest_drug_for_indication, [(rng.choice(diseases), rng.randint(1, 10)) for _ in range(ops)]
+
+
+@query_benchmark("top_k_safest_drugs")
+def _bench_top_k_safest_drugs(db, ids, diseases, rng, ops):
+    db.safest_drug_for_indication(diseases[0])
+    return db.top_k_safest_drugs, [(rng.choice(diseases), 10, rng.randint(1, 10)) for _ in range(ops)]
+
+
+@query_benchmark("similar_drugs")
+def _bench_similar_drugs(db, ids, diseases, rng, ops):
+    db.similar_drugs(ids[0], 1)        # budowa indeksu podobieństwa poza pomiarem
+    return db.similar_drugs, [(rng.choice(ids), 10) for _ in range(max(1, ops // 100))]
+
+
+def run_query(db, conditions):
+    '''Wykonuje zapytanie złożone db.query(**conditions) i zwraca listę wyników (Query jest leniwe).'''
+    return list(db.query(**conditions))
+
+
+@query_benchmark("query")
+def _bench_query(db, ids, diseases, rng, ops):
+    calls = []
+    for _ in range(max(1, ops // 100)):
+        conditions = {"disease": rng.choice(diseases), "min_efficacy": rng.randint(1, 10),
+                      "max_risk": rng.uniform(0.0, 200.0), "max_side_effect_level": rng.randint(1, 3)}
+        if rng.random() < 0.5:
+            conditions["replaces"] = rng.choice(ids)
+        calls.append((db, conditions))
+    return run_query, calls
+
+
+@query_benchmark("count_drugs_with_side_effect_frequency", extended_only=True)
+def _bench_count_frequency(db, ids, diseases, rng, ops):
+    calls = []
+    for _ in range(ops):
+        low = rng.uniform(0.0, 50.0)
+        calls.append((low, low + rng.uniform(0.0, 5.0)))
+    return db.count_drugs_with_side_effect_frequency, calls
+
+
+@query_benchmark("list_drugs_with_side_effect_frequency", extended_only=True)
+def _bench_list_frequency(db, ids, diseases, rng, ops):
+    calls = []
+    for _ in range(max(1, ops // 10)):
+        low = rng.uniform(0.0, 50.0)
+        calls.append((low, low + rng.uniform(0.0, 1.0)))
+    return db.list_drugs_with_side_effect_frequency, calls
+
+
+@query_benchmark("frequency_rank", extended_only=True)
+def _bench_frequency_rank(db, ids, diseases, rng, ops):
+    return db.frequency_rank, [(rng.uniform(0.0, 50.0),) for _ in range(ops)]
+
+
+@query_benchmark("frequency_quantile", extended_only=True)
+def _bench_frequency_quantile(db, ids, diseases, rng, ops):
+    return db.frequency_quantile, [(rng.random(),) for _ in range(ops)]
+
+
+@query_benchmark("kth_side_effect", extended_only=True)
+def _bench_kth_side_effect(db, ids, diseases, rng, ops):
+    total = len(db.side_effect_index.counts)
+    return db.kth_side_effect, [(rng.randint(1, max(1, total)),) for _ in range(ops)]
+
+
+def _make_db(db_kind):
+    if db_kind == "extended":
+        from pharma_db_extended import PharmaDB
+        return PharmaDB(id_width=8)
+    from pharmdb import PharmDB
+    return PharmDB(id_width=8)
+
+
+def run_suite(db_kind="core", n_drugs=10000, substitution_degree=3, n_diseases=100, n_side_effects=200,
+              ops=10000, seed=0, only=None, measure_memory=True):
+    '''
+        Uruchamia zestaw benchmarków i zwraca wyniki jako słownik (gotowy do zapisu w JSON).
+
+        Args:
+            db_kind (str): "core" (PharmDB) lub "extended" (PharmaDB)
+            ops (int): bazowa liczba wywołań na zapytanie (kosztowne zapytania wykonywane są rzadziej)
+            only (list, optional): nazwy benchmarków do uruchomienia (domyślnie wszystkie)
+    '''
+    rows = generate_catalogue(n_drugs, substitution_degree, n_diseases, n_side_effects, seed=seed)
+    diseases = sorted({disease for _, indications, _, _ in rows for disease, _ in indications}) or ["brak"]
+
+    results = {}
+
+    if measure_memory:
+        tracemalloc.start()
+        load_catalogue(_make_db(db_kind), rows)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results["memory"] = {"peak_bytes_build": peak}
+
+    db = _make_db(db_kind)
+    if only is None or "add_drug" in only:
+        ids = []
+        clock = time.perf_counter_ns
+        latencies = []
+        for name, indications, substitutes, side_effects in rows:
+            subs = [ids[j] for j in substitutes]
+            start = clock()
+            ids.append(db.add_drug(name, indications, subs, side_effects))
+            latencies.append(clock() - start)
+        results["add_drug"] = _summary(latencies)
+    else:
+        ids = load_catalogue(db, rows)
+
+    for name, (extended_only, builder) in QUERY_BENCHMARKS.items():
+        if only is not None and name not in only:
+            continue
+        if extended_only and db_kind != "extended":
+            continue
+        # Osobne ziarno dla każdego benchmarku (wyniki nie zależą od --only); wariant "_naive"
+        # dostaje te same wywołania co benchmark bazowy, więc oba można porównać bezpośrednio
+        rng = random.Random(f"{seed}:{name.removesuffix('_naive')}")
+        func, calls = builder(db, ids, diseases, rng, ops)
+        results[name] = _timed(func, calls)
+
+    return {
+        "meta": {
+            "db": db_kind,
+            "drugs": n_drugs,
+            "substitution_degree": substitution_degree,
+            "diseases": n_diseases,
+            "side_effects": n_side_effects,
+            "ops": ops,
+            "seed": seed,
+            "python": platform.python_version(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+
+
+def run_vocabulary(db_kind="core", n_drugs=200000, n_diseases=50000, n_side_effects=50000, ops=10000, seed=0):
+    '''
+        Słowniki nazw chorób i objawów na katalogu z wieloma chorobami. Każdy wiersz dostaje własne kopie
+        napisów (jak przy wczytywaniu z pliku), więc widać, czy baza je deduplikuje:
+            - memory: pamięć zatrzymana przez zbudowaną bazę (tracemalloc, po zwolnieniu wierszy wejściowych)
+              oraz liczba różnych obiektów napisów nazw chorób / objawów w lekach wobec wielkości słowników,
+            - add_drug: przepustowość budowy katalogu,
+            - find_best_drug_for_indication, update_best_indication: przepustowość zapytań po nazwie choroby.
+    '''
+    rows = generate_catalogue(n_drugs, 0, n_diseases, n_side_effects, seed=seed)
+    diseases = sorted({disease for _, indications, _, _ in rows for disease, _ in indications}) or ["brak"]
+
+    def fresh(name):
+        return (name + ".")[:-1]        # nowy obiekt napisu o tej samej treści
+
+    def build():
+        db = _make_db(db_kind)
+        clock = time.perf_counter_ns
+        latencies = []
+        for name, indications, _, side_effects in rows:
+            indications = [(fresh(disease), efficacy) for disease, efficacy in indications]
+            side_effects = [(fresh(effect), level, freq) for effect, level, freq in side_effects]
+            start = clock()
+            db.add_drug(name, indications, [], side_effects)
+            latencies.append(clock() - start)
+        return db, latencies
+
+    # Pamięć w osobnym przebiegu (tracemalloc spowalnia add_drug), czasy na drugiej, niemierzonej bazie
+    tracemalloc.start()
+    db, _ = build()
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del db
+    db, latencies = build()
+
+    drugs = db.drugs_by_order[1:]
+    results = {
+        "memory": {
+            "retained_bytes": retained,
+            "diseases": len(db.disease_names),
+            "disease_name_objects": len({id(disease) for drug in drugs for disease in drug.indications}),
+            "effects": len(db.effect_names),
+            "effect_name_objects": len({id(effect) for drug in drugs for effect, _, _ in drug.side_effects}),
+        },
+        "add_drug": _summary(latencies),
+    }
+    ids = [drug.id for drug in drugs]
+    for name in ("find_best_drug_for_indication", "update_best_indication"):
+        _, builder = QUERY_BENCHMARKS[name]
+        func, calls = builder(db, ids, diseases, random.Random(f"{seed}:{name}"), ops)
+        results[name] = _timed(func, calls)
+    return {
+        "meta": {"db": db_kind, "drugs": n_drugs, "diseases": n_diseases, "side_effects": n_side_effects,
+                 "ops": ops, "seed": seed, "python": platform.python_version(),
+                 "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "results": results,
+    }
+
+
+def run_sharded_updates(shard_counts, n_drugs=10000, n_diseases=1000, ops=100000, batch_size=1000, seed=0):
+    '''
+        Przepustowość update_best_indication w ShardedPharmDB dla różnych liczb shardów
+        (aktualizacje wysyłane wsadami po batch_size przez update_best_indications).
+        Percentyle dotyczą czasu jednego wsadu, ops/sec — pojedynczych aktualizacji.
+        Dla porównania mierzony jest też zwykły PharmDB w jednym procesie ("shards_0").
+    '''
+    from pharmdb_sharded import ShardedPharmDB
+
+    rows = generate_catalogue(n_drugs, 0, n_diseases, seed=seed)
+    diseases = [f"choroba_{i}" for i in range(n_diseases)]
+    rng = random.Random(f"{seed}:sharded_updates")
+    updates = [(rng.choice(diseases), rng.randint(1, 10)) for _ in range(ops)]
+    batches = [updates[i:i + batch_size] for i in range(0, len(updates), batch_size)]
+
+    results = {}
+    for n_shards in [0] + list(shard_counts):
+        if n_shards:
+            db = ShardedPharmDB(n_shards=n_shards, id_width=8)
+            run_batch = db.update_best_indications
+        else:
+            db = _make_db("core")
+
+            def run_batch(batch, db=db):
+                for disease, efficacy in batch:
+                    db.update_best_indication(disease, efficacy)
+        try:
+            load_catalogue(db, rows)
+            stats = _timed(run_batch, [(batch,) for batch in batches])
+        finally:
+            if n_shards:
+                db.close()
+        stats["ops"] = len(updates)
+        stats["ops_per_sec"] = len(updates) / stats["total_s"]
+        results[f"shards_{n_shards}"] = stats
+
+    return {
+        "meta": {"drugs": n_drugs, "diseases": n_diseases, "ops": ops, "batch_size": batch_size, "seed": seed,
+                 "python": platform.python_version(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "results": results,
+    }
+
+
+def run_batch_insert(db_kind="core", n_drugs=100000, substitution_degree=3, n_diseases=100, seed=0):
+    '''
+        Porównuje wczytanie katalogu zwykłymi add_drug z jedną transakcją wsadową (with db.batch()).
+        Wynik "ops_per_sec" to liczba leków na sekundę (łącznie z zatwierdzeniem transakcji).
+    '''
+    rows = generate_catalogue(n_drugs, substitution_degree, n_diseases, seed=seed)
+    results = {}
+    for name in ("sequential_insert", "batch_insert"):
+        db = _make_db(db_kind)
+        start = time.perf_counter_ns()
+        if name == "batch_insert":
+            with db.batch():
+                load_catalogue(db, rows)
+        else:
+            load_catalogue(db, rows)
+        elapsed = time.perf_counter_ns() - start
+        stats = _summary([elapsed])
+        stats["ops"] = n_drugs
+        stats["ops_per_sec"] = n_drugs / (elapsed / 1e9)
+        results[name] = stats
+    return {
+        "meta": {"db": db_kind, "drugs": n_drugs, "substitution_degree": substitution_degree,
+                 "diseases": n_diseases, "seed": seed, "python": platform.python_version(),
+                 "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "results": results,
+    }
+
+
+def _cold_import_ms(module, repeat=5):
+    # Mediana czasu importu modułu w świeżym interpreterze
+    code = f"import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+    times = sorted(float(subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                                        check=True).stdout) for _ in range(repeat))
+    return times[len(times) // 2] * 1000.0
+
+
+def run_sorted_index(n_keys=100000, ops=10000, seed=0):
+    '''
+        Porównuje SortedKeyDict (pharmdb_sorted) z SortedDict (sortedcontainers, jeśli zainstalowany)
+        w roli mapy częstotliwości PharmaDB: wstawianie n_keys par o kluczach w większości rosnących
+        (jak przy wczytywaniu posortowanych danych), ops zapytań zakresowych licznościowych i listujących
+        oraz czas zimnego importu modułów.
+    '''
+    from pharmdb_sorted import SortedKeyDict
+
+    implementations = {"sortedkeydict": SortedKeyDict}
+    try:
+        from sortedcontainers import SortedDict
+        implementations["sorteddict"] = SortedDict
+    except ImportError:
+        pass
+
+    rng = random.Random(f"{seed}:sorted_index")
+    keys = [round(i * 50.0 / n_keys if rng.random() < 0.9 else rng.uniform(0.0, 50.0), 4) for i in range(n_keys)]
+    ranges = []
+    for _ in range(ops):
+        low = rng.uniform(0.0, 50.0)
+        ranges.append((low, low + rng.uniform(0.0, 0.5)))
+
+    results = {}
+    for label, cls in implementations.items():
+        freq_map = cls()
+        start = time.perf_counter_ns()
+        for i, key in enumerate(keys):
+            freq_map.setdefault(key, []).append(i)
+        elapsed = time.perf_counter_ns() - start
+        stats = _summary([elapsed])
+        stats["ops"] = n_keys
+        stats["ops_per_sec"] = n_keys / (elapsed / 1e9)
+        results[f"insert_{label}"] = stats
+
+        def range_count(low, high, freq_map=freq_map):
+            return sum(len(freq_map[key]) for key in freq_map.irange(low, high))
+
+        def range_list(low, high, freq_map=freq_map):
+            result = []
+            for key in freq_map.irange(low, high):
+                result.extend(freq_map[key])
+            return result
+
+        results[f"range_count_{label}"] = _timed(range_count, ranges)
+        results[f"range_list_{label}"] = _timed(range_list, ranges)
+
+    results["cold_import"] = {"import_ms": {module: _cold_import_ms(module) for module in
+                                            ("pharmdb_sorted", "pharma_db_extended", *(
+                                                ["sortedcontainers"] if "sorteddict" in implementations else []))}}
+    return {
+        "meta": {"keys": n_keys, "ops": ops, "seed": seed, "python": platform.python_version(),
+                 "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "results": results,
+    }
+
+
+def run_similarity(n_drugs=100000, n_diseases=5000, ops=1000, batch_size=100, k=10, seed=0):
+    '''
+        Wyszukiwanie podobnych profili wskazań: czas budowy macierzy (pierwsze zapytanie dla wczytanego
+        katalogu), pojedyncze similar_drugs oraz similar_drugs_batch po batch_size zapytań
+        (ops/sec liczone w zapytaniach, percentyle — dla jednego wsadu).
+    '''
+    rows = generate_catalogue(n_drugs, 0, n_diseases, side_effects_per_drug=0, seed=seed)
+    db = _make_db("core")
+    ids = load_catalogue(db, rows)
+    rng = random.Random(f"{seed}:similarity")
+    queries = [rng.choice(ids) for _ in range(ops)]
+
+    try:
+        import numpy                    # import poza pomiarem (NumPy używany przy długich kolumnach)
+    except ImportError:
+        pass
+
+    results = {}
+    start = time.perf_counter_ns()
+    db.similar_drugs(ids[0], k)
+    results["similarity_index_build"] = _summary([time.perf_counter_ns() - start])
+
+    results["similar_drugs"] = _timed(db.similar_drugs, [(drug_id, k) for drug_id in queries])
+    batches = [queries[i:i + batch_size] for i in range(0, len(queries), batch_size)]
+    stats = _timed(db.similar_drugs_batch, [(batch, k) for batch in batches])
+    stats["ops"] = len(queries)
+    stats["ops_per_sec"] = len(queries) / stats["total_s"]
+    results["similar_drugs_batch"] = stats
+    return {
+        "meta": {"drugs": n_drugs, "diseases": n_diseases, "ops": ops, "batch_size": batch_size, "k": k,
+                 "seed": seed, "python": platform.python_version(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "results": results,
+    }
+
+
+def run_add_substitutes(n_drugs=100000, n_edges=1000000, batch_size=10000, with_indexes=True, seed=0):
+    '''
+        Dodawanie relacji zamiany po fakcie (add_substitutes) wsadami po batch_size par do katalogu bez
+        zamienników. Pary są losowe, ale zgodne z ukrytą losową permutacją leków, więc nie tworzą cykli,
+        a około połowy prowadzi do leków nowszych (przenumerowanie porządku topologicznego). Przy with_indexes
+        zbudowane są wcześniej indeksy osiągalności, ciągów i rankingów stopni. ops/sec liczone w krawędziach.
+    '''
+    rows = generate_catalogue(n_drugs, 0, 10, side_effects_per_drug=0, seed=seed)
+    db = _make_db("core")
+    ids = load_catalogue(db, rows)
+    rng = random.Random(f"{seed}:substitutes")
+    rank = list(range(n_drugs))
+    rng.shuffle(rank)
+    pairs = []
+    while len(pairs) < n_edges:
+        a, b = rng.randrange(n_drugs), rng.randrange(n_drugs)
+        if rank[a] > rank[b]:
+            pairs.append((ids[a], ids[b]))
+        elif rank[a] < rank[b]:
+            pairs.append((ids[b], ids[a]))
+
+    if with_indexes:
+        db.can_replace(ids[0], ids[1])
+        db.longest_alternative_list()
+        db.most_replaceable_drugs(1)
+
+    batches = [(pairs[i:i + batch_size],) for i in range(0, len(pairs), batch_size)]
+    stats = _timed(db.add_substitutes, batches)
+    stats["batches"] = stats["ops"]
+    stats["ops"] = len(pairs)
+    stats["ops_per_sec"] = len(pairs) / stats["total_s"]
+    return {
+        "meta": {"drugs": n_drugs, "edges": n_edges, "batch_size": batch_size,
+                 "indexes": with_indexes, "seed": seed, "python": platform.python_version(),
+                 "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "results": {"add_substitutes": stats},
+    }
+
+
+def run_freeze(db_kind="core", n_drugs=10000, substitution_degree=3, n_diseases=100, n_side_effects=200,
+               ops=10000, seed=0):
+    '''
+        Baza zmienna kontra jej zamrożona kopia (freeze()): pamięć (tracemalloc, bieżąca po zbudowaniu bazy
+        oraz po zamrożeniu i usunięciu bazy źródłowej), czas freeze() i te same wywołania zapytań
+        z QUERY_BENCHMARKS, które zamrożona kopia obsługuje. speedup to stosunek czasów (zmienna / zamrożona),
+        "total" — dla sumy czasów wszystkich zapytań.
+    '''
+    rows = generate_catalogue(n_drugs, substitution_degree, n_diseases, n_side_effects, seed=seed)
+    diseases = sorted({disease for _, indications, _, _ in rows for disease, _ in indications}) or ["brak"]
+
+    tracemalloc.start()
+    db = _make_db(db_kind)
+    load_catalogue(db, rows)
+    mutable_bytes = tracemalloc.get_traced_memory()[0]
+    frozen = db.freeze()
+    del db
+    frozen_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del frozen
+
+    db = _make_db(db_kind)
+    ids = load_catalogue(db, rows)
+    start = time.perf_counter_ns()
+    frozen = db.freeze()
+    results = {
+        "freeze_memory": {"mutable_bytes": mutable_bytes, "frozen_bytes": frozen_bytes},
+        "freeze": _summary([time.perf_counter_ns() - start]),
+    }
+
+    speedup = {}
+    mutable_total = frozen_total = 0.0
+    for name, (extended_only, builder) in QUERY_BENCHMARKS.items():
+        if name.endswith("_naive") or (extended_only and db_kind != "extended"):
+            continue
+        rng = random.Random(f"{seed}:{name}")
+        func, calls = builder(db, ids, diseases, rng, ops)
+        frozen_func = getattr(frozen, func.__name__, None)
+        if frozen_func is None or frozen_func.__name__ == "_read_only":
+            continue
+        func(*calls[0])                 # leniwe indeksy bazy zmiennej budowane poza pomiarem
+        results[name] = _timed(func, calls)
+        results[name + "_frozen"] = _timed(frozen_func, calls)
+        speedup[name] = results[name]["total_s"] / results[name + "_frozen"]["total_s"]
+        mutable_total += results[name]["total_s"]
+        frozen_total += results[name + "_frozen"]["total_s"]
+    speedup["total"] = mutable_total / frozen_total if frozen_total else float("inf")
+    return {
+        "meta": {"db": db_kind, "drugs": n_drugs, "substitution_degree": substitution_degree,
+                 "diseases": n_diseases, "side_effects": n_side_effects, "ops": ops, "seed": seed,
+                 "python": platform.python_version(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "results": results,
+        "speedup": speedup,
+    }
+
+
+def run_delta(db_kind="extended", n_drugs=100000, n_new=2000, n_updates=2000, n_diseases=1000,
+              n_side_effects=200, seed=0):
+    '''
+        Replikacja przyrostowa: po zsynchronizowaniu repliki z bazą n_drugs leków baza dostaje n_new leków
+        i n_updates zmian skuteczności (update_best_indication). Mierzone są export_delta i apply_delta tych
+        zmian oraz, dla porównania, pełne przeładowanie katalogu (import_catalogue z wcześniej wyeksportowanego
+        folderu CSV). "ops" to liczba zmian, "bytes" — rozmiar zestawu zmian.
+    '''
+    from pharmdb_io import export_catalogue, import_catalogue
+
+    rows = generate_catalogue(n_drugs + n_new, 3, n_diseases, n_side_effects, seed=seed)
+    db = _make_db(db_kind)
+    load_catalogue(db, rows[:n_drugs])
+    replica = _make_db(db_kind)
+    start = time.perf_counter_ns()
+    replica.apply_delta(db.export_delta(0))
+    results = {"initial_sync": _summary([time.perf_counter_ns() - start])}
+
+    since = db.version
+    for name, indications, substitutes, side_effects in rows[n_drugs:]:
+        db.add_drug(name, indications, [db.format_drug_id(j + 1) for j in substitutes], side_effects)
+    rng = random.Random(seed)
+    for _ in range(n_updates):
+        db.update_best_indication(f"choroba_{rng.randrange(n_diseases)}", rng.randint(1, 10))
+    changes = db.version - since
+
+    start = time.perf_counter_ns()
+    blob = db.export_delta(since)
+    results["export_delta"] = _summary([time.perf_counter_ns() - start])
+    start = time.perf_counter_ns()
+    replica.apply_delta(blob)
+    results["apply_delta"] = _summary([time.perf_counter_ns() - start])
+    for name in ("export_delta", "apply_delta"):
+        results[name]["ops"] = changes
+        results[name]["ops_per_sec"] = changes / results[name]["total_s"]
+    results["export_delta"]["bytes"] = len(blob)
+
+    with tempfile.TemporaryDirectory() as directory:
+        export_catalogue(db, directory)
+        start = time.perf_counter_ns()
+        import_catalogue(_make_db(db_kind), directory)
+        results["full_reload"] = _summary([time.perf_counter_ns() - start])
+    catch_up = results["export_delta"]["total_s"] + results["apply_delta"]["total_s"]
+    return {
+        "meta": {"db": db_kind, "drugs": n_drugs, "new_drugs": n_new, "updates": n_updates, "diseases": n_diseases,
+                 "side_effects": n_side_effects, "seed": seed, "python": platform.python_version(),
+                 "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "results": results,
+        "speedup": {"delta_vs_full_reload": results["full_reload"]["total_s"] / catch_up},
+    }
+
+
+def compare(baseline, current):
+    '''
+        Porównuje dwa wyniki run_suite. Zwraca słownik nazwa → stosunek ops/sec (bieżący / bazowy),
+        wartości poniżej 1 oznaczają regresję.
+    '''
+    ratios = {}
+    for name, stats in current["results"].items():
+        old = baseline["results"].get(name)
+        if old and "ops_per_sec" in stats and old.get("ops_per_sec"):
+            ratios[name] = stats["ops_per_sec"] / old["ops_per_sec"]
+    return ratios
+
+
+def _print_report(report, ratios=None):
+    print(f"{'operacja':42} {'ops/s':>12} {'p50 us':>10} {'p95 us':>10} {'p99 us':>10}")
+    for name, stats in report["results"].items():
+        if "ops_per_sec" not in stats:
+            continue
+        line = f"{name:42} {stats['ops_per_sec']:12.0f} {stats['p50_us']:10.2f} {stats['p95_us']:10.2f} {stats['p99_us']:10.2f}"
+        if ratios and name in ratios:
+            line += f"  x{ratios[name]:.2f}"
+        print(line)
+    if "peak_bytes_build" in report["results"].get("memory", {}):
+        print(f"szczytowa pamięć (budowa katalogu): {report['results']['memory']['peak_bytes_build'] / 2**20:.1f} MiB")
+    if "retained_bytes" in report["results"].get("memory", {}):
+        memory = report["results"]["memory"]
+        print(f"pamięć zatrzymana przez bazę: {memory['retained_bytes'] / 2**20:.1f} MiB; obiekty nazw chorób: "
+              f"{memory['disease_name_objects']} / {memory['diseases']}, objawów: "
+              f"{memory['effect_name_objects']} / {memory['effects']}")
+    if "freeze_memory" in report["results"]:
+        memory = report["results"]["freeze_memory"]
+        print(f"pamięć: baza {memory['mutable_bytes'] / 2**20:.1f} MiB, "
+              f"zamrożona {memory['frozen_bytes'] / 2**20:.1f} MiB")
+    for name, value in report.get("speedup", {}).items():
+        print(f"przyspieszenie {name}: x{value:.2f}")
+    if "cold_import" in report["results"]:
+        for module, ms in report["results"]["cold_import"]["import_ms"].items():
+            print(f"zimny import {module}: {ms:.1f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarki PharmDB / PharmaDB")
+    parser.add_argument("--db", choices=["core", "extended"], default="core")
+    parser.add_argument("--drugs", type=int, default=10000)
+    parser.add_argument("--degree", type=int, default=3)
+    parser.add_argument("--diseases", type=int, default=100)
+    parser.add_argument("--side-effects", type=int, default=200)
+    parser.add_argument("--ops", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", nargs="*", help="nazwy benchmarków do uruchomienia")
+    parser.add_argument("--no-memory", action="store_true", help="pomiń pomiar pamięci")
+    parser.add_argument("--out", help="plik JSON z wynikami")
+    parser.add_argument("--compare", help="plik JSON z wynikami bazowymi do porównania")
+    parser.add_argument("--shards", type=int, nargs="+",
+                        help="zamiast zestawu zapytań: przepustowość aktualizacji ShardedPharmDB dla podanych liczb shardów")
+    parser.add_argument("--batch", action="store_true",
+                        help="zamiast zestawu zapytań: wczytanie katalogu add_drug kontra jedna transakcja wsadowa")
+    parser.add_argument("--sorted-index", action="store_true",
+                        help="zamiast zestawu zapytań: SortedKeyDict kontra SortedDict (klucze: 10 * --drugs)")
+    parser.add_argument("--similarity", action="store_true",
+                        help="zamiast zestawu zapytań: similar_drugs i similar_drugs_batch na katalogu bez zamienników")
+    parser.add_argument("--vocabulary", action="store_true",
+                        help="zamiast zestawu zapytań: pamięć i przepustowość przy wielu chorobach (słowniki nazw)")
+    parser.add_argument("--freeze", action="store_true",
+                        help="zamiast zestawu zapytań: baza zmienna kontra zamrożona (pamięć i czasy zapytań)")
+    parser.add_argument("--delta", type=int, metavar="CHANGES",
+                        help="zamiast zestawu zapytań: replikacja przyrostowa (połowa zmian to nowe leki, "
+                             "połowa zmiany skuteczności) kontra pełne przeładowanie katalogu")
+    parser.add_argument("--substitutes", type=int, metavar="EDGES",
+                        help="zamiast zestawu zapytań: add_substitutes podanej liczby krawędzi (wsady po 10000)")
+    args = parser.parse_args(argv)
+
+    if args.vocabulary:
+        report = run_vocabulary(args.db, args.drugs, args.diseases, args.side_effects, args.ops, args.seed)
+    elif args.delta:
+        report = run_delta(args.db, args.drugs, args.delta // 2, args.delta - args.delta // 2, args.diseases,
+                           args.side_effects, args.seed)
+    elif args.freeze:
+        report = run_freeze(args.db, args.drugs, args.degree, args.diseases, args.side_effects, args.ops, args.seed)
+    elif args.substitutes:
+        report = run_add_substitutes(args.drugs, args.substitutes, seed=args.seed)
+    elif args.similarity:
+        report = run_similarity(args.drugs, args.diseases, args.ops, seed=args.seed)
+    elif args.sorted_index:
+        report = run_sorted_index(10 * args.drugs, args.ops, args.seed)
+    elif args.batch:
+        report = run_batch_insert(args.db, args.drugs, args.degree, args.diseases, args.seed)
+    elif args.shards:
+        report = run_sharded_updates(args.shards, args.drugs, args.diseases, args.ops, seed=args.seed)
+    else:
+        report = run_suite(args.db, args.drugs, args.degree, args.diseases, args.side_effects,
+                           args.ops, args.seed, args.only, not args.no_memory)
+
+    ratios = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            ratios = compare(json.load(f), report)
+    _print_report(report, ratios)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+# Trwałe dane o najdłuższych ciągach zamienników PharmDB
+#
+# Dla każdego leku pamiętana jest długość najdłuższego ciągu zamian, który się od niego zaczyna, oraz następnik
+# w tym ciągu (przy remisie lek dodany najwcześniej — tak jak w longest_alternative_list). Długości tylko rosną,
+# więc po dodaniu leku lub krawędzi zamiany (add_substitutes) wystarczy relaksacja wstecz po substitutes,
+# zatrzymywana tam, gdzie nic się nie zmienia. Kubełki długości są posortowane (SortedKeyDict), więc
+# top_k_starts przegląda tylko tyle kluczy, ile zwraca.
+
+from pharmdb import SecondaryIndex
+from pharmdb_sorted import SortedKeyDict
+
+
+class ChainIndex(SecondaryIndex):
+    '''
+        Indeks długości ciągów zamienników (klucz leku → długość, następnik) z kubełkami według długości.
+    '''
+
+    def __init__(self, db):
+        self.db = db
+        self.length = [0]               # klucz leku → długość najdłuższego ciągu od tego leku
+        self.next = [None]              # klucz leku → następny lek w tym ciągu
+        self.by_length = [SortedKeyDict()]      # długość → posortowane klucze leków o tej długości
+        self.best_start = None          # początek najdłuższego ciągu (przy remisie najwcześniej dodany)
+
+    def _set_length(self, order, length):
+        if self.length[order]:
+            del self.by_length[self.length[order]][order]
+        while len(self.by_length) <= length:
+            self.by_length.append(SortedKeyDict())
+        self.by_length[length][order] = None
+        self.length[order] = length
+
+        best = self.best_start
+        if best is None or length > self.length[best] or (length == self.length[best] and order < best):
+            self.best_start = order
+
+    def on_bulk_insert(self, drugs):
+        if len(self.length) > 1:
+            return super().on_bulk_insert(drugs)
+
+        # Budowa od zera: programowanie dynamiczne w odwrotnym porządku topologicznym, O(D + S)
+        n = self.db.next_id_number
+        self.length = [0] * n
+        self.next = [None] * n
+        reverse = self.db.reverse_substitutes
+        orders = range(n - 1, 0, -1)
+        if self.db.topological is not None:
+            orders = sorted(orders, key=self.db.topological_position, reverse=True)
+        for order in orders:
+            best_len = 0
+            best_next = None
+            for neighbor in reverse.get(order, ()):
+                neighbor_len = self.length[neighbor]
+                if neighbor_len > best_len or (neighbor_len == best_len and neighbor < best_next):
+                    best_len = neighbor_len
+                    best_next = neighbor
+            self.next[order] = best_next
+            self.length[order] = best_len + 1
+
+        # Kubełki wypełniane rosnąco po kluczach (dopisywanie na koniec porcji)
+        by_length = self.by_length
+        length = self.length
+        for order in range(1, n):
+            while len(by_length) <= length[order]:
+                by_length.append(SortedKeyDict())
+            by_length[length[order]][order] = None
+        if n > 1:
+            self.best_start = max(range(1, n), key=length.__getitem__)
+
+    def on_insert(self, drug):
+        order = drug.insert_order
+        self.length.append(0)
+        self.next.append(None)
+        self._set_length(order, 1)
+        self.propagate(order)
+
+    def on_substitute_added(self, drug, substitute):
+        order = drug.insert_order
+        sub = substitute.insert_order
+        candidate = self.length[order] + 1
+        if candidate > self.length[sub]:
+            self.next[sub] = order
+            self._set_length(sub, candidate)
+            self.propagate(sub)
+        elif candidate == self.length[sub] and order < self.next[sub]:
+            self.next[sub] = order
+
+    def propagate(self, start):
+        '''
+            Relaksacja wstecz od leku start: aktualizuje długości i następników leków,
+            które start (pośrednio) może zastąpić. Zwraca liczbę zmienionych leków.
+        '''
+        drugs = self.db.drugs_by_order
+        length = self.length
+        following = self.next
+        stack = [start]
+        updated = 0
+        while stack:
+            current = stack.pop()
+            candidate = length[current] + 1
+            for sub in drugs[current].substitutes:
+                if candidate > length[sub]:
+                    following[sub] = current
+                    self._set_length(sub, candidate)
+                    stack.append(sub)
+                    updated += 1
+                elif candidate == length[sub] and current < following[sub]:
+                    following[sub] = current
+                    updated += 1
+
+        if self.db.stats is not None:
+            self.db.stats.record("chain_nodes_updated", updated)
+        return updated
+
+    def chain_from(self, order):
+        path = []
+        while order is not None:
+            path.append(order)
+            order = self.next[order]
+        return path
+
+    def top_k_starts(self, k, disjoint=False):
+        '''
+            Zwraca do k początków najdłuższych ciągów (malejąco po długości, przy remisie wcześniej dodane).
+            Przy disjoint=True ciągi są wybierane zachłannie tak, aby nie miały wspólnych leków.
+
+            Złożoność czasowa: O(L + k) bez disjoint (L to największa długość ciągu); przy disjoint dochodzi
+            koszt przejrzanych i odrzuconych początków oraz ich ciągów
+        '''
+        result = []
+        if k <= 0:
+            return result
+        used = set()
+        for length in range(len(self.by_length) - 1, 0, -1):
+            for order in self.by_length[length]:
+                if disjoint:
+                    chain = self.chain_from(order)
+                    if any(node in used for node in chain):
+                        continue
+                    used.update(chain)
+                result.append(order)
+                if len(result) == k:
+                    return result
+        return result
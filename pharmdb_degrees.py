@@ -0,0 +1,179 @@
+# Rankingi leków według liczby zamienników PharmDB
+#
+# Dwa stopnie leku w grafie zamian:
+#   - liczba leków, które mogą go zastąpić (len(replaced_by)) — rośnie, gdy kolejne leki dodają go jako zamiennik,
+#   - liczba leków, które sam może zastąpić (len(substitutes)).
+# Ranking to kubełki stopień → posortowane klucze leków, posortowane niepuste stopnie (SortedCountIndex) i drzewo
+# Fenwicka liczby leków według stopnia, więc top-k przechodzi od największego niepustego stopnia bez przeglądania
+# pustych, a liczba leków o stopniu z przedziału to różnica dwóch sum prefiksowych. Ranking globalny i rankingi
+# każdej choroby są utrzymywane przyrostowo: nowa krawędź zamiany przesuwa lek zastępowany (a przy
+# add_substitutes także lek zastępujący) o jeden kubełek w rankingu globalnym i w rankingach jego chorób.
+
+from array import array
+
+from pharmdb import SecondaryIndex
+from pharmdb_sorted import SortedCountIndex
+
+
+class DegreeRanking:
+    '''
+        Leki uporządkowane malejąco według stopnia (przy remisie wcześniej dodane najpierw).
+    '''
+
+    def __init__(self):
+        self.degrees = SortedCountIndex()       # stopnie o niepustych kubełkach
+        self.buckets = {}                       # stopień → posortowane klucze leków o tym stopniu
+        self.tree = [0, 0]                      # drzewo Fenwicka liczby leków o stopniu (stopień d pod d + 1)
+
+    def _tree_add(self, degree, delta):
+        tree = self.tree
+        i = degree + 1
+        if i >= len(tree):
+            # Rozmiar podwajany, drzewo budowane od nowa z liczności kubełków
+            size = 2 * i
+            tree = self.tree = [0] * size
+            for bucket_degree, bucket in self.buckets.items():
+                tree[bucket_degree + 1] += len(bucket)
+            tree[i] -= delta            # kubełek już zawiera zmianę — dodawana jest niżej
+            for j in range(1, size):
+                parent = j + (j & -j)
+                if parent < size:
+                    tree[parent] += tree[j]
+        while i < len(tree):
+            tree[i] += delta
+            i += i & -i
+
+    def _prefix(self, degree):
+        # Liczba leków o stopniu <= degree
+        tree = self.tree
+        i = min(degree + 1, len(tree) - 1)
+        total = 0
+        while i > 0:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+    def add(self, order, degree):
+        bucket = self.buckets.get(degree)
+        if bucket is None:
+            bucket = self.buckets[degree] = SortedCountIndex()
+            self.degrees.add(degree)
+        bucket.add(order)
+        self._tree_add(degree, 1)
+
+    def remove(self, order, degree):
+        bucket = self.buckets[degree]
+        bucket.remove(order)
+        if not len(bucket):
+            del self.buckets[degree]
+            self.degrees.remove(degree)
+        self._tree_add(degree, -1)
+
+    def move(self, order, old_degree, new_degree):
+        self.remove(order, old_degree)
+        self.add(order, new_degree)
+
+    def top_k(self, k):
+        '''Klucze k leków o największym stopniu. O(log N + k)'''
+        result = []
+        if k <= 0:
+            return result
+        for degree in self.degrees.distinct(reverse=True):
+            for order in self.buckets[degree]:
+                result.append(order)
+                if len(result) == k:
+                    return result
+        return result
+
+    def count(self, min_degree, max_degree):
+        '''Liczba leków o stopniu z przedziału [min_degree, max_degree]. O(log D), D — największy stopień'''
+        if min_degree > max_degree or max_degree < 0:
+            return 0
+        return self._prefix(max_degree) - (self._prefix(min_degree - 1) if min_degree > 0 else 0)
+
+
+class DegreeIndex(SecondaryIndex):
+    '''
+        Rankingi "najczęściej zastępowalnych" (replaced_by) i "najbardziej uniwersalnych" (substitutes) leków,
+        globalne i dla każdej choroby.
+    '''
+
+    def __init__(self, db):
+        self.db = db
+        self.in_degree = array('q', [0])        # klucz leku → liczba leków, które mogą go zastąpić
+        self.out_degree = array('q', [0])       # klucz leku → liczba leków, które może zastąpić
+        self.replaced_by = DegreeRanking()
+        self.substitutes = DegreeRanking()
+        self.by_disease = {}                    # nazwa choroby → (ranking replaced_by, ranking substitutes)
+
+    def rankings(self, drug):
+        '''Pary (ranking replaced_by, ranking substitutes): globalna i dla każdej choroby leku.'''
+        yield self.replaced_by, self.substitutes
+        for disease_name in drug.indications:
+            pair = self.by_disease.get(disease_name)
+            if pair is None:
+                pair = self.by_disease[disease_name] = (DegreeRanking(), DegreeRanking())
+            yield pair
+
+    def on_bulk_insert(self, drugs):
+        # Lek zastępowany musi być w rankingach przed lekiem, który go zastępuje
+        for drug in self.db.topologically_sorted(drugs):
+            self.on_insert(drug)
+
+    def on_insert(self, drug):
+        # Stopnie liczone są w indeksie, a nie z replaced_by: przy wstawianiu wsadowym lub rejestracji indeksu
+        # zbiory replaced_by zawierają już krawędzie leków, które indeks dopiero przetworzy
+        order = drug.insert_order
+        while len(self.in_degree) <= order:
+            self.in_degree.append(0)
+            self.out_degree.append(0)
+        self.out_degree[order] = len(drug.substitutes)
+        for replaced_by, substitutes in self.rankings(drug):
+            replaced_by.add(order, self.in_degree[order])
+            substitutes.add(order, len(drug.substitutes))
+
+        drugs = self.db.drugs_by_order
+        for sub in drug.substitutes:
+            self._move_in_degree(drugs[sub], 1)
+
+    def _move_in_degree(self, drug, delta):
+        order = drug.insert_order
+        degree = self.in_degree[order]
+        for replaced_by, _ in self.rankings(drug):
+            replaced_by.move(order, degree, degree + delta)
+        self.in_degree[order] = degree + delta
+
+    def _move_out_degree(self, drug, delta):
+        order = drug.insert_order
+        degree = self.out_degree[order]
+        for _, substitutes in self.rankings(drug):
+            substitutes.move(order, degree, degree + delta)
+        self.out_degree[order] = degree + delta
+
+    def on_bulk_substitutes_added(self, pairs):
+        # Zmiany stopni sumowane na cały wsad — każdy lek przesuwany jest w rankingach raz
+        out_delta = {}
+        in_delta = {}
+        for drug, substitute in pairs:
+            out_delta[drug] = out_delta.get(drug, 0) + 1
+            in_delta[substitute] = in_delta.get(substitute, 0) + 1
+        for drug, delta in out_delta.items():
+            self._move_out_degree(drug, delta)
+        for drug, delta in in_delta.items():
+            self._move_in_degree(drug, delta)
+
+    def on_substitute_added(self, drug, substitute):
+        self._move_out_degree(drug, 1)
+        self._move_in_degree(substitute, 1)
+
+    def ranking(self, kind, disease_name=None):
+        '''
+            Ranking "replaced_by" lub "substitutes" (globalny albo dla choroby; None dla nieznanej choroby).
+        '''
+        if disease_name is None:
+            pair = (self.replaced_by, self.substitutes)
+        else:
+            pair = self.by_disease.get(disease_name)
+            if pair is None:
+                return None
+        return pair[0] if kind == "replaced_by" else pair[1]
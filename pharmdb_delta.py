@@ -0,0 +1,303 @@
+# Przyrostowa replikacja PharmDB / PharmaDB: zestawy zmian między wersjami bazy
+#
+# Każda zmiana bazy podnosi jej wersję (PharmDB.version). Dodane leki znajduje bisekcja w drug_version
+# (wersje rosną z kluczem leku), a pozostałe zmiany — bisekcja w kolumnowym dzienniku zmian, więc eksport
+# od wersji v kosztuje O(log D + rozmiar zmian), niezależnie od wielkości katalogu.
+#
+# Zestaw zmian jest scalany: nowe leki niosą bieżące wskazania, zamienniki starsze od siebie i skutki uboczne
+# (z nich replika buduje wpisy indeksu częstotliwości), kolejne zmiany tej samej skuteczności starszego leku
+# dają jeden wpis z wartością bieżącą, a kilka zmian modelu ryzyka — sam model bieżący.
+#
+# Format binarny (little-endian): nagłówek (magic, wersja początkowa, wersja końcowa, klucz pierwszego nowego
+# leku, liczby elementów sekcji) i sekcje array w ustalonej kolejności, bez wyrównania. Nazwy chorób i objawów
+# trafiają raz do lokalnego słownika zestawu, a wpisy odwołują się do nich numerami.
+
+import struct
+import sys
+from array import array
+from bisect import bisect_right
+
+from pharmdb import CHANGE_EFFICACY, CHANGE_RISK_MODEL, CHANGE_SUBSTITUTE, RiskModel
+from pharmdb_shared import _strings
+
+MAGIC = 0x41544C4442444850      # "PHDBDLTA"
+
+# Sekcje zestawu zmian w ustalonej kolejności: (nazwa, typ elementu array)
+SECTIONS = (
+    ("drug_name_offsets", "q"),     # nazwy nowych leków (kolejno od pierwszego nowego klucza)
+    ("drug_name_bytes", "B"),
+    ("name_offsets", "q"),          # lokalny słownik nazw chorób i objawów
+    ("name_bytes", "B"),
+    ("indication_indptr", "q"),     # CSR wskazań nowych leków: (numer nazwy, skuteczność)
+    ("indication_name", "i"),
+    ("indication_efficacy", "b"),
+    ("substitute_indptr", "q"),     # CSR zamienników nowych leków (klucze leków starszych)
+    ("substitute", "q"),
+    ("side_effect_indptr", "q"),    # CSR skutków ubocznych nowych leków: (numer nazwy, poziom, częstotliwość)
+    ("side_effect_name", "i"),
+    ("side_effect_level", "b"),
+    ("side_effect_freq", "d"),
+    ("efficacy_drug", "q"),         # zmiany skuteczności leków starszych: (klucz, numer nazwy choroby, wartość)
+    ("efficacy_name", "i"),
+    ("efficacy", "b"),
+    ("edge_drug", "q"),             # relacje z add_substitutes: lek edge_drug może zastąpić lek edge_substitute
+    ("edge_substitute", "q"),
+    ("risk_model", "d"),            # pusta = bez zmiany, inaczej [frequency_factor, poziom, waga, ...]
+)
+
+_HEADER = struct.Struct(f"<4q{len(SECTIONS)}q")
+
+
+def _tobytes(data):
+    if sys.byteorder != "little" and data.itemsize > 1:
+        data = array(data.typecode, data)
+        data.byteswap()
+    return data.tobytes()
+
+
+def _decode(offsets, data):
+    raw = data.tobytes()
+    return [raw[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1)]
+
+
+def _has_cycle(reverse, extra, starts):
+    # Trójkolorowy DFS po reverse_substitutes uzupełnionym o krawędzie extra, od wierzchołków starts
+    state = {}                      # klucz leku → 1 (na stosie DFS) lub 2 (przetworzony)
+
+    def neighbors(order):
+        yield from reverse.get(order, ())
+        yield from extra.get(order, ())
+
+    for start in starts:
+        if start in state:
+            continue
+        state[start] = 1
+        stack = [(start, neighbors(start))]
+        while stack:
+            order, pending = stack[-1]
+            for neighbor in pending:
+                seen = state.get(neighbor)
+                if seen == 1:
+                    return True
+                if seen is None:
+                    state[neighbor] = 1
+                    stack.append((neighbor, neighbors(neighbor)))
+                    break
+            else:
+                state[order] = 2
+                stack.pop()
+    return False
+
+
+def _validate(db, first, sections, names, drug_names):
+    '''
+        Sprawdza cały zestaw zmian przed nałożeniem, tak aby apply_delta nie zmieniło bazy częściowo:
+        spójność sekcji, numery nazw, zamienniki nowych leków, relacje z add_substitutes (końce, pętle, cykle),
+        zmiany skuteczności (lek starszy leczący chorobę, skuteczność w skali) i poziomy modelu ryzyka.
+
+        Złożoność czasowa: O(rozmiar zestawu + R), gdzie R to liczba leków, które mogą zastąpić (pośrednio)
+        leki z relacji zestawu; przy zmianie modelu ryzyka z wagami dochodzi O(E) po poziomach skutków ubocznych
+    '''
+    def check(condition, what):
+        if not condition:
+            raise ValueError("Uszkodzony zestaw zmian: " + what)
+
+    n_new = len(drug_names)
+    end = first + n_new
+    for indptr, data in (("indication_indptr", ("indication_name", "indication_efficacy")),
+                         ("substitute_indptr", ("substitute",)),
+                         ("side_effect_indptr", ("side_effect_name", "side_effect_level", "side_effect_freq"))):
+        offsets = sections[indptr]
+        check(len(offsets) == n_new + 1 and offsets[0] == 0 and all(a <= b for a, b in zip(offsets, offsets[1:])),
+              indptr)
+        check(all(len(sections[name]) == offsets[-1] for name in data), indptr)
+    check(len(sections["edge_drug"]) == len(sections["edge_substitute"]), "edge_drug")
+    check(len(sections["efficacy_drug"]) == len(sections["efficacy_name"]) == len(sections["efficacy"]), "efficacy")
+    check(len(sections["risk_model"]) % 2 == 1 or not sections["risk_model"], "risk_model")
+    for name in ("indication_name", "side_effect_name", "efficacy_name"):
+        check(all(0 <= i < len(names) for i in sections[name]), name)
+    check(all(efficacy <= 10 for efficacy in sections["indication_efficacy"]), "indication_efficacy")
+
+    # Zamienniki nowego leku: leki starsze od niego
+    sub_indptr = sections["substitute_indptr"]
+    substitute = sections["substitute"]
+    extra = {}                      # krawędzie reverse_substitutes dodawane przez zestaw
+    for i in range(n_new):
+        for sub in substitute[sub_indptr[i]:sub_indptr[i + 1]]:
+            check(1 <= sub < first + i, "substitute")
+            extra.setdefault(sub, []).append(first + i)
+
+    # Relacje z add_substitutes: istniejące leki, bez pętli i bez cyklu zamian
+    for order, sub in zip(sections["edge_drug"], sections["edge_substitute"]):
+        check(1 <= order < end and 1 <= sub < end and order != sub, "edge_drug")
+        extra.setdefault(sub, []).append(order)
+    check(not _has_cycle(db.reverse_substitutes, extra, set(sections["edge_drug"])), "relacje tworzą cykl zamian")
+
+    # Zmiany skuteczności dotyczą leków sprzed zestawu i chorób, które te leki leczą
+    drugs = db.drugs_by_order
+    for order, name, efficacy in zip(sections["efficacy_drug"], sections["efficacy_name"], sections["efficacy"]):
+        check(1 <= order < first and names[name] in drugs[order].indications and efficacy <= 10, "efficacy")
+
+    # Model ryzyka z wagami musi znać poziom każdego skutku ubocznego (przeliczenie w set_risk_model)
+    risk = sections["risk_model"]
+    if len(risk) > 1:
+        weights = {int(risk[i]) for i in range(1, len(risk), 2)}
+        check(weights.issuperset(db.side_effect_level) and weights.issuperset(sections["side_effect_level"]),
+              "model ryzyka bez wagi dla poziomu skutku ubocznego")
+
+
+def export_delta(db, since_version):
+    '''
+        Zestaw zmian bazy db od wersji since_version do db.version (patrz PharmDB.export_delta).
+    '''
+    if not 0 <= since_version <= db.version:
+        raise ValueError(f"Wersja {since_version} spoza zakresu 0..{db.version}")
+
+    drugs = db.drugs_by_order
+    n = db.next_id_number
+    first = bisect_right(db.drug_version, since_version)
+    names = {}
+
+    sections = {name: array(typecode) for name, typecode in SECTIONS}
+    for name in ("indication_indptr", "substitute_indptr", "side_effect_indptr"):
+        sections[name].append(0)
+    ind_name = sections["indication_name"]
+    ind_efficacy = sections["indication_efficacy"]
+    substitute = sections["substitute"]
+    effect_name = sections["side_effect_name"]
+    effect_level = sections["side_effect_level"]
+    effect_freq = sections["side_effect_freq"]
+    for order in range(first, n):
+        drug = drugs[order]
+        for disease_name, efficacy in drug.indications.items():
+            ind_name.append(names.setdefault(disease_name, len(names)))
+            ind_efficacy.append(efficacy)
+        # Zamienniki nowsze od leku (z add_substitutes) przenosi dziennik relacji
+        substitute.extend(sorted(sub for sub in drug.substitutes if sub < order))
+        for effect, level, freq in drug.side_effects:
+            effect_name.append(names.setdefault(effect, len(names)))
+            effect_level.append(level)
+            effect_freq.append(freq)
+        sections["indication_indptr"].append(len(ind_name))
+        sections["substitute_indptr"].append(len(substitute))
+        sections["side_effect_indptr"].append(len(effect_name))
+    sections["drug_name_offsets"], sections["drug_name_bytes"] = _strings(drugs[order].name for order in range(first, n))
+
+    efficacy_changes = {}           # (klucz leku, numer choroby) → None, w kolejności pierwszej zmiany
+    risk_model_changed = False
+    kinds = db.change_kind
+    orders = db.change_order
+    args = db.change_arg
+    for i in range(bisect_right(db.change_version, since_version), len(kinds)):
+        kind = kinds[i]
+        order = orders[i]
+        if kind == CHANGE_EFFICACY:
+            if order < first:
+                efficacy_changes[order, args[i]] = None
+        elif kind == CHANGE_SUBSTITUTE:
+            # Relacja do leku starszego od nowego leku jest już w jego zamiennikach
+            if order < first or args[i] > order:
+                sections["edge_drug"].append(order)
+                sections["edge_substitute"].append(args[i])
+        elif kind == CHANGE_RISK_MODEL:
+            risk_model_changed = True
+
+    disease_names = db.disease_names
+    for order, disease in efficacy_changes:
+        disease_name = disease_names[disease]
+        sections["efficacy_drug"].append(order)
+        sections["efficacy_name"].append(names.setdefault(disease_name, len(names)))
+        sections["efficacy"].append(drugs[order].indications[disease_name])
+
+    if risk_model_changed:
+        model = db.risk_model
+        if type(model) is not RiskModel:
+            raise ValueError("Zestaw zmian przenosi tylko modele RiskModel (wagi poziomów i mnożnik częstotliwości)")
+        sections["risk_model"].append(model.frequency_factor)
+        for level, weight in (model.level_weights or {}).items():
+            sections["risk_model"].extend((level, weight))
+
+    sections["name_offsets"], sections["name_bytes"] = _strings(names)
+    header = _HEADER.pack(MAGIC, since_version, db.version, first, *(len(sections[name]) for name, _ in SECTIONS))
+    return header + b"".join(_tobytes(sections[name]) for name, _ in SECTIONS)
+
+
+def apply_delta(db, blob):
+    '''
+        Nakłada na db zestaw zmian z export_delta (patrz PharmDB.apply_delta). Zwraca nową wersję bazy.
+        Cały zestaw jest sprawdzany (_validate) przed pierwszą zmianą bazy.
+    '''
+    if db.pending_batch is not None:
+        raise RuntimeError("apply_delta nie jest dostępne w otwartej transakcji wsadowej")
+    if len(blob) < _HEADER.size:
+        raise ValueError("Uszkodzony zestaw zmian")
+    magic, since_version, version, first, *lengths = _HEADER.unpack_from(blob)
+    if magic != MAGIC:
+        raise ValueError("To nie jest zestaw zmian PharmDB")
+    if since_version != db.version:
+        raise ValueError(f"Zestaw zmian od wersji {since_version}, a baza jest w wersji {db.version}")
+    if first != db.next_id_number:
+        raise ValueError("Zestaw zmian nie pasuje do bazy (inny klucz pierwszego nowego leku)")
+
+    view = memoryview(blob)
+    offset = _HEADER.size
+    sections = {}
+    for (name, typecode), length in zip(SECTIONS, lengths):
+        data = array(typecode)
+        size = length * data.itemsize
+        data.frombytes(view[offset:offset + size])
+        if sys.byteorder != "little" and data.itemsize > 1:
+            data.byteswap()
+        sections[name] = data
+        offset += size
+    if offset != len(blob):
+        raise ValueError("Uszkodzony zestaw zmian")
+
+    names = _decode(sections["name_offsets"], sections["name_bytes"])
+    drug_names = _decode(sections["drug_name_offsets"], sections["drug_name_bytes"])
+    _validate(db, first, sections, names, drug_names)
+    first_change = len(db.change_version)
+    format_id = db.format_drug_id
+
+    # Nowe leki jedną transakcją wsadową (hurtowa obsługa kopców i indeksów, w tym częstotliwości)
+    ind_indptr = sections["indication_indptr"]
+    ind_name = sections["indication_name"]
+    ind_efficacy = sections["indication_efficacy"]
+    sub_indptr = sections["substitute_indptr"]
+    substitute = sections["substitute"]
+    effect_indptr = sections["side_effect_indptr"]
+    effect_name = sections["side_effect_name"]
+    effect_level = sections["side_effect_level"]
+    effect_freq = sections["side_effect_freq"]
+    with db.batch():
+        for i, drug_name in enumerate(drug_names):
+            db.add_drug(
+                drug_name,
+                [(names[ind_name[j]], ind_efficacy[j]) for j in range(ind_indptr[i], ind_indptr[i + 1])],
+                [format_id(sub) for sub in substitute[sub_indptr[i]:sub_indptr[i + 1]]],
+                [(names[effect_name[j]], effect_level[j], effect_freq[j])
+                 for j in range(effect_indptr[i], effect_indptr[i + 1])],
+            )
+
+    if sections["edge_drug"]:
+        db.add_substitutes([(format_id(order), format_id(sub))
+                            for order, sub in zip(sections["edge_drug"], sections["edge_substitute"])])
+
+    drugs = db.drugs_by_order
+    for order, name, efficacy in zip(sections["efficacy_drug"], sections["efficacy_name"], sections["efficacy"]):
+        if drugs[order].indications[names[name]] != efficacy:
+            db._set_efficacy(order, db.disease_ids[names[name]], efficacy)
+
+    risk = sections["risk_model"]
+    if risk:
+        weights = {int(risk[i]): risk[i + 1] for i in range(1, len(risk), 2)}
+        db.set_risk_model(RiskModel(weights or None, risk[0]))
+
+    # Zmiany nałożone z zestawu należą do wersji końcowej bazy źródłowej (zmian scalonych jest nie więcej
+    # niż wersji, o które przesunęła się baza źródłowa, więc wersje replik nadal rosną)
+    for i in range(first_change, len(db.change_version)):
+        db.change_version[i] = version
+    for order in range(first, db.next_id_number):
+        db.drug_version[order] = version
+    db.version = version
+    return version
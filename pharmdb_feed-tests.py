@@ -0,0 +1,62 @@
+# Testy strumienia zmian najlepszego leku
+import random
+
+from pharmdb import PharmDB
+from pharmdb_bench import generate_catalogue
+from pharmdb_feed import BestDrugChange
+
+db = PharmDB()
+assert db.feed is None
+
+everything = db.subscribe()
+flu = db.subscribe(diseases=["grypa"])
+batches = []
+batched = db.subscribe(callback=batches.append, batch_size=2)
+
+a = db.add_drug("A", [("grypa", 5), ("ból", 3)], [], [])
+b = db.add_drug("B", [("grypa", 4)], [], [])                 # gorszy — brak zdarzenia
+c = db.add_drug("C", [("grypa", 5)], [], [])                 # remis, ale dodany później — nowy najlepszy
+assert everything.poll() == [BestDrugChange("grypa", None, a, 5), BestDrugChange("ból", None, a, 3),
+                             BestDrugChange("grypa", a, c, 5)]
+assert flu.poll(1) == [BestDrugChange("grypa", None, a, 5)]
+assert flu.poll() == [BestDrugChange("grypa", a, c, 5)]
+assert flu.poll() == []
+assert batches == [[BestDrugChange("grypa", None, a, 5), BestDrugChange("ból", None, a, 3)]]
+
+db.update_best_indication("grypa", 2)                        # C spada — najlepszy znowu A
+db.update_best_indication("ból", 7)                          # ten sam lek, nowa skuteczność
+assert everything.poll() == [BestDrugChange("grypa", c, a, 5), BestDrugChange("ból", a, a, 7)]
+assert flu.poll() == [BestDrugChange("grypa", c, a, 5)]
+batched.flush()
+assert batches[1:] == [[BestDrugChange("grypa", a, c, 5), BestDrugChange("grypa", c, a, 5)],
+                       [BestDrugChange("ból", a, a, 7)]]
+
+# Bufor cykliczny: przy przepełnieniu giną najstarsze zdarzenia
+small = db.subscribe(capacity=3)
+for i in range(5):
+    db.add_drug(f"X{i}", [("nowa", i + 1)], [], [])
+assert [event.efficacy for event in small.poll()] == [3, 4, 5] and small.dropped == 2
+
+# Po zamknięciu ostatniej subskrypcji baza nie publikuje nic
+assert len(everything.poll()) == 5
+for subscription in (everything, flu, batched, small):
+    subscription.close()
+assert db.feed is None
+db.add_drug("Y", [("grypa", 10)], [], [])
+assert everything.poll() == []
+
+# Zdarzenia odtwarzają find_best_drug_for_indication dla wszystkich chorób
+db = PharmDB()
+subscription = db.subscribe(capacity=100000)
+cache = {}
+rng = random.Random(3)
+for name, indications, substitutes, side_effects in generate_catalogue(300, 0, n_diseases=10, seed=3):
+    db.add_drug(name, indications, [], side_effects)
+    if rng.random() < 0.5:
+        db.update_best_indication(f"choroba_{rng.randrange(10)}", rng.randint(1, 10))
+for event in subscription.poll():
+    assert cache.get(event.disease) == event.old_best
+    cache[event.disease] = event.new_best
+assert cache == {name: db.find_best_drug_for_indication(name) for name in db.disease_names}
+
+print("Testy strumienia zmian zakończone sukcesem!")
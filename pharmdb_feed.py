@@ -0,0 +1,126 @@
+# Strumień zmian najlepszego leku dla choroby (change feed) w PharmDB
+#
+# add_drug i update_best_indication wiedzą dokładnie, kiedy zmienia się wpis best_drug_for_disease, więc
+# publikują wtedy zdarzenie BestDrugChange. Baza trzyma referencję do ChangeFeed tylko wtedy, gdy istnieje
+# choć jedna subskrypcja — bez subskrybentów koszt na ścieżce zapisu to jedno porównanie z None.
+#
+# Każda subskrypcja ma własny ograniczony bufor cykliczny: przy przepełnieniu najstarsze zdarzenia są
+# nadpisywane (licznik dropped), więc wolny odbiorca nie spowalnia bazy ani nie zużywa nieograniczonej pamięci.
+
+from collections import namedtuple
+
+from pharmdb import ORDER_BITS, ORDER_MASK
+
+# Zmiana najlepszego leku dla choroby: identyfikatory leku poprzedniego (None, jeśli nie było) i nowego
+# oraz skuteczność nowego. Zdarzenie powstaje przy każdej zmianie wpisu (lek lub jego skuteczność).
+BestDrugChange = namedtuple("BestDrugChange", ["disease", "old_best", "new_best", "efficacy"])
+
+
+class Subscription:
+    '''
+        Subskrypcja zmian najlepszego leku (tworzona przez PharmDB.subscribe).
+
+        Zdarzenia odbiera się wsadami: poll() zwraca zbuforowane zdarzenia, a przy podanym callback
+        jest on wywoływany z listą zdarzeń, gdy w buforze zbierze się batch_size zdarzeń (lub przy flush()).
+
+        Args:
+            feed (ChangeFeed): strumień, do którego należy subskrypcja
+            diseases (iterable, optional): nazwy chorób do obserwowania (domyślnie wszystkie)
+            callback (callable, optional): funkcja wywoływana z listą zdarzeń
+            batch_size (int, optional): rozmiar wsadu dla callback
+            capacity (int, optional): pojemność bufora cyklicznego
+    '''
+
+    def __init__(self, feed, diseases=None, callback=None, batch_size=64, capacity=4096):
+        self.feed = feed
+        self.diseases = frozenset(diseases) if diseases is not None else None
+        self.callback = callback
+        self.batch_size = min(batch_size, capacity)
+        self.capacity = capacity
+        self.buffer = [None] * capacity
+        self.start = 0                  # pozycja najstarszego zdarzenia
+        self.size = 0
+        self.dropped = 0                # liczba zdarzeń nadpisanych przy przepełnieniu
+
+    def push(self, event):
+        if self.size == self.capacity:
+            self.buffer[self.start] = event
+            self.start = (self.start + 1) % self.capacity
+            self.dropped += 1
+        else:
+            self.buffer[(self.start + self.size) % self.capacity] = event
+            self.size += 1
+        if self.callback is not None and self.size >= self.batch_size:
+            self.callback(self.poll())
+
+    def poll(self, max_events=None):
+        '''Zwraca (i usuwa z bufora) do max_events najstarszych zdarzeń.'''
+        count = self.size if max_events is None else min(max_events, self.size)
+        events = []
+        for _ in range(count):
+            events.append(self.buffer[self.start])
+            self.buffer[self.start] = None
+            self.start = (self.start + 1) % self.capacity
+        self.size -= count
+        return events
+
+    def flush(self):
+        '''Przekazuje do callback wszystkie zbuforowane zdarzenia.'''
+        if self.callback is not None and self.size:
+            self.callback(self.poll())
+
+    def close(self):
+        self.feed.unsubscribe(self)
+
+
+class ChangeFeed:
+    '''
+        Rozsyła zdarzenia BestDrugChange do subskrypcji: subskrypcje z filtrem chorób są indeksowane
+        nazwą choroby, więc publikacja kosztuje O(liczba zainteresowanych subskrypcji).
+    '''
+
+    def __init__(self, db):
+        self.db = db
+        self.all_diseases = []          # subskrypcje bez filtra
+        self.by_disease = {}            # nazwa choroby → lista subskrypcji z filtrem
+
+    def __bool__(self):
+        return bool(self.all_diseases or self.by_disease)
+
+    def subscribe(self, subscription):
+        if subscription.diseases is None:
+            self.all_diseases.append(subscription)
+        else:
+            for disease in subscription.diseases:
+                self.by_disease.setdefault(disease, []).append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        if subscription.diseases is None:
+            if subscription in self.all_diseases:
+                self.all_diseases.remove(subscription)
+        else:
+            for disease in subscription.diseases:
+                subscribers = self.by_disease.get(disease)
+                if subscribers and subscription in subscribers:
+                    subscribers.remove(subscription)
+                    if not subscribers:
+                        del self.by_disease[disease]
+        if not self and self.db.feed is self:
+            self.db.feed = None
+
+    def publish(self, disease_name, old_key, new_key):
+        '''Publikuje zmianę spakowanego wpisu best_drug_for_disease (old_key == 0 — brak leku).'''
+        filtered = self.by_disease.get(disease_name)
+        if not filtered and not self.all_diseases:
+            return
+        db = self.db
+        event = BestDrugChange(disease_name,
+                               db.format_drug_id(old_key & ORDER_MASK) if old_key else None,
+                               db.format_drug_id(new_key & ORDER_MASK),
+                               new_key >> ORDER_BITS)
+        for subscription in self.all_diseases:
+            subscription.push(event)
+        if filtered:
+            for subscription in filtered:
+                subscription.push(event)
@@ -0,0 +1,891 @@
+# Zamrożona (niezmienna) PharmDB / PharmaDB do serwowania zapytań
+#
+# freeze() przepisuje bazę do tablic (array) zamiast słowników obiektów Drug i zbiorów sąsiedztwa. Kolumny
+# i graf zamian (CSR) pochodzą z tych samych sekcji co migawki pharmdb_shared (_build_sections); do tego
+# odpowiedzi liczone są z góry:
+#   - najlepszy lek każdej choroby (identyfikator) i ranking leków choroby — CSR posortowany malejąco po
+#     (skuteczność, klucz), więc top-k to wycinek, bez kopców z nieaktualnymi wpisami,
+#   - histogramy skuteczności leków (number_of_indications),
+#   - długości i następniki najdłuższych ciągów zamienników oraz sam najdłuższy ciąg,
+#   - pozycje leków w porządku (risk_score, klucz) — najlepszy zamiennik to minimum liczb całkowitych,
+#   - kopia etykiet indeksu osiągalności (ReachabilityIndex) i CSR zamienników dla can_replace,
+#   - początki ciągów posortowane malejąco po długości (top_k_chains),
+#   - rankingi stopni w grafie zamian (globalne i dla chorób) z zanegowanymi stopniami do zliczania bisekcją,
+#   - poziomy skuteczności każdej choroby z kluczami w porządku (risk_score, klucz) (najbezpieczniejsze leki),
+#   - macierz profili wskazań dla similar_drugs (ta sama co w SimilarityIndex, zbudowana z CSR wskazań),
+#   - w PharmaDB posortowane tablice częstotliwości skutków ubocznych (zapytania zakresowe przez bisect).
+# Pozostałe zapytania (ścieżki zamian, front Pareto, schematy leczenia, zapytania złożone) działają na tych
+# samych tablicach. Odpowiedzi są identyczne z bazą źródłową w chwili zamrożenia; metody zapisu zgłaszają
+# RuntimeError.
+
+import heapq
+import math
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import islice
+
+from pharmdb_query import FANOUT_SAMPLE, Query, QueryDriver
+from pharmdb_shared import _build_sections
+from pharmdb_similarity import SimilarityIndex
+
+
+class FrozenPharmDB:
+    '''
+        Niezmienna, zoptymalizowana do odczytu kopia PharmDB (tworzona przez PharmDB.freeze()).
+
+        Obsługuje wszystkie zapytania PharmDB z tymi samymi sygnaturami i wynikami (także order_of
+        i format_drug_id). Wyjątkiem są remisy zależne w PharmDB od kolejności iterowania zbiorów sąsiedztwa:
+        kolejność wyników query z driverem substitutes i wybór jednej z kilku ścieżek o równym koszcie
+        w dwukierunkowym substitution_path — tu sąsiedzi przeglądani są rosnąco.
+
+        Args:
+            db (PharmDB): baza źródłowa (po zamrożeniu można ją usunąć lub dalej modyfikować)
+    '''
+
+    def __init__(self, db):
+        sections = _build_sections(db)
+        n = db.next_id_number
+        drugs = db.drugs_by_order
+        self.id_prefix = db.id_prefix
+        self.id_width = db.id_width
+        self.next_id_number = n
+        self.version = db.version
+
+        # Identyfikatory i nazwy (napisy współdzielone z bazą źródłową)
+        self.ids = [None] + [drugs[order].id for order in range(1, n)]
+        self.order_by_id = {drug_id: order for order, drug_id in enumerate(self.ids) if order}
+        self.names = [None] + [drugs[order].name for order in range(1, n)]
+        self.effect_names = list(db.effect_names)
+
+        # Odpowiedzi zapytań O(1) po identyfikatorze (jedno odwołanie do słownika zamiast obiektu Drug)
+        risk = sections["risk"]
+        worst = sections["worst_effect"]
+        indptr = sections["replaced_by_indptr"]
+        self.risk = risk
+        self.risk_by_id = dict(zip(self.ids[1:], risk[1:]))
+        self.worst_by_id = {self.ids[order]: self.effect_names[worst[order]]
+                            for order in range(1, n) if worst[order] >= 0}
+        self.alternatives_by_id = {self.ids[order]: indptr[order + 1] - indptr[order] for order in range(1, n)}
+
+        # Graf zamian (CSR: leki, które mogą zastąpić lek, rosnąco). Klucze leków posortowane po
+        # (risk_score, klucz) i pozycja leku w tym porządku — najlepszy zamiennik to lek o najmniejszej pozycji
+        self.replaced_by_indptr = indptr
+        self.replaced_by = sections["replaced_by"]
+        self.by_risk = array('q', sorted(range(n), key=lambda order: (risk[order], order)))
+        self.risk_rank = array('q', [0] * n)
+        for position, order in enumerate(self.by_risk):
+            self.risk_rank[order] = position
+
+        # Histogramy skuteczności leków jedną tablicą: lek order zajmuje pozycje 11 * order .. 11 * order + 10
+        self.efficacy_histogram = sections["efficacy_histogram"]
+
+        # Wskazania leków (CSR: numery chorób i skuteczności w kolejności Drug.indications)
+        self.indication_indptr = sections["indication_indptr"]
+        self.indication_disease = sections["indication_disease"]
+        self.indication_efficacy = sections["indication_efficacy"]
+
+        # Choroby: najlepszy lek i ranking (CSR kluczy malejąco po (skuteczność, klucz) ze skutecznościami).
+        # Rozmiary kopców wskazań zostają jako statystyki planera zapytań
+        self.disease_ids = dict(db.disease_ids)
+        self.best_drug = {}
+        self.ranking_indptr = array('q', [0])
+        self.ranking = array('q')
+        self.ranking_efficacy = array('q')
+        self.heap_sizes = array('q', map(len, db.indication_heap))
+        for disease, disease_name in enumerate(db.disease_names):
+            start = len(self.ranking)
+            for order in db._indication_orders(disease_name):
+                self.ranking.append(order)
+                self.ranking_efficacy.append(drugs[order].indications[disease_name])
+            self.ranking_indptr.append(len(self.ranking))
+            if len(self.ranking) > start:
+                self.best_drug[disease_name] = self.ids[self.ranking[start]]
+
+        self._build_chains(db)
+        self._build_reachability(db)
+        self._build_side_effects(db)
+        self._build_degrees()
+        self._build_safety()
+        self.similarity = _FrozenSimilarity(self)
+        self._build_extra(db, sections)
+
+    def _build_extra(self, db, sections):
+        '''Miejsce na dodatkowe struktury podklas (np. indeks częstotliwości PharmaDB).'''
+
+    def _build_chains(self, db):
+        # Programowanie dynamiczne w odwrotnym porządku topologicznym (jak ChainIndex przy budowie od zera)
+        n = self.next_id_number
+        indptr = self.replaced_by_indptr
+        neighbors = self.replaced_by
+        topological = self.topological = array('q', (db.topological_position(order) for order in range(n)))
+        self.chain_length_of = array('q', [0] * n)
+        self.chain_next = array('q', [0] * n)        # 0 = koniec ciągu
+        length = self.chain_length_of
+        following = self.chain_next
+        best_start = 0
+        for order in sorted(range(1, n), key=topological.__getitem__, reverse=True):
+            best_len = 0
+            best_next = 0
+            for i in range(indptr[order], indptr[order + 1]):
+                neighbor = neighbors[i]
+                # Sąsiedzi rosnąco, więc przy remisie zostaje najwcześniej dodany
+                if length[neighbor] > best_len:
+                    best_len = length[neighbor]
+                    best_next = neighbor
+            length[order] = best_len + 1
+            following[order] = best_next
+        for order in range(1, n):
+            if length[order] > length[best_start]:
+                best_start = order
+        self.longest_chain = self._chain_ids(best_start) if best_start else []
+        self.chain_starts = array('q', sorted(range(1, n), key=lambda order: (-length[order], order)))
+
+    def _build_reachability(self, db):
+        # Etykiety łańcuchowe z indeksu bazy (kopia — baza źródłowa może je dalej zmieniać) albo z indeksu
+        # zbudowanego tylko na potrzeby zamrożenia, gdy baza nie odpowiadała jeszcze na can_replace
+        index = db.reachability
+        if index is None:
+            from pharmdb_reachability import ReachabilityIndex
+
+            index = ReachabilityIndex(db)
+            index.on_bulk_insert(db.drugs_by_order[1:])
+            labels = index.labels
+        else:
+            labels = [None if label is None else dict(label) for label in index.labels]
+        n = self.next_id_number
+        self.chain_of = array('q', [0] + index.chain_of[1:n])
+        self.position_of = array('q', [0] + index.position_of[1:n])
+        self.labels = labels[:n]
+
+        # CSR zamienników (leki, które lek może zastąpić) dla przeszukiwania zapasowego
+        drugs = db.drugs_by_order
+        self.substitutes_indptr = array('q', [0, 0])
+        self.substitutes = array('q')
+        for order in range(1, n):
+            self.substitutes.extend(sorted(drugs[order].substitutes))
+            self.substitutes_indptr.append(len(self.substitutes))
+
+    def _build_side_effects(self, db):
+        # Skutki uboczne leków (CSR w kolejności Drug.side_effects): numer skutku, poziom, częstotliwość
+        drugs = db.drugs_by_order
+        effect_ids = db.effect_ids
+        self.effects_indptr = array('q', [0, 0])
+        self.effect_number = array('q')
+        self.effect_level = array('q')
+        self.effect_freq = array('d')
+        for order in range(1, self.next_id_number):
+            for effect_name, level, freq in drugs[order].side_effects:
+                self.effect_number.append(effect_ids[effect_name])
+                self.effect_level.append(level)
+                self.effect_freq.append(freq)
+            self.effects_indptr.append(len(self.effect_number))
+
+    def _build_degrees(self):
+        # Ranking stopnia jest CSR-em segmentów: segment 0 to wszystkie leki, segment d + 1 leki leczące chorobę d.
+        # Klucze malejąco po stopniu (przy remisie rosnąco), a równoległa tablica zanegowanych stopni jest rosnąca,
+        # więc liczba leków o stopniu z przedziału to różnica dwóch bisekcji
+        n = self.next_id_number
+        indptr = self.indication_indptr
+        diseases = self.indication_disease
+        members = [range(1, n)] + [[] for _ in self.disease_ids]
+        for order in range(1, n):
+            for i in range(indptr[order], indptr[order + 1]):
+                members[diseases[i] + 1].append(order)
+        self.degree_rankings = {}
+        for kind, degree_indptr in (("replaced_by", self.replaced_by_indptr), ("substitutes", self.substitutes_indptr)):
+            degree = [degree_indptr[order + 1] - degree_indptr[order] for order in range(n)]
+            segments = array('q', [0])
+            orders = array('q')
+            negated = array('q')
+            for segment in members:
+                ranked = sorted(segment, key=lambda order: -degree[order])
+                orders.extend(ranked)
+                negated.extend(-degree[order] for order in ranked)
+                segments.append(len(orders))
+            self.degree_rankings[kind] = (segments, orders, negated)
+
+    def _build_safety(self):
+        # Poziomy skuteczności chorób (CSR, segment 11 * choroba + skuteczność) z kluczami w porządku
+        # (risk_score, klucz) — wypełniane w kolejności by_risk, więc bez sortowania segmentów
+        indptr = self.indication_indptr
+        diseases = self.indication_disease
+        efficacies = self.indication_efficacy
+        counts = [0] * (11 * len(self.disease_ids) + 1)
+        for disease, efficacy in zip(diseases, efficacies):
+            counts[11 * disease + efficacy + 1] += 1
+        for slot in range(1, len(counts)):
+            counts[slot] += counts[slot - 1]
+        self.safety_indptr = array('q', counts)
+        self.safety = array('q', [0] * counts[-1])
+        fill = counts[:-1]
+        for order in self.by_risk:
+            for i in range(indptr[order], indptr[order + 1]):
+                slot = 11 * diseases[i] + efficacies[i]
+                self.safety[fill[slot]] = order
+                fill[slot] += 1
+
+    def _chain_orders(self, order):
+        following = self.chain_next
+        path = []
+        while order:
+            path.append(order)
+            order = following[order]
+        return path
+
+    def _chain_ids(self, order):
+        return list(map(self.ids.__getitem__, self._chain_orders(order)))
+
+    def _efficacy(self, order, disease):
+        # Skuteczność leku dla choroby o numerze disease lub None — O(liczba wskazań leku)
+        diseases = self.indication_disease
+        for i in range(self.indication_indptr[order], self.indication_indptr[order + 1]):
+            if diseases[i] == disease:
+                return self.indication_efficacy[i]
+        return None
+
+    def _indication_orders(self, disease, min_efficacy=1):
+        # Klucze z rankingu choroby o numerze disease aż do pierwszego poniżej min_efficacy
+        efficacies = self.ranking_efficacy
+        for i in range(self.ranking_indptr[disease], self.ranking_indptr[disease + 1]):
+            if efficacies[i] < min_efficacy:
+                return
+            yield self.ranking[i]
+
+    def _substitute_orders(self, start, max_steps):
+        # Leki osiągalne z start w 1..max_steps zamianach, poziomami BFS (bez samego start)
+        indptr = self.replaced_by_indptr
+        neighbors = self.replaced_by
+        visited = {start}
+        frontier = [start]
+        for _ in range(max_steps):
+            next_frontier = []
+            for current in frontier:
+                for neighbor in neighbors[indptr[current]:indptr[current + 1]]:
+                    if neighbor not in visited:
+                        visited.add(neighbor)
+                        next_frontier.append(neighbor)
+                        yield neighbor
+            if not next_frontier:
+                return
+            frontier = next_frontier
+
+    def _read_only(self, *args, **kwargs):
+        raise RuntimeError("Baza zamrożona (freeze) jest tylko do odczytu")
+
+    add_drug = add_substitutes = update_best_indication = _read_only
+
+    stats = None                        # bez instrumentacji (Query sprawdza db.stats)
+
+    def format_drug_id(self, order):
+        return f"{self.id_prefix}{order:0{self.id_width}d}"
+
+    def order_of(self, drug_id):
+        return self.order_by_id.get(drug_id)
+
+    def number_of_indications(self, drug_id, min_efficacy):
+        '''Wymagana złożoność czasowa: O(1)'''
+        order = self.order_by_id.get(drug_id)
+        if order is None:
+            return 0
+        if 0 <= min_efficacy <= 10:
+            return self.efficacy_histogram[11 * order + min_efficacy]
+        return self.efficacy_histogram[11 * order:11 * order + 11].tolist()[min_efficacy]
+
+    def number_of_alternative_drugs(self, drug_id):
+        '''Wymagana złożoność czasowa: O(1)'''
+        return self.alternatives_by_id.get(drug_id, 0)
+
+    def worst_side_effect(self, drug_id):
+        '''Wymagana złożoność czasowa: O(1)'''
+        return self.worst_by_id.get(drug_id)
+
+    def risk_score(self, drug_id):
+        '''Wymagana złożoność czasowa: O(1)'''
+        return self.risk_by_id.get(drug_id, 0.0)
+
+    def find_best_alternative(self, drug_id, max_steps=2):
+        '''
+            BFS poziomami po CSR; najlepszy lek to najmniejsza pozycja w porządku (risk_score, klucz),
+            aktualizowana przy odwiedzeniu leku.
+        '''
+        start = self.order_by_id.get(drug_id)
+        if start is None:
+            return None
+        return self.ids[self._best_alternative(start, max_steps)]
+
+    def _best_alternative(self, start, max_steps):
+        indptr = self.replaced_by_indptr
+        neighbors = self.replaced_by
+        risk_rank = self.risk_rank
+        best = risk_rank[start]
+        visited = {start}
+        frontier = [start]
+        for _ in range(max_steps):
+            next_frontier = []
+            for current in frontier:
+                for neighbor in neighbors[indptr[current]:indptr[current + 1]]:
+                    if neighbor not in visited:
+                        visited.add(neighbor)
+                        next_frontier.append(neighbor)
+                        if risk_rank[neighbor] < best:
+                            best = risk_rank[neighbor]
+            if not next_frontier:
+                break
+            frontier = next_frontier
+        return self.by_risk[best]
+
+    def regimen_risk(self, drug_ids, max_steps=2):
+        '''Złożoność czasowa: O(n + E_n) oraz BFS find_best_alternative dla każdego leku schematu'''
+        ids = self.ids
+        orders = []
+        seen = set()
+        for drug_id in drug_ids:
+            order = self.order_by_id.get(drug_id)
+            if order is not None and order not in seen:
+                seen.add(order)
+                orders.append(order)
+
+        indptr = self.effects_indptr
+        effect_number = self.effect_number
+        effect_names = self.effect_names
+        risk = 0.0
+        worst_effects = []
+        effect_drugs = {}
+        for order in orders:
+            drug_id = ids[order]
+            risk += self.risk[order]
+            worst = self.worst_by_id.get(drug_id)
+            if worst is not None and worst not in worst_effects:
+                worst_effects.append(worst)
+            for i in range(indptr[order], indptr[order + 1]):
+                holders = effect_drugs.setdefault(effect_names[effect_number[i]], [])
+                if not holders or holders[-1] != drug_id:
+                    holders.append(drug_id)
+
+        alternatives = {}
+        for order in orders:
+            best = self._best_alternative(order, max_steps)
+            alternatives[ids[order]] = ids[best] if best != order else None
+
+        return {
+            "risk": risk,
+            "worst_effects": worst_effects,
+            "overlapping_effects": {effect: holders for effect, holders in effect_drugs.items() if len(holders) > 1},
+            "alternatives": alternatives,
+        }
+
+    def pareto_alternatives(self, drug_id, disease_name, max_steps=2):
+        '''
+            Scalanie poziomów BFS z frontem jak w PharmDB; skuteczności z CSR wskazań.
+
+            Złożoność czasowa: O(V + S_V + C log C)
+        '''
+        start = self.order_by_id.get(drug_id)
+        disease = self.disease_ids.get(disease_name)
+        if start is None or disease is None:
+            return None
+        indptr = self.replaced_by_indptr
+        neighbors = self.replaced_by
+        risk = self.risk
+        first = self.ranking_indptr[disease]
+        best_eff = self.ranking_efficacy[first] if first < self.ranking_indptr[disease + 1] else 0
+
+        front = []
+        visited = {start}
+        frontier = [start]
+        steps = 0
+        while frontier and steps < max_steps:
+            next_frontier = []
+            for current in frontier:
+                for neighbor in neighbors[indptr[current]:indptr[current + 1]]:
+                    if neighbor not in visited:
+                        visited.add(neighbor)
+                        next_frontier.append(neighbor)
+            frontier = next_frontier
+            steps += 1
+
+            candidates = sorted((-efficacy, risk[order], steps, order) for order in next_frontier
+                                for efficacy in (self._efficacy(order, disease),) if efficacy is not None)
+            if not candidates:
+                continue
+            merged = []
+            for point in heapq.merge(front, candidates):
+                if not merged or point[1] < merged[-1][1]:
+                    merged.append(point)
+            front = merged
+            if -front[0][0] >= best_eff and front[0][1] <= 0:
+                break
+
+        return [(self.ids[order], -neg, point_risk) for neg, point_risk, _, order in front]
+
+    def similar_drugs(self, drug_id, k, missing_only=False):
+        '''Złożoność czasowa: O(C + c log k), jak w PharmDB'''
+        return self.similar_drugs_batch([drug_id], k, missing_only).get(drug_id)
+
+    def similar_drugs_batch(self, drug_ids, k, missing_only=False):
+        '''Macierz profili zbudowana w freeze(); sumowanie jak w SimilarityIndex (wyniki identyczne).'''
+        ids = self.ids
+        orders = []
+        seen = set()
+        for drug_id in drug_ids:
+            order = self.order_by_id.get(drug_id)
+            if order is not None and order not in seen:
+                seen.add(order)
+                orders.append(order)
+
+        exclude = None
+        if missing_only:
+            def exclude(order):
+                return (set(self.substitutes[self.substitutes_indptr[order]:self.substitutes_indptr[order + 1]])
+                        | set(self.replaced_by[self.replaced_by_indptr[order]:self.replaced_by_indptr[order + 1]]))
+
+        return {ids[order]: [(ids[other], sim) for other, sim in top]
+                for order, top in zip(orders, self.similarity.top_k(orders, k, exclude))}
+
+    def query(self, disease=None, min_efficacy=1, max_risk=None, max_side_effect_level=None, replaces=None,
+              max_steps=2, side_effect_frequency=None):
+        '''
+            Zapytanie złożone jak PharmDB.query (te same drivery i szacowania, filtry na tablicach).
+
+            Returns:
+                FrozenQuery: iterowalne zapytanie
+        '''
+        return FrozenQuery(self, disease, min_efficacy, max_risk, max_side_effect_level, replaces, max_steps,
+                           side_effect_frequency)
+
+    def _query_drivers(self, query):
+        n = self.next_id_number
+        drivers = []
+        if query.disease is not None:
+            disease = self.disease_ids[query.disease]
+            estimate = self.heap_sizes[disease] * (11 - max(1, query.min_efficacy)) / 10
+            drivers.append(QueryDriver("disease", estimate,
+                                       lambda: self._indication_orders(disease, query.min_efficacy), ("disease",)))
+
+        if query.replaces is not None:
+            start = self.order_by_id[query.replaces]
+            indptr = self.replaced_by_indptr
+            level = indptr[start + 1] - indptr[start]
+            estimate = 0.0
+            if level and query.max_steps > 0:
+                sample = [indptr[neighbor + 1] - indptr[neighbor]
+                          for neighbor in self.replaced_by[indptr[start]:indptr[start] + FANOUT_SAMPLE]]
+                fanout = sum(sample) / len(sample)
+                estimate = level
+                for _ in range(query.max_steps - 1):
+                    level *= fanout
+                    estimate += level
+            drivers.append(QueryDriver("substitutes", min(estimate, n - 1),
+                                       lambda: self._substitute_orders(start, query.max_steps), ("replaces",)))
+
+        drivers.append(QueryDriver("scan", n - 1, lambda: range(1, n), ()))
+        return drivers
+
+    def can_replace(self, drug_id, other_id):
+        '''
+            Etykiety jak w ReachabilityIndex.can_reach; dla leku z przepełnioną etykietą przeszukiwanie wstecz
+            po CSR zamienników, ograniczone porządkiem topologicznym.
+
+            Złożoność czasowa: O(1) dla leków z pełną etykietą
+        '''
+        target = self.order_by_id.get(drug_id)
+        source = self.order_by_id.get(other_id)
+        if target is None or source is None:
+            return False
+        topological = self.topological
+        source_position = topological[source]
+        if topological[target] <= source_position:
+            return False
+        chain = self.chain_of[source]
+        position = self.position_of[source]
+        labels = self.labels
+        label = labels[target]
+        if label is not None:
+            return label.get(chain, 0) >= position
+
+        indptr = self.substitutes_indptr
+        substitutes = self.substitutes
+        stack = [target]
+        visited = {target}
+        while stack:
+            current = stack.pop()
+            for sub in substitutes[indptr[current]:indptr[current + 1]]:
+                if sub == source:
+                    return True
+                if sub in visited or topological[sub] < source_position:
+                    continue
+                visited.add(sub)
+                sub_label = labels[sub]
+                if sub_label is not None:
+                    if sub_label.get(chain, 0) >= position:
+                        return True
+                    continue
+                stack.append(sub)
+        return False
+
+    def cheapest_substitution_path(self, drug_id, disease_name, min_efficacy=1, cost="sum", max_risk=None):
+        '''Złożoność czasowa: O((V' + E') log V'), jak w PharmDB'''
+        start = self.order_by_id.get(drug_id)
+        disease = self.disease_ids.get(disease_name)
+        if start is None or disease is None:
+            return None
+
+        def is_target(order):
+            efficacy = self._efficacy(order, disease)
+            return efficacy is not None and efficacy >= min_efficacy
+
+        return self._dijkstra_path(start, is_target, cost, max_risk)
+
+    def substitution_path(self, drug_id, target_id, cost="sum", max_risk=None, bidirectional=True):
+        '''Dla cost="sum" dwukierunkowy Dijkstra: wprzód po CSR replaced_by, wstecz po CSR substitutes.'''
+        start = self.order_by_id.get(drug_id)
+        target = self.order_by_id.get(target_id)
+        if start is None or target is None:
+            return None
+        if bidirectional and cost == "sum" and start != target:
+            return self._bidirectional_path(start, target, max_risk)
+        return self._dijkstra_path(start, lambda order: order == target, cost, max_risk)
+
+    def _dijkstra_path(self, start, is_target, cost, max_risk):
+        if cost not in ("sum", "max"):
+            raise ValueError("Koszt ścieżki musi być równy 'sum' lub 'max'")
+        use_sum = cost == "sum"
+        indptr = self.replaced_by_indptr
+        neighbors = self.replaced_by
+        risk_of = self.risk
+
+        dist = {start: 0.0}
+        parent = {start: None}
+        heap = [(0.0, start)]
+        found = None
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            if is_target(u):
+                found = u
+                break
+            for v in neighbors[indptr[u]:indptr[u + 1]]:
+                risk = risk_of[v]
+                if max_risk is not None and risk > max_risk:
+                    continue
+                nd = d + risk if use_sum else (d if d > risk else risk)
+                if nd < dist.get(v, float("inf")):
+                    dist[v] = nd
+                    parent[v] = u
+                    heapq.heappush(heap, (nd, v))
+
+        if found is None:
+            return None
+        path = []
+        current = found
+        while current is not None:
+            path.append(self.ids[current])
+            current = parent[current]
+        path.reverse()
+        return path, dist[found]
+
+    def _bidirectional_path(self, start, target, max_risk):
+        indptr_f = self.replaced_by_indptr
+        forward = self.replaced_by
+        indptr_b = self.substitutes_indptr
+        backward = self.substitutes
+        risk_of = self.risk
+        inf = float("inf")
+
+        if max_risk is not None and risk_of[target] > max_risk:
+            return None
+
+        dist_f = {start: 0.0}
+        dist_b = {target: 0.0}
+        parent_f = {start: None}
+        parent_b = {target: None}
+        heap_f = [(0.0, start)]
+        heap_b = [(0.0, target)]
+        done_f = set()
+        done_b = set()
+        best = inf
+        meet = None
+
+        while heap_f and heap_b:
+            if heap_f[0][0] + heap_b[0][0] >= best:
+                break
+            if len(heap_f) <= len(heap_b):
+                d, u = heapq.heappop(heap_f)
+                if u in done_f:
+                    continue
+                done_f.add(u)
+                for v in forward[indptr_f[u]:indptr_f[u + 1]]:
+                    risk = risk_of[v]
+                    if max_risk is not None and risk > max_risk:
+                        continue
+                    nd = d + risk
+                    if nd < dist_f.get(v, inf):
+                        dist_f[v] = nd
+                        parent_f[v] = u
+                        heapq.heappush(heap_f, (nd, v))
+                    if v in dist_b and dist_f[v] + dist_b[v] < best:
+                        best = dist_f[v] + dist_b[v]
+                        meet = v
+            else:
+                d, v = heapq.heappop(heap_b)
+                if v in done_b:
+                    continue
+                done_b.add(v)
+                nd = d + risk_of[v]
+                for u in backward[indptr_b[v]:indptr_b[v + 1]]:
+                    if max_risk is not None and u != start and risk_of[u] > max_risk:
+                        continue
+                    if nd < dist_b.get(u, inf):
+                        dist_b[u] = nd
+                        parent_b[u] = v
+                        heapq.heappush(heap_b, (nd, u))
+                    if u in dist_f and dist_f[u] + dist_b[u] < best:
+                        best = dist_f[u] + dist_b[u]
+                        meet = u
+
+        if meet is None:
+            return None
+        path = []
+        current = meet
+        while current is not None:
+            path.append(self.ids[current])
+            current = parent_f[current]
+        path.reverse()
+        current = parent_b[meet]
+        while current is not None:
+            path.append(self.ids[current])
+            current = parent_b[current]
+        return path, best
+
+    def longest_alternative_list(self):
+        '''Wymagana złożoność czasowa: O(d), gdzie d to długość zwracanej listy'''
+        return list(self.longest_chain)
+
+    def chain_length(self, drug_id):
+        '''Wymagana złożoność czasowa: O(1)'''
+        order = self.order_by_id.get(drug_id)
+        return self.chain_length_of[order] if order is not None else 0
+
+    def longest_chain_from(self, drug_id):
+        '''Wymagana złożoność czasowa: O(d), gdzie d to długość zwracanej listy'''
+        order = self.order_by_id.get(drug_id)
+        return self._chain_ids(order) if order is not None else []
+
+    def top_k_chains(self, k, disjoint=False):
+        '''Złożoność czasowa: O(k + suma długości zwróconych ciągów) bez disjoint'''
+        result = []
+        if k <= 0:
+            return result
+        used = set()
+        for start in self.chain_starts:
+            chain = self._chain_orders(start)
+            if disjoint:
+                if any(order in used for order in chain):
+                    continue
+                used.update(chain)
+            result.append(list(map(self.ids.__getitem__, chain)))
+            if len(result) == k:
+                break
+        return result
+
+    def _degree_segment(self, kind, disease_name):
+        # (ranking, początek, koniec) segmentu rankingu lub None dla nieznanej choroby
+        segment = 0
+        if disease_name is not None:
+            disease = self.disease_ids.get(disease_name)
+            if disease is None:
+                return None
+            segment = disease + 1
+        ranking = self.degree_rankings[kind]
+        return ranking, ranking[0][segment], ranking[0][segment + 1]
+
+    def _degree_top_k(self, kind, k, disease_name):
+        found = self._degree_segment(kind, disease_name)
+        if found is None or k <= 0:
+            return []
+        (_, orders, _), start, stop = found
+        return list(map(self.ids.__getitem__, orders[start:min(stop, start + k)]))
+
+    def _degree_count(self, kind, min_count, max_count, disease_name):
+        found = self._degree_segment(kind, disease_name)
+        if found is None:
+            return 0
+        (_, _, negated), start, stop = found
+        return max(0, bisect_right(negated, -min_count, start, stop) - bisect_left(negated, -max_count, start, stop))
+
+    def most_replaceable_drugs(self, k, disease_name=None):
+        '''Złożoność czasowa: O(k) — wycinek rankingu'''
+        return self._degree_top_k("replaced_by", k, disease_name)
+
+    def most_versatile_drugs(self, k, disease_name=None):
+        '''Złożoność czasowa: O(k) — wycinek rankingu'''
+        return self._degree_top_k("substitutes", k, disease_name)
+
+    def count_drugs_by_replacers(self, min_count, max_count, disease_name=None):
+        '''Złożoność czasowa: O(log N)'''
+        return self._degree_count("replaced_by", min_count, max_count, disease_name)
+
+    def count_drugs_by_substitutes(self, min_count, max_count, disease_name=None):
+        '''Złożoność czasowa: O(log N)'''
+        return self._degree_count("substitutes", min_count, max_count, disease_name)
+
+    def _safest(self, disease_name, min_efficacy, k):
+        # Scalanie poziomów skuteczności >= min_efficacy po pozycji w porządku (risk_score, klucz)
+        disease = self.disease_ids.get(disease_name)
+        if disease is None or k <= 0:
+            return []
+        indptr = self.safety_indptr
+        safety = self.safety
+        rank = self.risk_rank.__getitem__
+        sources = [range(indptr[slot], indptr[slot + 1])
+                   for slot in range(11 * disease + max(1, min_efficacy), 11 * disease + 11)
+                   if indptr[slot] < indptr[slot + 1]]
+        if k == 1:
+            return [min((safety[level[0]] for level in sources), key=rank)] if sources else []
+        return list(islice(heapq.merge(*(map(safety.__getitem__, level) for level in sources), key=rank), k))
+
+    def safest_drug_for_indication(self, disease_name, min_efficacy=1):
+        '''Złożoność czasowa: O(1) — minimum z co najwyżej 10 poziomów'''
+        orders = self._safest(disease_name, min_efficacy, 1)
+        return self.ids[orders[0]] if orders else None
+
+    def top_k_safest_drugs(self, disease_name, k, min_efficacy=1):
+        '''Złożoność czasowa: O(k log 10)'''
+        return list(map(self.ids.__getitem__, self._safest(disease_name, min_efficacy, k)))
+
+    def find_best_drug_for_indication(self, disease_name):
+        '''Wymagana złożoność czasowa: O(1)'''
+        return self.best_drug.get(disease_name)
+
+    def top_k_drugs_for_indication(self, disease_name, k):
+        '''Złożoność czasowa: O(k) — wycinek rankingu choroby'''
+        disease = self.disease_ids.get(disease_name)
+        if disease is None or k == 0:
+            return []
+        start = self.ranking_indptr[disease]
+        stop = self.ranking_indptr[disease + 1]
+        if k > 0:
+            stop = min(stop, start + k)
+        return list(map(self.ids.__getitem__, self.ranking[start:stop]))
+
+
+class FrozenQuery(Query):
+    '''
+        Zapytanie złożone zamrożonej bazy (FrozenPharmDB.query): warunki sprawdzane na tablicach zamiast
+        obiektów Drug.
+    '''
+
+    def _predicate(self, name):
+        db = self.db
+        if name == "max_risk":
+            risk, max_risk = db.risk, self.max_risk
+            return lambda order: risk[order] <= max_risk
+        if name == "disease":
+            disease, min_efficacy = db.disease_ids[self.disease], max(1, self.min_efficacy)
+            return lambda order: (db._efficacy(order, disease) or 0) >= min_efficacy
+        indptr = db.effects_indptr
+        if name == "max_side_effect_level":
+            levels, level = db.effect_level, self.max_side_effect_level
+            return lambda order: all(levels[i] <= level for i in range(indptr[order], indptr[order + 1]))
+        if name == "side_effect_frequency":
+            freqs, (low, high) = db.effect_freq, self.side_effect_frequency
+            return lambda order: any(low <= freqs[i] <= high for i in range(indptr[order], indptr[order + 1]))
+        if name == "replaces":
+            return set(db._substitute_orders(db.order_of(self.replaces), self.max_steps)).__contains__
+        raise ValueError("Nieznany warunek zapytania: " + name)
+
+    def _drug_id(self, order):
+        return self.db.ids[order]
+
+
+class _FrozenSimilarity(SimilarityIndex):
+    '''
+        Macierz profili wskazań (jak SimilarityIndex) zbudowana z CSR wskazań zamrożonej bazy.
+    '''
+
+    def __init__(self, frozen):
+        super().__init__(frozen)
+        self.column_orders = [array('q') for _ in frozen.disease_ids]
+        self.column_values = [array('d') for _ in frozen.disease_ids]
+        self.norms = array('d', [0.0] * frozen.next_id_number)
+        for order in range(1, frozen.next_id_number):
+            total = 0
+            for disease, efficacy in self._order_row(order):
+                self.column_orders[disease].append(order)
+                self.column_values[disease].append(efficacy)
+                total += efficacy * efficacy
+            self.norms[order] = math.sqrt(total)
+
+    def _order_row(self, order):
+        db = self.db
+        start, stop = db.indication_indptr[order], db.indication_indptr[order + 1]
+        return list(zip(db.indication_disease[start:stop], db.indication_efficacy[start:stop]))
+
+
+class FrozenPharmaDB(FrozenPharmDB):
+    '''
+        Niezmienna kopia PharmaDB (PharmaDB.freeze()): dodatkowo zapytania o częstotliwość skutków ubocznych
+        (count_drugs_with_side_effect_frequency, list_drugs_with_side_effect_frequency, frequency_rank,
+        frequency_quantile, kth_side_effect) na posortowanych tablicach.
+    '''
+
+    def _build_extra(self, db, sections):
+        # Częstotliwości rosnąco i pary (nazwa leku, objaw) w tej samej kolejności (przy remisie w kolejności
+        # dodania) — krotki współdzielone z indeksem częstotliwości bazy źródłowej
+        self.frequency = sections["frequency"]
+        self.frequency_drug = sections["frequency_drug"]
+        freq_map = db.side_effect_freq_map
+        self.frequency_pairs = [pair for freq in freq_map for pair in freq_map[freq]]
+
+    def count_drugs_with_side_effect_frequency(self, min_freq, max_freq):
+        '''Złożoność czasowa: O(log F)'''
+        return max(0, bisect_right(self.frequency, max_freq) - bisect_left(self.frequency, min_freq))
+
+    def list_drugs_with_side_effect_frequency(self, min_freq, max_freq):
+        '''Złożoność czasowa: O(log F + m)'''
+        return self.frequency_pairs[bisect_left(self.frequency, min_freq):bisect_right(self.frequency, max_freq)]
+
+    def frequency_rank(self, freq):
+        '''Złożoność czasowa: O(log F)'''
+        return bisect_left(self.frequency, freq)
+
+    def frequency_quantile(self, q):
+        '''Złożoność czasowa: O(1)'''
+        if not 0 <= q <= 1:
+            raise ValueError("Rząd kwantyla musi należeć do przedziału [0, 1]")
+        if not len(self.frequency):
+            return None
+        return self.frequency[max(0, math.ceil(q * len(self.frequency)) - 1)]
+
+    def kth_side_effect(self, k):
+        '''Złożoność czasowa: O(log F)'''
+        frequency = self.frequency
+        total = len(frequency)
+        if not 1 <= k <= total:
+            return None
+        freq = frequency[total - k]
+        # Grupa równych częstotliwości [start, stop) jest w kolejności dodania, a w porządku malejącym
+        # poprzedza ją total - stop par o większej częstotliwości
+        start = bisect_left(frequency, freq)
+        stop = bisect_right(frequency, freq)
+        drug_name, effect_name = self.frequency_pairs[start + k - 1 - (total - stop)]
+        return drug_name, effect_name, freq
+
+    def _query_drivers(self, query):
+        drivers = super()._query_drivers(query)
+        if query.side_effect_frequency is not None:
+            low, high = query.side_effect_frequency
+            drivers.insert(-1, QueryDriver("frequency", self.count_drugs_with_side_effect_frequency(low, high),
+                                           lambda: self._frequency_orders(low, high), ("side_effect_frequency",)))
+        return drivers
+
+    def _frequency_orders(self, min_freq, max_freq):
+        # Klucze leków z parami w zakresie częstotliwości, bez powtórzeń, rosnąco po częstotliwości
+        drug_of = self.frequency_drug
+        seen = set()
+        for i in range(bisect_left(self.frequency, min_freq), bisect_right(self.frequency, max_freq)):
+            order = drug_of[i]
+            if order not in seen:
+                seen.add(order)
+                yield order
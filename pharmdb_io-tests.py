@@ -0,0 +1,111 @@
+# Testy importu i eksportu katalogu
+import os
+import tempfile
+
+from pharmdb import PharmDB, RiskModel, SecondaryIndex
+from pharma_db_extended import PharmaDB
+from pharmdb_bench import generate_catalogue, load_catalogue
+from pharmdb_io import export_catalogue, import_catalogue
+
+
+def snapshot(db):
+    return [(d.id, d.name, d.indications, sorted(d.substitutes), sorted(d.replaced_by), d.side_effects,
+             d.risk_score, d.worst_effect_name) for d in db.drugs_by_order[1:]]
+
+
+rows = generate_catalogue(500, substitution_degree=4, n_diseases=20, seed=11)
+
+for fmt in ("csv", "npy"):
+    for cls in (PharmDB, PharmaDB):
+        source = cls()
+        load_catalogue(source, rows)
+        source.update_best_indication("choroba_3", 1)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            manifest = export_catalogue(source, tmp, fmt=fmt, chunk_size=64)
+            assert manifest["drugs"] == 500 and manifest["chunks"] == 8
+            assert os.path.exists(os.path.join(tmp, f"side_effects-00007.{fmt}"))
+            assert (manifest["side_effect_frequency_chunks"] > 0) == (cls is PharmaDB)
+
+            replica = cls()
+            assert import_catalogue(replica, tmp) == 500
+
+            # Import do niepustej bazy przesuwa identyfikatory zamienników
+            shifted = cls()
+            shifted.add_drug("Istniejący", [("choroba_3", 10)], [], [])
+            assert import_catalogue(shifted, tmp) == 500
+
+        assert snapshot(replica) == snapshot(source)
+        assert replica.best_drug_for_disease == source.best_drug_for_disease
+        assert replica.longest_alternative_list() == source.longest_alternative_list()
+        if cls is PharmaDB:
+            assert list(replica.side_effect_freq_map.items()) == list(source.side_effect_freq_map.items())
+
+        assert shifted.drugs_by_id["D0501"].name == "Drug_499"
+        assert shifted.drugs_by_id["D0501"].substitutes == {s + 1 for s in source.drugs_by_id["D0500"].substitutes}
+        assert shifted.find_best_drug_for_indication("choroba_3") == "D0001"
+
+# Model ryzyka bazy przenoszony w manifeście; model domyślny zapisywany jako null
+for cls in (PharmDB, PharmaDB):
+    source = cls()
+    load_catalogue(source, rows[:100])
+    with tempfile.TemporaryDirectory() as tmp:
+        assert export_catalogue(source, tmp)["risk_model"] is None
+        assert import_catalogue(cls(), tmp) == 100
+
+        for model in (RiskModel({1: 1, 2: 4, 3: 9}, 0.5), RiskModel(frequency_factor=2.0)):
+            source.set_risk_model(model)
+            export_catalogue(source, tmp, chunk_size=32)
+            replica = cls()
+            import_catalogue(replica, tmp)
+            assert replica.risk_model.level_weights == model.level_weights
+            assert replica.risk_model.frequency_factor == model.frequency_factor
+            assert snapshot(replica) == snapshot(source)
+
+            # Baza z lekami zachowuje własny model ryzyka (bez przeliczania istniejących leków)
+            own_model = RiskModel(frequency_factor=3.0)
+            target = cls()
+            target.add_drug("Istniejący", [("choroba_3", 10)], [], [("objaw_1", 2, 4.0)])
+            target.set_risk_model(own_model)
+            assert import_catalogue(target, tmp) == 100
+            assert target.risk_model is own_model and target.risk_score("D0001") == 24.0
+
+        class ScaledRiskModel(RiskModel):
+            pass
+
+        source.set_risk_model(ScaledRiskModel())
+        try:
+            export_catalogue(source, tmp)
+            assert False
+        except ValueError:
+            pass
+
+# Każda porcja trafia do bazy jedną transakcją wsadową (jedno on_bulk_insert indeksu pomocniczego na porcję)
+class BulkCounter(SecondaryIndex):
+    def __init__(self):
+        self.bulk_sizes = []
+
+    def on_insert(self, drug):
+        self.bulk_sizes.append(1)
+
+    def on_bulk_insert(self, drugs):
+        self.bulk_sizes.append(len(drugs))
+
+
+with tempfile.TemporaryDirectory() as tmp:
+    source = PharmDB()
+    load_catalogue(source, rows[:150])
+    export_catalogue(source, tmp, chunk_size=64)
+    counted = PharmDB()
+    counter = counted.register_index(BulkCounter())
+    counter.bulk_sizes.clear()                  # rejestracja przekazuje indeksowi dotychczasowe leki
+    assert import_catalogue(counted, tmp) == 150
+    assert counter.bulk_sizes == [64, 64, 22] and snapshot(counted) == snapshot(source)
+
+# Pusta baza
+with tempfile.TemporaryDirectory() as tmp:
+    for fmt in ("csv", "npy"):
+        export_catalogue(PharmaDB(), os.path.join(tmp, fmt), fmt=fmt)
+        assert import_catalogue(PharmaDB(), os.path.join(tmp, fmt)) == 0
+
+print("Testy importu i eksportu zakończone sukcesem!")
@@ -0,0 +1,237 @@
+# Strumieniowy import i eksport katalogu PharmDB / PharmaDB
+#
+# Katalog zapisywany jest w katalogu (folderze) jako ciąg porcji (chunków) po chunk_size leków.
+# Każda porcja to cztery tabele w formacie "długim", posortowane po kolejności dodania leku:
+#   drugs          (drug, name)
+#   indications    (drug, disease, efficacy)
+#   substitutes    (drug, substitute)
+#   side_effects   (drug, effect, level, frequency)
+# Leki identyfikowane są kolejnością dodania (liczbą), a nie zewnętrznym ID, dzięki czemu import
+# nie potrzebuje słownika tłumaczącego identyfikatory i działa w pamięci O(chunk_size).
+# Dla PharmaDB dodatkowo eksportowany jest indeks częstotliwości (side_effect_frequency), posortowany
+# po częstotliwości — przy imporcie jest on odtwarzany przez add_drug, więc ten plik jest pomijany.
+# Model ryzyka bazy (wagi poziomów i mnożnik częstotliwości) zapisywany jest w manifeście i odtwarzany
+# przy imporcie; model domyślny zapisywany jest jako null.
+#
+# Obsługiwane formaty: "csv" (moduł csv) oraz "npy" (tablice strukturalne NumPy, bez pickle).
+
+import csv
+import json
+import os
+
+from pharmdb import DEFAULT_RISK_MODEL, RiskModel
+
+TABLES = ("drugs", "indications", "substitutes", "side_effects")
+
+_CSV_COLUMNS = {
+    "drugs": ("drug", "name"),
+    "indications": ("drug", "disease", "efficacy"),
+    "substitutes": ("drug", "substitute"),
+    "side_effects": ("drug", "effect", "level", "frequency"),
+    "side_effect_frequency": ("frequency", "drug_name", "effect"),
+}
+
+# Typy kolumn: "i" liczba całkowita, "f" zmiennoprzecinkowa, "s" napis
+_COLUMN_TYPES = {
+    "drugs": "is",
+    "indications": "isi",
+    "substitutes": "ii",
+    "side_effects": "isif",
+    "side_effect_frequency": "fss",
+}
+
+
+def _risk_model_manifest(model):
+    if model is DEFAULT_RISK_MODEL:
+        return None
+    if type(model) is not RiskModel:
+        raise ValueError("Eksport przenosi tylko modele RiskModel (wagi poziomów i mnożnik częstotliwości)")
+    weights = model.level_weights
+    return {
+        "frequency_factor": model.frequency_factor,
+        "level_weights": None if weights is None else [[level, weight] for level, weight in weights.items()],
+    }
+
+
+def _chunk_path(directory, table, chunk, fmt):
+    return os.path.join(directory, f"{table}-{chunk:05d}.{fmt}")
+
+
+def _write_csv(path, table, rows):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(_CSV_COLUMNS[table])
+        writer.writerows(rows)
+
+
+def _read_csv(path, table):
+    types = _COLUMN_TYPES[table]
+    with open(path, encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        next(reader)
+        return [tuple(int(v) if t == "i" else float(v) if t == "f" else v for v, t in zip(row, types))
+                for row in reader]
+
+
+def _write_npy(path, table, rows):
+    import numpy as np
+
+    fields = []
+    columns = list(zip(*rows)) if rows else [() for _ in _COLUMN_TYPES[table]]
+    for name, kind, column in zip(_CSV_COLUMNS[table], _COLUMN_TYPES[table], columns):
+        if kind == "i":
+            fields.append((name, "i8"))
+        elif kind == "f":
+            fields.append((name, "f8"))
+        else:
+            fields.append((name, f"U{max(map(len, column), default=1)}"))
+    array = np.empty(len(rows), dtype=fields)
+    for (name, _), column in zip(fields, columns):
+        array[name] = column
+    np.save(path, array, allow_pickle=False)
+
+
+def _read_npy(path, table):
+    import numpy as np
+
+    array = np.load(path, allow_pickle=False)
+    return list(zip(*(array[name].tolist() for name in _CSV_COLUMNS[table])))
+
+
+_WRITERS = {"csv": _write_csv, "npy": _write_npy}
+_READERS = {"csv": _read_csv, "npy": _read_npy}
+
+
+def export_catalogue(db, directory, fmt="csv", chunk_size=100000):
+    '''
+        Zapisuje katalog bazy do folderu directory porcjami po chunk_size leków.
+
+        Args:
+            db (PharmDB): baza do wyeksportowania
+            directory (str): folder docelowy (tworzony, jeśli nie istnieje)
+            fmt (str, optional): "csv" lub "npy"
+            chunk_size (int, optional): liczba leków w porcji
+
+        Returns:
+            dict: manifest zapisany w directory/manifest.json
+    '''
+    if fmt not in _WRITERS:
+        raise ValueError("Nieobsługiwany format eksportu: " + str(fmt))
+    risk_model = _risk_model_manifest(db.risk_model)
+    write = _WRITERS[fmt]
+    os.makedirs(directory, exist_ok=True)
+
+    drugs = db.drugs_by_order
+    n = db.next_id_number - 1
+    chunks = 0
+    for first in range(1, n + 1, chunk_size):
+        last = min(n, first + chunk_size - 1)
+        batch = drugs[first:last + 1]
+        write(_chunk_path(directory, "drugs", chunks, fmt), "drugs",
+              [(drug.insert_order, drug.name) for drug in batch])
+        write(_chunk_path(directory, "indications", chunks, fmt), "indications",
+              [(drug.insert_order, disease, efficacy) for drug in batch for disease, efficacy in drug.indications.items()])
+        write(_chunk_path(directory, "substitutes", chunks, fmt), "substitutes",
+              [(drug.insert_order, sub) for drug in batch for sub in sorted(drug.substitutes)])
+        write(_chunk_path(directory, "side_effects", chunks, fmt), "side_effects",
+              [(drug.insert_order, effect, level, freq) for drug in batch for effect, level, freq in drug.side_effects])
+        chunks += 1
+
+    frequency_chunks = 0
+    freq_map = getattr(db, "side_effect_freq_map", None)
+    if freq_map is not None:
+        rows = []
+        for freq, pairs in freq_map.items():
+            rows.extend((freq, drug_name, effect) for drug_name, effect in pairs)
+            if len(rows) >= chunk_size:
+                write(_chunk_path(directory, "side_effect_frequency", frequency_chunks, fmt), "side_effect_frequency", rows)
+                frequency_chunks += 1
+                rows = []
+        if rows or not frequency_chunks:
+            write(_chunk_path(directory, "side_effect_frequency", frequency_chunks, fmt), "side_effect_frequency", rows)
+            frequency_chunks += 1
+
+    manifest = {
+        "format": fmt,
+        "drugs": n,
+        "chunk_size": chunk_size,
+        "chunks": chunks,
+        "side_effect_frequency_chunks": frequency_chunks,
+        "risk_model": risk_model,
+    }
+    with open(os.path.join(directory, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def _group_end(rows, position, drug):
+    # rows posortowane po drug — zwraca indeks za ostatnim wierszem leku drug, zaczynając od pozycji position
+    end = position
+    while end < len(rows) and rows[end][0] == drug:
+        end += 1
+    return end
+
+
+def _rows(rows, start, end):
+    for position in range(start, end):
+        yield rows[position]
+
+
+def import_catalogue(db, directory):
+    '''
+        Wczytuje katalog zapisany przez export_catalogue i dodaje leki do bazy porcja po porcji — każda porcja
+        jedną transakcją wsadową (db.batch()), a wiersze tabel przekazywane są do add_drug bez pośrednich list.
+        Leki dostają kolejne identyfikatory bazy docelowej; zamienniki są przesuwane o liczbę leków,
+        które były w bazie przed importem. Relacje do leków dodanych później (z add_substitutes) są dodawane
+        na końcu jednym wywołaniem add_substitutes. Model ryzyka zapisany w manifeście jest ustawiany
+        (set_risk_model) tylko w pustej bazie docelowej — baza z lekami zachowuje własny model.
+
+        Args:
+            db (PharmDB): baza docelowa
+            directory (str): folder z manifest.json
+
+        Returns:
+            int: liczba dodanych leków
+    '''
+    with open(os.path.join(directory, "manifest.json"), encoding="utf-8") as f:
+        manifest = json.load(f)
+    fmt = manifest["format"]
+    read = _READERS[fmt]
+    offset = db.next_id_number - 1
+    format_id = db.format_drug_id
+
+    risk_model = manifest.get("risk_model")
+    if risk_model is not None and offset == 0:
+        weights = risk_model["level_weights"]
+        db.set_risk_model(RiskModel(None if weights is None else {level: weight for level, weight in weights},
+                                    risk_model["frequency_factor"]))
+
+    imported = 0
+    later = []                  # relacje do leków dodanych później (add_substitutes) — po wczytaniu wszystkich leków
+    for chunk in range(manifest["chunks"]):
+        tables = {table: read(_chunk_path(directory, table, chunk, fmt), table) for table in TABLES}
+        indications = tables["indications"]
+        substitutes = tables["substitutes"]
+        side_effects = tables["side_effects"]
+        ind_start = sub_start = effect_start = 0
+
+        # Generatory po zakresach wierszy są zużywane przy zatwierdzeniu transakcji (obiekty Drug)
+        with db.batch():
+            for order, name in tables["drugs"]:
+                ind_end = _group_end(indications, ind_start, order)
+                sub_end = _group_end(substitutes, sub_start, order)
+                effect_end = _group_end(side_effects, effect_start, order)
+                db.add_drug(
+                    name,
+                    ((disease, efficacy) for _, disease, efficacy in _rows(indications, ind_start, ind_end)),
+                    [format_id(offset + sub) for _, sub in _rows(substitutes, sub_start, sub_end) if sub < order],
+                    ((effect, level, freq) for _, effect, level, freq in _rows(side_effects, effect_start, effect_end)),
+                )
+                later.extend((format_id(offset + order), format_id(offset + sub))
+                             for _, sub in _rows(substitutes, sub_start, sub_end) if sub > order)
+                ind_start, sub_start, effect_start = ind_end, sub_end, effect_end
+                imported += 1
+
+    if later:
+        db.add_substitutes(later)
+    return imported
@@ -0,0 +1,186 @@
+# Zapytania złożone w PharmDB z prostym planerem kosztowym
+#
+# Zapytanie to koniunkcja warunków (choroba i minimalna skuteczność, maksymalne ryzyko, maksymalny poziom
+# skutków ubocznych, możliwość zastąpienia leku w co najwyżej max_steps zamianach, a w PharmaDB także
+# skutek uboczny o częstotliwości z przedziału). Planer wybiera jedno źródło kandydatów ("driver"):
+#   - disease: kopiec wskazań choroby, przeglądany malejąco po skuteczności aż do min_efficacy,
+#   - substitutes: BFS po grafie zamienników od leku zastępowanego,
+#   - frequency (PharmaDB): zakres kluczy indeksu częstotliwości,
+#   - scan: wszystkie leki w kolejności dodania.
+# O wyborze decyduje szacowana liczba kandydatów, liczona z prostych statystyk w czasie niezależnym od
+# rozmiaru wyniku (rozmiar kopca choroby, stopnie w grafie zamian, liczności w indeksie częstotliwości).
+# Warunek obsłużony przez driver nie jest sprawdzany ponownie; pozostałe są filtrami od najtańszego.
+# Wyniki są strumieniowane: kolejny identyfikator powstaje dopiero przy pobraniu go z iteratora.
+
+from collections import namedtuple
+
+# Źródło kandydatów: nazwa, szacowana liczba kandydatów, funkcja zwracająca iterator kluczy leków
+# oraz nazwy warunków, które driver spełnia z definicji
+QueryDriver = namedtuple("QueryDriver", ["name", "estimate", "scan", "consumes"])
+
+# Wybrany plan: driver, jego oszacowanie, warunki sprawdzane filtrami (w kolejności) i oszacowania wszystkich driverów
+QueryPlan = namedtuple("QueryPlan", ["driver", "estimate", "filters", "estimates"])
+
+# Kolejność sprawdzania filtrów: od najtańszego (O(1)) do wymagających przejrzenia skutków ubocznych lub BFS
+FILTER_ORDER = ("max_risk", "disease", "max_side_effect_level", "side_effect_frequency", "replaces")
+
+# Liczba sąsiadów, z których szacowany jest średni stopień wyjściowy przy kolejnych krokach BFS
+FANOUT_SAMPLE = 32
+
+
+def _substitute_orders(db, start, max_steps):
+    # Leki osiągalne z start w 1..max_steps zamianach, poziomami BFS (bez samego start)
+    reverse = db.reverse_substitutes
+    visited = {start}
+    frontier = [start]
+    for _ in range(max_steps):
+        next_frontier = []
+        for current in frontier:
+            for neighbor in reverse.get(current, ()):
+                if neighbor not in visited:
+                    visited.add(neighbor)
+                    next_frontier.append(neighbor)
+                    yield neighbor
+        if not next_frontier:
+            return
+        frontier = next_frontier
+
+
+def core_drivers(db, query):
+    '''
+        Drivery dostępne w każdej PharmDB: disease, substitutes i scan.
+    '''
+    drivers = []
+    drugs = db.drugs_by_order
+
+    if query.disease is not None:
+        heap = db.indication_heap[db.disease_ids[query.disease]]
+        # Kopiec zawiera też nieaktualne wpisy, więc jego rozmiar jest górnym oszacowaniem;
+        # dla min_efficacy zakładam równomierny rozkład skuteczności 1-10
+        estimate = len(heap) * (11 - max(1, query.min_efficacy)) / 10
+        drivers.append(QueryDriver("disease", estimate,
+                                   lambda: db._indication_orders(query.disease, query.min_efficacy),
+                                   ("disease",)))
+
+    if query.replaces is not None:
+        start = db.order_of(query.replaces)
+        level = len(drugs[start].replaced_by)
+        estimate = 0.0
+        if level and query.max_steps > 0:
+            sample = [len(drugs[neighbor].replaced_by)
+                      for _, neighbor in zip(range(FANOUT_SAMPLE), db.reverse_substitutes[start])]
+            fanout = sum(sample) / len(sample)
+            estimate = level
+            for _ in range(query.max_steps - 1):
+                level *= fanout
+                estimate += level
+        drivers.append(QueryDriver("substitutes", min(estimate, len(drugs) - 1),
+                                   lambda: _substitute_orders(db, start, query.max_steps), ("replaces",)))
+
+    drivers.append(QueryDriver("scan", len(drugs) - 1, lambda: range(1, len(drugs)), ()))
+    return drivers
+
+
+class Query:
+    '''
+        Zapytanie złożone (tworzone przez PharmDB.query). Iterowanie zwraca identyfikatory leków spełniających
+        wszystkie podane warunki; kolejność wyników zależy od wybranego drivera (np. malejąca skuteczność
+        dla disease, poziomy BFS dla substitutes, kolejność dodania dla scan).
+
+        Args:
+            db (PharmDB): baza danych
+            disease (str, optional): lek musi leczyć chorobę ...
+            min_efficacy (int, optional): ... ze skutecznością co najmniej min_efficacy
+            max_risk (float, optional): risk_score leku nie większy niż max_risk
+            max_side_effect_level (int, optional): żaden skutek uboczny leku nie ma wyższego poziomu
+            replaces (str, optional): lek może zastąpić lek replaces ...
+            max_steps (int, optional): ... w co najwyżej max_steps zamianach (domyślnie 2)
+            side_effect_frequency (tuple, optional): (min, max) — lek ma skutek uboczny o częstotliwości
+                z obustronnie domkniętego przedziału
+    '''
+
+    def __init__(self, db, disease=None, min_efficacy=1, max_risk=None, max_side_effect_level=None,
+                 replaces=None, max_steps=2, side_effect_frequency=None):
+        self.db = db
+        self.disease = disease
+        self.min_efficacy = min_efficacy
+        self.max_risk = max_risk
+        self.max_side_effect_level = max_side_effect_level
+        self.replaces = replaces
+        self.max_steps = max_steps
+        self.side_effect_frequency = side_effect_frequency
+
+    def conditions(self):
+        '''Nazwy podanych warunków w kolejności FILTER_ORDER.'''
+        given = {
+            "max_risk": self.max_risk is not None,
+            "disease": self.disease is not None,
+            "max_side_effect_level": self.max_side_effect_level is not None,
+            "side_effect_frequency": self.side_effect_frequency is not None,
+            "replaces": self.replaces is not None,
+        }
+        return [name for name in FILTER_ORDER if given[name]]
+
+    def is_empty(self):
+        '''Czy wynik jest pusty z definicji (nieznana choroba lub lek zastępowany).'''
+        return ((self.disease is not None and self.disease not in self.db.disease_ids)
+                or (self.replaces is not None and self.db.order_of(self.replaces) is None))
+
+    def _choose(self):
+        drivers = self.db._query_drivers(self)
+        return drivers, min(drivers, key=lambda driver: driver.estimate)
+
+    def plan(self):
+        '''
+            Wybiera driver o najmniejszym oszacowaniu (przy remisie wcześniejszy na liście driverów bazy).
+
+            Returns:
+                QueryPlan: plan zapytania (dla pustego z definicji zapytania driver "empty")
+        '''
+        if self.is_empty():
+            return QueryPlan("empty", 0, [], {})
+        drivers, best = self._choose()
+        filters = [name for name in self.conditions() if name not in best.consumes]
+        return QueryPlan(best.name, best.estimate, filters, {driver.name: driver.estimate for driver in drivers})
+
+    def _predicate(self, name):
+        drugs = self.db.drugs_by_order
+        if name == "max_risk":
+            max_risk = self.max_risk
+            return lambda order: drugs[order].risk_score <= max_risk
+        if name == "disease":
+            disease, min_efficacy = self.disease, max(1, self.min_efficacy)
+            return lambda order: drugs[order].indications.get(disease, 0) >= min_efficacy
+        if name == "max_side_effect_level":
+            level = self.max_side_effect_level
+            return lambda order: all(effect[1] <= level for effect in drugs[order].side_effects)
+        if name == "side_effect_frequency":
+            low, high = self.side_effect_frequency
+            return lambda order: any(low <= effect[2] <= high for effect in drugs[order].side_effects)
+        if name == "replaces":
+            # Zbiór leków osiągalnych liczony raz na wykonanie zapytania
+            reachable = set(_substitute_orders(self.db, self.db.order_of(self.replaces), self.max_steps))
+            return reachable.__contains__
+        raise ValueError("Nieznany warunek zapytania: " + name)
+
+    def _drug_id(self, order):
+        return self.db.drugs_by_order[order].id
+
+    def __iter__(self):
+        if self.is_empty():
+            return
+        db = self.db
+        _, driver = self._choose()
+        predicates = [self._predicate(name) for name in self.conditions() if name not in driver.consumes]
+        scanned = 0
+        try:
+            for order in driver.scan():
+                scanned += 1
+                for predicate in predicates:
+                    if not predicate(order):
+                        break
+                else:
+                    yield self._drug_id(order)
+        finally:
+            if db.stats is not None:
+                db.stats.record("query_candidates_scanned", scanned)
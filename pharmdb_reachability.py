@@ -0,0 +1,156 @@
+# Indeks osiągalności dla grafu zamienników PharmDB
+#
+# Graf zamian jest DAG-iem z porządkiem topologicznym PharmDB.topological_position (bez add_substitutes jest nim
+# kolejność dodania). add_drug dodaje krawędzie wyłącznie od nowego leku do leków już istniejących, a nowy lek
+# nie może jeszcze zostać przez nikogo zastąpiony, więc jego dodanie nie zmienia etykiet leków istniejących.
+# Krawędź dodana później (add_substitutes) dopisuje etykietę zastępowanego leku do etykiet leku zastępującego
+# i leków, które mogą go zastąpić, zatrzymując się tam, gdzie etykieta się nie zmienia.
+
+from pharmdb import SecondaryIndex
+
+
+class ReachabilityIndex(SecondaryIndex):
+    '''
+        Etykietowanie łańcuchowe (chain labeling) z przeszukiwaniem zapasowym.
+
+        Każdy lek należy do jednego łańcucha (ciągu leków, w którym kolejny zastępuje poprzedni) i ma w nim
+        pozycję. Etykieta leku X to słownik łańcuch → największa pozycja w tym łańcuchu, którą X może
+        (pośrednio) zastąpić; skoro X zastępuje lek na pozycji p, to zastępuje też wszystkie wcześniejsze.
+        Zapytanie "czy X zastąpi Y" to jedno odwołanie do słownika: etykieta[X][łańcuch(Y)] >= pozycja(Y).
+
+        Aby pamięć pozostała podkwadratowa, etykieta ma co najwyżej label_limit wpisów. Lek o przepełnionej
+        etykiecie (None) obsługiwany jest przeszukiwaniem wstecz po substitutes, przycinanym kolejnością
+        dodania i zatrzymywanym na lekach, które mają pełną etykietę.
+    '''
+
+    def __init__(self, db, label_limit=64):
+        self.db = db
+        self.label_limit = label_limit
+        self.chain_of = [None]          # klucz leku → numer łańcucha
+        self.position_of = [None]       # klucz leku → pozycja w łańcuchu (od 1)
+        self.labels = [None]            # klucz leku → {łańcuch: pozycja} lub None przy przepełnieniu
+        self.chain_tails = []           # numer łańcucha → klucz ostatniego leku
+
+    def on_bulk_insert(self, drugs):
+        # Leki muszą trafić do indeksu po lekach, które mogą zastąpić
+        for drug in self.db.topologically_sorted(drugs):
+            self.on_insert(drug)
+
+    def on_insert(self, drug):
+        order = drug.insert_order
+        subs = sorted(drug.substitutes)
+
+        # Przedłużam łańcuch, którego ogonem jest jeden z zastępowanych leków (pierwszy w kolejności dodania)
+        chain = None
+        for sub in subs:
+            if self.chain_tails[self.chain_of[sub]] == sub:
+                chain = self.chain_of[sub]
+                position = self.position_of[sub] + 1
+                self.chain_tails[chain] = order
+                break
+        if chain is None:
+            chain = len(self.chain_tails)
+            position = 1
+            self.chain_tails.append(order)
+
+        # Etykieta = scalenie etykiet zastępowanych leków oraz ich własnych pozycji
+        label = {}
+        for sub in subs:
+            sub_label = self.labels[sub]
+            if sub_label is None:
+                label = None
+                break
+            for sub_chain, sub_position in sub_label.items():
+                if sub_position > label.get(sub_chain, 0):
+                    label[sub_chain] = sub_position
+            sub_chain = self.chain_of[sub]
+            if self.position_of[sub] > label.get(sub_chain, 0):
+                label[sub_chain] = self.position_of[sub]
+            if len(label) > self.label_limit:
+                label = None
+                break
+
+        while len(self.labels) <= order:
+            self.chain_of.append(None)
+            self.position_of.append(None)
+            self.labels.append(None)
+        self.chain_of[order] = chain
+        self.position_of[order] = position
+        self.labels[order] = label
+
+    def on_substitute_added(self, drug, substitute):
+        sub = substitute.insert_order
+        addition = self.labels[sub]
+        if addition is not None:
+            addition = dict(addition)
+            chain = self.chain_of[sub]
+            if self.position_of[sub] > addition.get(chain, 0):
+                addition[chain] = self.position_of[sub]
+
+        # Etykiety leków, które mogą zastąpić drug, muszą zawierać jego etykietę — rozchodzenie się po
+        # reverse_substitutes zatrzymuje się na lekach, których etykieta już zawierała dopisywane wpisy
+        labels = self.labels
+        reverse = self.db.reverse_substitutes
+        stack = [drug.insert_order]
+        while stack:
+            current = stack.pop()
+            label = labels[current]
+            if label is None:
+                continue
+            if addition is None:
+                labels[current] = None
+            else:
+                changed = False
+                for chain, position in addition.items():
+                    if position > label.get(chain, 0):
+                        label[chain] = position
+                        changed = True
+                if not changed:
+                    continue
+                if len(label) > self.label_limit:
+                    labels[current] = None
+            stack.extend(reverse.get(current, ()))
+
+    def can_reach(self, source, target):
+        '''
+            Czy z leku source (klucz) da się dojść do leku target (klucz) po reverse_substitutes,
+            tj. czy target może ostatecznie zastąpić source.
+        '''
+        topological = self.db.topological_position
+        source_position = topological(source)
+        if topological(target) <= source_position:
+            return False                # krawędzie prowadzą tylko do leków dalej w porządku topologicznym
+        chain = self.chain_of[source]
+        position = self.position_of[source]
+        label = self.labels[target]
+        if label is not None:
+            return label.get(chain, 0) >= position
+
+        # Przeszukiwanie zapasowe: wstecz od target po substitutes, tylko po lekach dalszych w porządku niż source
+        drugs = self.db.drugs_by_order
+        labels = self.labels
+        stack = [target]
+        visited = {target}
+        found = False
+        while stack:
+            current = stack.pop()
+            for sub in drugs[current].substitutes:
+                if sub == source:
+                    found = True
+                    break
+                if sub in visited or topological(sub) < source_position:
+                    continue
+                visited.add(sub)
+                sub_label = labels[sub]
+                if sub_label is not None:
+                    if sub_label.get(chain, 0) >= position:
+                        found = True
+                        break
+                    continue
+                stack.append(sub)
+            if found:
+                break
+
+        if self.db.stats is not None:
+            self.db.stats.record("reachability_fallback_visited", len(visited))
+        return found
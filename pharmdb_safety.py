@@ -0,0 +1,61 @@
+# Indeks najbezpieczniejszych leków dla choroby PharmDB
+#
+# Skuteczność ma tylko 10 poziomów (1-10), więc dla każdej choroby i poziomu trzymam posortowany multizbiór
+# par (risk_score, klucz leku) leków o tej skuteczności (SortedCountIndex). Zapytanie z progiem skuteczności e
+# przegląda najmniejsze elementy poziomów e..10 (co najwyżej 10) i scala je leniwie, więc najbezpieczniejszy
+# lek to O(log K), a k najbezpieczniejszych — O(log K + k log 10).
+#
+# add_drug dopisuje lek do poziomów jego chorób, update_best_indication przenosi go między poziomami,
+# a zmiana modelu ryzyka (zmienia risk_score wszystkich leków) przebudowuje indeks.
+
+import heapq
+from itertools import islice
+
+from pharmdb import SecondaryIndex
+from pharmdb_sorted import SortedCountIndex
+
+MAX_EFFICACY = 10
+
+
+class SafetyIndex(SecondaryIndex):
+    '''
+        Nazwa choroby → poziom skuteczności → posortowane pary (risk_score, klucz leku).
+    '''
+
+    def __init__(self, db):
+        self.db = db
+        self.levels = {}                # nazwa choroby → lista MAX_EFFICACY + 1 multizbiorów (lub None)
+
+    def _level(self, disease_name, efficacy):
+        levels = self.levels.get(disease_name)
+        if levels is None:
+            levels = self.levels[disease_name] = [None] * (MAX_EFFICACY + 1)
+        level = levels[efficacy]
+        if level is None:
+            level = levels[efficacy] = SortedCountIndex()
+        return level
+
+    def on_insert(self, drug):
+        entry = (drug.risk_score, drug.insert_order)
+        for disease_name, efficacy in drug.indications.items():
+            self._level(disease_name, efficacy).add(entry)
+
+    def on_update(self, drug, disease_name, old_efficacy, new_efficacy):
+        entry = (drug.risk_score, drug.insert_order)
+        self._level(disease_name, old_efficacy).remove(entry)
+        self._level(disease_name, new_efficacy).add(entry)
+
+    def on_risk_recomputed(self, db):
+        self.levels = {}
+        self.on_bulk_insert(db.drugs_by_order[1:])
+
+    def safest(self, disease_name, min_efficacy, k):
+        '''Klucze do k leków o najmniejszym ryzyku (przy remisie wcześniej dodane) ze skutecznością >= min_efficacy.'''
+        levels = self.levels.get(disease_name)
+        if levels is None or k <= 0:
+            return []
+        sources = [level for level in levels[max(1, min_efficacy):] if level is not None and len(level)]
+        if k == 1:
+            firsts = [level.select(0) for level in sources]
+            return [min(firsts)[1]] if firsts else []
+        return [order for _, order in islice(heapq.merge(*sources), k)]
@@ -0,0 +1,85 @@
+# Testy PharmDB podzielonej na shardy według chorób
+import random
+
+from pharmdb import PharmDB
+from pharmdb_bench import generate_catalogue, load_catalogue
+from pharmdb_sharded import ShardedPharmDB, shard_of
+
+rows = generate_catalogue(300, substitution_degree=3, n_diseases=12, seed=4)
+diseases = [f"choroba_{i}" for i in range(12)]
+assert len({shard_of(d, 3) for d in diseases}) == 3
+assert shard_of("choroba_1", 3) == shard_of("choroba_1", 3)
+
+
+def compare(db, sharded):
+    for disease in diseases + ["nieznana"]:
+        assert sharded.find_best_drug_for_indication(disease) == db.find_best_drug_for_indication(disease)
+        assert sharded.top_k_drugs_for_indication(disease, 4) == db.top_k_drugs_for_indication(disease, 4)
+    for order in range(1, db.next_id_number, 7):
+        drug_id = db.format_drug_id(order)
+        for level in (1, 5, 10):
+            assert sharded.number_of_indications(drug_id, level) == db.number_of_indications(drug_id, level)
+        assert sharded.number_of_alternative_drugs(drug_id) == db.number_of_alternative_drugs(drug_id)
+        assert sharded.worst_side_effect(drug_id) == db.worst_side_effect(drug_id)
+        assert sharded.risk_score(drug_id) == db.risk_score(drug_id)
+        assert sharded.find_best_alternative(drug_id) == db.find_best_alternative(drug_id)
+
+
+db = PharmDB()
+with ShardedPharmDB(n_shards=3) as sharded:
+    assert load_catalogue(sharded, rows) == load_catalogue(db, rows)
+    compare(db, sharded)
+
+    rng = random.Random(2)
+    updates = [(rng.choice(diseases), rng.randint(1, 10)) for _ in range(200)]
+    for disease, efficacy in updates[:50]:
+        sharded.update_best_indication(disease, efficacy)
+        db.update_best_indication(disease, efficacy)
+    sharded.update_best_indications(updates[50:] + [("nieznana", 3)])
+    for disease, efficacy in updates[50:] + [("nieznana", 3)]:
+        db.update_best_indication(disease, efficacy)
+    compare(db, sharded)
+
+    # Błędny zamiennik nie zmienia żadnego sharda
+    try:
+        sharded.add_drug("Zły", [("choroba_1", 10)], ["D9999"], [])
+        assert False
+    except Exception:
+        pass
+    assert sharded.find_best_drug_for_indication("choroba_1") == db.find_best_drug_for_indication("choroba_1")
+
+    # Błędna skuteczność: baza bez zmian, a kolejne leki i odpowiedzi shardów pozostają spójne
+    for target in (db, sharded):
+        try:
+            target.add_drug("Za skuteczny", [("choroba_2", 11)], [], [])
+            assert False
+        except IndexError:
+            pass
+    extra = [("Po błędzie", [("choroba_1", 10), ("choroba_2", 5)], [], []), ("Kolejny", [("choroba_2", 7)], [], [])]
+    extra_ids = load_catalogue(sharded, extra)
+    assert extra_ids == load_catalogue(db, extra)
+    for drug_id in extra_ids:
+        assert sharded.number_of_indications(drug_id, 5) == db.number_of_indications(drug_id, 5)
+    compare(db, sharded)
+
+# Błąd zapisu w procesie sharda (dane z pominięciem sprawdzenia w koordynatorze) nie zabija sharda:
+# każde kolejne żądanie do niego kończy się czytelnym błędem, a pozostałe shardy działają dalej
+with ShardedPharmDB(n_shards=2) as broken:
+    load_catalogue(broken, rows[:20])
+    bad_shard = shard_of("choroba_1", 2)
+    healthy = next(d for d in diseases if shard_of(d, 2) != bad_shard)
+    broken.connections[bad_shard].send(("add", [(21, "Uszkodzony", [("choroba_1", 11)])]))
+    for _ in range(2):
+        try:
+            broken.find_best_drug_for_indication("choroba_1")
+            assert False
+        except RuntimeError as error:
+            assert "IndexError" in str(error)
+    try:
+        broken.update_best_indications([("choroba_1", 3), (healthy, 3)])
+        assert False
+    except RuntimeError:
+        pass
+    assert broken.top_k_drugs_for_indication(healthy, 2) is not None
+
+print("Testy shardów zakończone sukcesem!")
@@ -0,0 +1,221 @@
+# PharmDB podzielona na shardy według chorób
+#
+# Struktury per choroba (indication_heap, best_drug_for_disease) są od siebie niezależne, więc wskazania
+# rozdzielane są między procesy-shardy według skrótu nazwy choroby (crc32 — stały między uruchomieniami).
+# Każdy shard to zwykły PharmDB z lekami, które mają w nim choć jedno wskazanie; shard pamięta, jaki globalny
+# klucz ma każdy jego lek. Leki trafiają do shardów w kolejności globalnej, więc porządek lokalny zgadza się
+# z globalnym i reguła remisów (najpóźniej dodany) jest zachowana.
+#
+# Dane na poziomie leku (zamienniki, skutki uboczne, histogram skuteczności) trzyma koordynator w osobnym
+# PharmDB ("shard leków") w swoim procesie.
+#
+# Komunikacja: jeden Pipe na shard. Dodawanie leków nie czeka na odpowiedź (shard przetwarza komunikaty
+# po kolei, więc późniejsze zapytania widzą wcześniejsze zapisy); zapytania i aktualizacje czekają.
+# update_best_indications wysyła aktualizacje do wszystkich shardów naraz i dopiero potem zbiera odpowiedzi,
+# więc shardy pracują równolegle.
+
+import multiprocessing
+import zlib
+from array import array
+
+from pharmdb import ORDER_MASK, PharmDB
+
+
+def shard_of(disease_name, n_shards):
+    return zlib.crc32(disease_name.encode("utf-8")) % n_shards
+
+
+def _best_local(db, disease_name):
+    disease = db.disease_ids.get(disease_name)
+    if disease is None or not db.best_drug_for_disease[disease]:
+        return None
+    return db.best_drug_for_disease[disease] & ORDER_MASK
+
+
+def _shard_main(conn):
+    '''Pętla procesu-sharda: obsługuje komunikaty (operacja, argumenty) aż do "close".'''
+    db = PharmDB()
+    global_of = [0]             # klucz lokalny → klucz globalny
+    failed = None               # błąd zapisu "add" — od niego shard nie zgadza się z koordynatorem
+
+    while True:
+        op, args = conn.recv()
+        if op == "close":
+            conn.close()
+            return
+        if op == "add":
+            # Bez odpowiedzi — koordynator na nią nie czeka, więc odpowiedź (także z błędem) przesunęłaby
+            # kolejne odpowiedzi na łączu. Dane są sprawdzane w koordynatorze przed wysłaniem; błąd mimo to
+            # zapamiętuję i zgłaszam w odpowiedzi na każde kolejne żądanie (shard nie przyjmuje już zapisów)
+            if failed is None:
+                try:
+                    for order, name, indications in args:
+                        db.add_drug(name, indications, [], [])
+                        global_of.append(order)
+                except Exception as error:
+                    failed = error
+            continue
+        try:
+            if failed is not None:
+                raise RuntimeError(f"Shard nie jest zgodny z koordynatorem — odrzucił zapis leków: {failed!r}")
+            if op == "best":
+                local = _best_local(db, args)
+                reply = global_of[local] if local is not None else None
+            elif op == "top_k":
+                disease_name, k = args
+                reply = [global_of[db.order_of(drug_id)] for drug_id in db.top_k_drugs_for_indication(disease_name, k)]
+            elif op == "update":
+                # Zwraca (klucz globalny, stara skuteczność) zmienionego leku albo None
+                reply = []
+                for disease_name, efficacy in args:
+                    local = _best_local(db, disease_name)
+                    if local is None:
+                        reply.append(None)
+                        continue
+                    old_efficacy = db.drugs_by_order[local].indications[disease_name]
+                    db.update_best_indication(disease_name, efficacy)
+                    reply.append((global_of[local], old_efficacy))
+            else:
+                raise ValueError("Nieznana operacja sharda: " + str(op))
+        except Exception as error:
+            reply = error
+        conn.send(reply)
+
+
+class ShardedPharmDB:
+    '''
+        Koordynator PharmDB podzielonej na n_shards procesów według chorób.
+
+        API zapytań jak w PharmDB: add_drug, number_of_indications, number_of_alternative_drugs,
+        worst_side_effect, risk_score, find_best_alternative (shard leków) oraz find_best_drug_for_indication,
+        top_k_drugs_for_indication, update_best_indication (shard choroby). update_best_indications
+        wykonuje wiele aktualizacji naraz, równolegle na wszystkich shardach.
+
+        Args:
+            n_shards (int, optional): liczba procesów-shardów
+            id_prefix, id_width: format identyfikatorów (jak w PharmDB)
+            start_method (str, optional): metoda startu procesów multiprocessing (domyślnie systemowa)
+    '''
+
+    def __init__(self, n_shards=4, id_prefix="D", id_width=4, start_method=None):
+        self.drugs = PharmDB(id_prefix=id_prefix, id_width=id_width)
+        self.histograms = [None]        # klucz leku → histogram skuteczności (jak Drug.efficacy_histogram)
+        self.n_shards = n_shards
+
+        context = multiprocessing.get_context(start_method)
+        self.connections = []
+        self.processes = []
+        for _ in range(n_shards):
+            parent, child = context.Pipe()
+            process = context.Process(target=_shard_main, args=(child,), daemon=True)
+            process.start()
+            child.close()
+            self.connections.append(parent)
+            self.processes.append(process)
+
+    def close(self):
+        for conn, process in zip(self.connections, self.processes):
+            conn.send(("close", None))
+            conn.close()
+            process.join()
+        self.connections = []
+        self.processes = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _request(self, shard, op, args):
+        conn = self.connections[shard]
+        conn.send((op, args))
+        reply = conn.recv()
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    def _drug_id(self, order):
+        return self.drugs.format_drug_id(order) if order is not None else None
+
+    def add_drug(self, drug_name, indications=None, substitutes=None, side_effects=None):
+        '''
+            Dodaje lek: dane leku do sharda leków, wskazania do shardów ich chorób. Zwraca identyfikator leku.
+        '''
+        # Histogram (sprawdza skuteczności jak Drug) powstaje przed zapisem; shard leków sprawdza zamienniki,
+        # zanim cokolwiek trafi do shardów chorób — błędne dane nie zmieniają żadnej struktury
+        histogram = array("l", [0] * 11)
+        per_shard = {}
+        for disease_name, efficacy in indications or ():
+            per_shard.setdefault(shard_of(disease_name, self.n_shards), []).append((disease_name, efficacy))
+            for level in range(1, efficacy + 1):
+                histogram[level] += 1
+
+        drug_id = self.drugs.add_drug(drug_name, [], substitutes, side_effects)
+        order = self.drugs.order_of(drug_id)
+        self.histograms.append(histogram)
+
+        for shard, shard_indications in per_shard.items():
+            self.connections[shard].send(("add", [(order, drug_name, shard_indications)]))
+        return drug_id
+
+    def add_substitutes(self, pairs):
+        '''Relacje zamiany dotyczą tylko shardu leków.'''
+        return self.drugs.add_substitutes(pairs)
+
+    def number_of_indications(self, drug_id, min_efficacy):
+        order = self.drugs.order_of(drug_id)
+        if order is None:
+            return 0
+        return self.histograms[order][min_efficacy]
+
+    def number_of_alternative_drugs(self, drug_id):
+        return self.drugs.number_of_alternative_drugs(drug_id)
+
+    def worst_side_effect(self, drug_id):
+        return self.drugs.worst_side_effect(drug_id)
+
+    def risk_score(self, drug_id):
+        return self.drugs.risk_score(drug_id)
+
+    def find_best_alternative(self, drug_id, max_steps=2):
+        return self.drugs.find_best_alternative(drug_id, max_steps)
+
+    def find_best_drug_for_indication(self, disease_name):
+        return self._drug_id(self._request(shard_of(disease_name, self.n_shards), "best", disease_name))
+
+    def top_k_drugs_for_indication(self, disease_name, k):
+        orders = self._request(shard_of(disease_name, self.n_shards), "top_k", (disease_name, k))
+        return [self._drug_id(order) for order in orders]
+
+    def update_best_indication(self, disease_name, new_efficacy):
+        self.update_best_indications([(disease_name, new_efficacy)])
+
+    def update_best_indications(self, updates):
+        '''
+            Wykonuje ciąg wywołań update_best_indication(choroba, skuteczność). Aktualizacje dla jednego
+            sharda wykonywane są w kolejności z updates; różne shardy pracują równolegle.
+        '''
+        per_shard = {}
+        for disease_name, efficacy in updates:
+            per_shard.setdefault(shard_of(disease_name, self.n_shards), []).append((disease_name, efficacy))
+        for shard, shard_updates in per_shard.items():
+            self.connections[shard].send(("update", shard_updates))
+
+        errors = []
+        for shard, shard_updates in per_shard.items():
+            reply = self.connections[shard].recv()
+            if isinstance(reply, Exception):
+                errors.append(reply)
+                continue
+            for (_, new_efficacy), change in zip(shard_updates, reply):
+                if change is None:
+                    continue
+                order, old_efficacy = change
+                histogram = self.histograms[order]
+                for level in range(1, old_efficacy + 1):
+                    histogram[level] -= 1
+                for level in range(1, new_efficacy + 1):
+                    histogram[level] += 1
+        if errors:
+            raise errors[0]
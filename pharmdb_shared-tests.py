@@ -0,0 +1,86 @@
+# Testy replik w pamięci współdzielonej
+import os
+import subprocess
+import sys
+
+from pharmdb import PharmDB
+from pharma_db_extended import PharmaDB
+from pharmdb_bench import generate_catalogue, load_catalogue
+from pharmdb_shared import SnapshotPublisher, SharedReplica
+
+
+def compare(db, replica):
+    for order in range(1, db.next_id_number, 3):
+        drug_id = db.format_drug_id(order)
+        for level in (0, 1, 5, 10, -1):
+            assert replica.number_of_indications(drug_id, level) == db.number_of_indications(drug_id, level)
+        assert replica.number_of_alternative_drugs(drug_id) == db.number_of_alternative_drugs(drug_id)
+        assert replica.worst_side_effect(drug_id) == db.worst_side_effect(drug_id)
+        assert replica.risk_score(drug_id) == db.risk_score(drug_id)
+        assert replica.find_best_alternative(drug_id, 3) == db.find_best_alternative(drug_id, 3)
+    for disease in db.disease_names:
+        assert replica.find_best_drug_for_indication(disease) == db.find_best_drug_for_indication(disease)
+    for low, high in [(0, 100), (5.0, 15.0), (20.0, 20.5), (60, 70)]:
+        assert replica.count_drugs_with_side_effect_frequency(low, high) == db.count_drugs_with_side_effect_frequency(low, high)
+        assert replica.list_drugs_with_side_effect_frequency(low, high) == db.list_drugs_with_side_effect_frequency(low, high)
+
+
+READER = """
+import sys
+from pharmdb_shared import SharedReplica
+replica = SharedReplica(sys.argv[1])
+print(replica.version, replica.find_best_drug_for_indication("choroba_3"), replica.risk_score("D0007"))
+replica.close()
+"""
+
+name = f"pharmdb-test-{os.getpid()}"
+db = PharmaDB()
+load_catalogue(db, generate_catalogue(400, substitution_degree=4, n_diseases=15, seed=5))
+publisher = SnapshotPublisher(db, name)
+replica = SharedReplica(name)
+try:
+    # Przed pierwszą publikacją replika jest pusta
+    assert replica.version == 0 and replica.risk_score("D0001") == 0.0
+    assert replica.find_best_drug_for_indication("choroba_3") is None
+
+    assert publisher.publish() == 1
+    compare(db, replica)
+    for drug_id in ("D401", "D0000", "X0001"):
+        assert replica.risk_score(drug_id) == db.risk_score(drug_id) == 0.0
+        assert replica.number_of_indications(drug_id, 0) == db.number_of_indications(drug_id, 0) == 0
+    assert replica.find_best_drug_for_indication("nieznana") is None
+
+    # Zmiany w bazie widoczne są dopiero po publikacji nowej wersji
+    old_best = db.find_best_drug_for_indication("choroba_3")
+    new_id = db.add_drug("Nowy", [("choroba_3", 10), ("nowa_choroba", 4)], [old_best], [("ból", 3, 50.0)])
+    assert replica.find_best_drug_for_indication("choroba_3") == old_best
+    assert replica.risk_score(new_id) == 0.0
+    publisher.publish()
+    publisher.publish()
+    assert replica.version == 3
+    compare(db, replica)
+    assert replica.find_best_drug_for_indication("nowa_choroba") == new_id
+
+    # Czytelnik w innym procesie
+    output = subprocess.run([sys.executable, "-c", READER, name], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    assert output.stdout.split() == ["3", new_id, str(db.risk_score("D0007"))]
+    assert output.stderr == ""
+    fresh = SharedReplica(name)         # segmenty przetrwały zakończenie procesu czytelnika
+    assert fresh.version == 3
+    fresh.close()
+
+    # Rdzeń bez indeksu częstotliwości też może być publikowany
+    core = PharmDB()
+    load_catalogue(core, generate_catalogue(50, seed=1))
+    core_publisher = SnapshotPublisher(core, name + "-core")
+    core_publisher.publish()
+    core_replica = SharedReplica(name + "-core")
+    assert core_replica.find_best_alternative("D0001") == core.find_best_alternative("D0001")
+    core_replica.close()
+    core_publisher.close()
+finally:
+    replica.close()
+    publisher.close()
+
+print("Testy replik współdzielonych zakończone sukcesem!")
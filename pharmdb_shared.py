@@ -0,0 +1,371 @@
+# Współdzielone repliki do odczytu PharmDB / PharmaDB (multiprocessing.shared_memory)
+#
+# Jeden proces-pisarz posiada bazę i publikuje niezmienne, wersjonowane migawki (snapshoty) jej danych
+# kolumnowych i grafu zamian (CSR) do pamięci współdzielonej. Procesy-czytelnicy (np. workery gunicorna)
+# podłączają się bez kopiowania: wszystkie kolumny to memoryview na buforze segmentu.
+#
+# Segmenty:
+#   {name}-ctl        8 bajtów: numer bieżącej wersji (0 = nic nie opublikowano)
+#   {name}-{wersja}   migawka: nagłówek (magic, wersja, liczba sekcji, (offset, długość) sekcji) + sekcje
+#
+# Pisarz najpierw zapisuje cały nowy segment, a dopiero potem podmienia numer wersji w segmencie ctl
+# (jedno wyrównane słowo 8-bajtowe), więc czytelnik widzi zawsze kompletną migawkę. Czytelnik sprawdza
+# numer wersji na początku każdego zapytania i całe zapytanie wykonuje na jednej migawce.
+
+import struct
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import deque
+from multiprocessing import resource_tracker, shared_memory
+
+from pharmdb import ORDER_MASK
+
+MAGIC = 0x50484442534E4150      # "PHDBSNAP"
+
+# Sekcje migawki w ustalonej kolejności: (nazwa, typ elementu array)
+SECTIONS = (
+    ("meta", "q"),                  # [id_width, liczba leków + 1]
+    ("id_prefix", "B"),
+    ("risk", "d"),                  # klucz leku → risk_score
+    ("worst_effect", "q"),          # klucz leku → numer najgorszego objawu lub -1
+    ("replaced_by_indptr", "q"),    # CSR reverse_substitutes
+    ("replaced_by", "q"),
+    ("indication_indptr", "q"),     # CSR wskazań: (numer choroby, skuteczność)
+    ("indication_disease", "q"),
+    ("indication_efficacy", "q"),
+    ("efficacy_histogram", "i"),    # histogramy skuteczności: lek order zajmuje pozycje 11 * order .. 11 * order + 10
+    ("best_drug", "q"),             # numer choroby → spakowany wpis najlepszego leku (jak best_drug_for_disease)
+    ("frequency", "d"),             # skutki uboczne posortowane po częstotliwości (stabilnie)
+    ("frequency_drug", "q"),
+    ("frequency_effect", "q"),
+    ("drug_name_offsets", "q"),     # napisy: przesunięcia + bajty UTF-8
+    ("drug_name_bytes", "B"),
+    ("disease_name_offsets", "q"),
+    ("disease_name_bytes", "B"),
+    ("effect_name_offsets", "q"),
+    ("effect_name_bytes", "B"),
+)
+
+_HEADER = struct.Struct(f"<3q{2 * len(SECTIONS)}q")
+
+
+def _attach(name):
+    # Czytelnik nie jest właścicielem segmentu, więc nie może go rejestrować w resource_tracker
+    # (tracker usunąłby segment przy zakończeniu procesu czytelnika)
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+    # Python < 3.13 nie ma parametru track — rejestrację wyłączam na czas podłączenia
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+def _strings(values):
+    offsets = array("q", [0])
+    data = bytearray()
+    for value in values:
+        data += value.encode("utf-8")
+        offsets.append(len(data))
+    return offsets, array("B", data)
+
+
+def _build_sections(db):
+    drugs = db.drugs_by_order
+    n = db.next_id_number
+    disease_ids = db.disease_ids
+    effect_ids = db.effect_ids
+    reverse = db.reverse_substitutes
+
+    risk = array("d", [0.0])
+    worst = array("q", [-1])
+    rev_indptr = array("q", [0, 0])
+    rev = array("q")
+    ind_indptr = array("q", [0, 0])
+    ind_disease = array("q")
+    ind_efficacy = array("q")
+    histogram = array("i", [0] * 11)
+    for order in range(1, n):
+        drug = drugs[order]
+        histogram.extend(drug.efficacy_histogram)
+        risk.append(drug.risk_score)
+        worst.append(-1 if drug.worst_effect_name is None else effect_ids[drug.worst_effect_name])
+        rev.extend(sorted(reverse.get(order, ())))
+        rev_indptr.append(len(rev))
+        for disease_name, efficacy in drug.indications.items():
+            ind_disease.append(disease_ids[disease_name])
+            ind_efficacy.append(efficacy)
+        ind_indptr.append(len(ind_disease))
+
+    freq_col = db.side_effect_freq
+    by_frequency = sorted(range(len(freq_col)), key=freq_col.__getitem__)
+
+    sections = {
+        "meta": array("q", [db.id_width, n]),
+        "id_prefix": array("B", db.id_prefix.encode("utf-8")),
+        "risk": risk,
+        "worst_effect": worst,
+        "replaced_by_indptr": rev_indptr,
+        "replaced_by": rev,
+        "indication_indptr": ind_indptr,
+        "indication_disease": ind_disease,
+        "indication_efficacy": ind_efficacy,
+        "efficacy_histogram": histogram,
+        "best_drug": array("q", db.best_drug_for_disease),
+        "frequency": array("d", (freq_col[i] for i in by_frequency)),
+        "frequency_drug": array("q", (db.side_effect_drug[i] for i in by_frequency)),
+        "frequency_effect": array("q", (db.side_effect_effect[i] for i in by_frequency)),
+    }
+    sections["drug_name_offsets"], sections["drug_name_bytes"] = _strings(drugs[order].name for order in range(1, n))
+    sections["disease_name_offsets"], sections["disease_name_bytes"] = _strings(db.disease_names)
+    sections["effect_name_offsets"], sections["effect_name_bytes"] = _strings(db.effect_names)
+    return sections
+
+
+class SnapshotPublisher:
+    '''
+        Strona pisarza: publikuje migawki bazy db pod nazwą name.
+
+        Args:
+            db (PharmDB): baza, której właścicielem jest ten proces
+            name (str): nazwa bazowa segmentów pamięci współdzielonej
+            keep (int, optional): ile ostatnich wersji trzymać (starsze są usuwane przy publikacji;
+                    czytelnicy już do nich podłączeni korzystają z nich do czasu przełączenia)
+    '''
+
+    def __init__(self, db, name, keep=2):
+        self.db = db
+        self.name = name
+        self.keep = keep
+        self.version = 0
+        self.segments = deque()
+        self.control = shared_memory.SharedMemory(name=f"{name}-ctl", create=True, size=8)
+        self.control.buf[:8] = struct.pack("<q", 0)
+
+    def publish(self):
+        '''
+            Zapisuje nową migawkę i atomowo przełącza na nią czytelników. Zwraca numer wersji.
+
+            Złożoność czasowa: O(D + S + I + E log E)
+        '''
+        sections = _build_sections(self.db)
+        version = self.version + 1
+
+        layout = []
+        offset = _HEADER.size
+        for name, typecode in SECTIONS:
+            data = sections[name]
+            assert data.typecode == typecode
+            offset = (offset + 7) & ~7
+            layout.append((offset, len(data) * data.itemsize))
+            offset += len(data) * data.itemsize
+
+        shm = shared_memory.SharedMemory(name=f"{self.name}-{version}", create=True, size=max(offset, 1))
+        shm.buf[:_HEADER.size] = _HEADER.pack(MAGIC, version, len(SECTIONS),
+                                              *(value for pair in layout for value in pair))
+        for (name, _), (start, size) in zip(SECTIONS, layout):
+            shm.buf[start:start + size] = sections[name].tobytes()
+
+        # Przełączenie: jedno słowo w segmencie ctl
+        self.control.buf[:8] = struct.pack("<q", version)
+        self.version = version
+
+        self.segments.append(shm)
+        while len(self.segments) > self.keep:
+            old = self.segments.popleft()
+            old.close()
+            old.unlink()
+        return version
+
+    def close(self):
+        '''Usuwa wszystkie segmenty (czytelnicy tracą możliwość podłączenia się do nowych wersji).'''
+        while self.segments:
+            shm = self.segments.popleft()
+            shm.close()
+            shm.unlink()
+        self.control.close()
+        self.control.unlink()
+
+
+class Snapshot:
+    '''
+        Jedna niezmienna wersja danych podłączona do procesu czytelnika (widoki memoryview bez kopiowania).
+    '''
+
+    def __init__(self, shm):
+        self.shm = shm
+        header = _HEADER.unpack_from(shm.buf, 0)
+        if header[0] != MAGIC:
+            raise ValueError("Segment nie zawiera migawki PharmDB: " + shm.name)
+        self.version = header[1]
+        self.views = []
+        for i, (name, typecode) in enumerate(SECTIONS):
+            start, size = header[3 + 2 * i], header[4 + 2 * i]
+            view = shm.buf[start:start + size].cast(typecode)
+            self.views.append(view)
+            setattr(self, name, view)
+
+        self.id_width = self.meta[0]
+        self.next_id_number = self.meta[1]
+        self.id_prefix = bytes(self.id_prefix).decode("utf-8")
+        self._disease_ids = None
+
+    def close(self):
+        for view in self.views:
+            view.release()
+        self.views = []
+        self.shm.close()
+
+    @staticmethod
+    def _string(offsets, data, i):
+        return bytes(data[offsets[i]:offsets[i + 1]]).decode("utf-8")
+
+    def drug_id(self, order):
+        return f"{self.id_prefix}{order:0{self.id_width}d}"
+
+    def order_of(self, drug_id):
+        prefix = self.id_prefix
+        if not isinstance(drug_id, str) or not drug_id.startswith(prefix) or not drug_id[len(prefix):].isdigit():
+            return None
+        order = int(drug_id[len(prefix):])
+        if not 0 < order < self.next_id_number or self.drug_id(order) != drug_id:
+            return None
+        return order
+
+    def disease_of(self, disease_name):
+        # Słownik nazw chorób budowany leniwie, raz na wersję
+        if self._disease_ids is None:
+            offsets, data = self.disease_name_offsets, self.disease_name_bytes
+            self._disease_ids = {self._string(offsets, data, i): i for i in range(len(offsets) - 1)}
+        return self._disease_ids.get(disease_name)
+
+    def drug_name(self, order):
+        return self._string(self.drug_name_offsets, self.drug_name_bytes, order - 1)
+
+    def effect_name(self, effect):
+        return self._string(self.effect_name_offsets, self.effect_name_bytes, effect)
+
+
+class SharedReplica:
+    '''
+        Strona czytelnika: replika tylko do odczytu z tym samym API zapytań co PharmDB / PharmaDB
+        (number_of_indications, number_of_alternative_drugs, worst_side_effect, risk_score,
+        find_best_alternative, find_best_drug_for_indication oraz zapytania o częstotliwość).
+
+        Przed każdym zapytaniem sprawdzany jest numer wersji w segmencie ctl; nowa wersja jest podłączana,
+        a poprzednia zwalniana. Zapytanie w całości korzysta z jednej migawki.
+    '''
+
+    def __init__(self, name):
+        self.name = name
+        self.control = _attach(f"{name}-ctl")
+        self.snapshot = None
+
+    def current(self):
+        '''Zwraca bieżącą migawkę (po ewentualnym przełączeniu na nowszą wersję) lub None.'''
+        while True:
+            version = struct.unpack_from("<q", self.control.buf, 0)[0]
+            if self.snapshot is not None and self.snapshot.version == version:
+                return self.snapshot
+            if version == 0:
+                return None
+            try:
+                shm = _attach(f"{self.name}-{version}")
+            except FileNotFoundError:
+                continue            # pisarz zdążył opublikować kolejną wersję i usunąć tę — czytam numer ponownie
+            if self.snapshot is not None:
+                self.snapshot.close()
+            self.snapshot = Snapshot(shm)
+            return self.snapshot
+
+    @property
+    def version(self):
+        snapshot = self.current()
+        return snapshot.version if snapshot is not None else 0
+
+    def close(self):
+        if self.snapshot is not None:
+            self.snapshot.close()
+            self.snapshot = None
+        self.control.close()
+
+    def number_of_indications(self, drug_id, min_efficacy):
+        s = self.current()
+        order = s.order_of(drug_id) if s is not None else None
+        if order is None:
+            return 0
+        if 0 <= min_efficacy <= 10:
+            return s.efficacy_histogram[11 * order + min_efficacy]
+        # Poza 0..10 semantyka indeksowania listy Drug.efficacy_histogram (jak w PharmDB)
+        return s.efficacy_histogram[11 * order:11 * order + 11].tolist()[min_efficacy]
+
+    def number_of_alternative_drugs(self, drug_id):
+        s = self.current()
+        order = s.order_of(drug_id) if s is not None else None
+        if order is None:
+            return 0
+        return s.replaced_by_indptr[order + 1] - s.replaced_by_indptr[order]
+
+    def worst_side_effect(self, drug_id):
+        s = self.current()
+        order = s.order_of(drug_id) if s is not None else None
+        if order is None or s.worst_effect[order] < 0:
+            return None
+        return s.effect_name(s.worst_effect[order])
+
+    def risk_score(self, drug_id):
+        s = self.current()
+        order = s.order_of(drug_id) if s is not None else None
+        if order is None:
+            return 0.0
+        return s.risk[order]
+
+    def find_best_alternative(self, drug_id, max_steps=2):
+        s = self.current()
+        start = s.order_of(drug_id) if s is not None else None
+        if start is None:
+            return None
+        risk = s.risk
+        indptr = s.replaced_by_indptr
+        neighbors = s.replaced_by
+
+        best = start
+        visited = {start}
+        frontier = [start]
+        for _ in range(max_steps):
+            next_frontier = []
+            for current in frontier:
+                for i in range(indptr[current], indptr[current + 1]):
+                    neighbor = neighbors[i]
+                    if neighbor not in visited:
+                        visited.add(neighbor)
+                        next_frontier.append(neighbor)
+            frontier = next_frontier
+        for order in visited:
+            if risk[order] < risk[best] or (risk[order] == risk[best] and order < best):
+                best = order
+        return s.drug_id(best)
+
+    def find_best_drug_for_indication(self, disease_name):
+        s = self.current()
+        disease = s.disease_of(disease_name) if s is not None else None
+        if disease is None or not s.best_drug[disease]:
+            return None
+        return s.drug_id(s.best_drug[disease] & ORDER_MASK)
+
+    def count_drugs_with_side_effect_frequency(self, min_freq, max_freq):
+        s = self.current()
+        if s is None:
+            return 0
+        return max(0, bisect_right(s.frequency, max_freq) - bisect_left(s.frequency, min_freq))
+
+    def list_drugs_with_side_effect_frequency(self, min_freq, max_freq):
+        s = self.current()
+        if s is None:
+            return []
+        return [(s.drug_name(s.frequency_drug[i]), s.effect_name(s.frequency_effect[i]))
+                for i in range(bisect_left(s.frequency, min_freq), bisect_right(s.frequency, max_freq))]
@@ -0,0 +1,153 @@
+# Podobieństwo profili wskazań leków PharmDB
+#
+# Profil leku to wiersz rzadkiej macierzy lek × choroba ze skutecznościami z Drug.indications. Macierz trzymana
+# jest kolumnami (CSC): dla każdej choroby array('q') kluczy leków (rosnąco, bo leki dopisywane są w kolejności
+# dodania) i array('d') skuteczności, oraz normy wierszy. Nowy lek dopisuje się na końce kolumn swoich chorób,
+# a update_best_indication nadpisuje jedną wartość (pozycja w kolumnie z bisekcji) i normę wiersza.
+#
+# Podobieństwo cosinusowe leku q z pozostałymi to iloczyny skalarne z kolumnami chorób q, więc przeglądane są
+# tylko leki mające z q wspólną chorobę. Przy długich kolumnach (popularne choroby) z NumPy składki wszystkich
+# zapytań wsadu łączone są w jeden wektor kluczy (zapytanie, lek) i sumowane jednym sortowaniem i reduceat; bez NumPy
+# lub przy krótkich kolumnach (narzut NumPy większy niż zysk) sumy liczone są słownikiem. Obie wersje sumują w tej samej kolejności, więc wyniki
+# są identyczne. Ranking: malejąco po podobieństwie, przy remisie wcześniej dodany lek.
+
+import heapq
+import math
+from array import array
+from bisect import bisect_left
+
+from pharmdb import SecondaryIndex
+
+# Od takiej średniej długości przeglądanych kolumn opłaca się wersja z NumPy
+NUMPY_MIN_COLUMN = 256
+
+# Docelowa liczba składek w jednym wywołaniu wersji z NumPy
+NUMPY_CHUNK = 1 << 16
+
+
+class SimilarityIndex(SecondaryIndex):
+    '''
+        Rzadka macierz skuteczności lek × choroba (kolumnowo) z normami wierszy.
+    '''
+
+    def __init__(self, db):
+        self.db = db
+        self.column_orders = []         # numer choroby → array('q') kluczy leków
+        self.column_values = []         # numer choroby → array('d') skuteczności
+        self.norms = array('d', [0.0])  # klucz leku → norma euklidesowa profilu
+
+    def _row(self, drug):
+        # Pary (numer choroby, skuteczność) profilu leku
+        disease_ids = self.db.disease_ids
+        return [(disease_ids[disease_name], efficacy) for disease_name, efficacy in drug.indications.items()]
+
+    def _order_row(self, order):
+        return self._row(self.db.drugs_by_order[order])
+
+    def on_insert(self, drug):
+        order = drug.insert_order
+        while len(self.norms) <= order:
+            self.norms.append(0.0)
+        total = 0
+        for disease, efficacy in self._row(drug):
+            while len(self.column_orders) <= disease:
+                self.column_orders.append(array('q'))
+                self.column_values.append(array('d'))
+            self.column_orders[disease].append(order)
+            self.column_values[disease].append(efficacy)
+            total += efficacy * efficacy
+        self.norms[order] = math.sqrt(total)
+
+    def on_update(self, drug, disease_name, old_efficacy, new_efficacy):
+        order = drug.insert_order
+        disease = self.db.disease_ids[disease_name]
+        column = self.column_orders[disease]
+        self.column_values[disease][bisect_left(column, order)] = new_efficacy
+        self.norms[order] = math.sqrt(sum(efficacy * efficacy for efficacy in drug.indications.values()))
+
+    def top_k(self, orders, k, exclude=None):
+        '''
+            Dla każdego klucza z orders zwraca listę do k par (klucz leku, podobieństwo) najbardziej podobnych
+            leków (bez niego samego i bez leków ze zbioru exclude(order), jeśli podano).
+        '''
+        rows = [self._order_row(order) if self.norms[order] else [] for order in orders]
+        columns = sum(len(row) for row in rows)
+        entries = sum(len(self.column_orders[disease]) for row in rows for disease, _ in row)
+        if columns and entries >= NUMPY_MIN_COLUMN * columns:
+            try:
+                import numpy as np
+            except ImportError:
+                np = None
+            if np is not None:
+                # Wsad dzielony na części po około NUMPY_CHUNK składek — sortowanie w unique i lexsort
+                # rośnie szybciej niż liniowo, a części tej wielkości wciąż rozkładają narzut NumPy
+                result = []
+                start = 0
+                size = 0
+                for i, row in enumerate(rows):
+                    size += sum(len(self.column_orders[disease]) for disease, _ in row)
+                    if size >= NUMPY_CHUNK or i == len(rows) - 1:
+                        result.extend(self._top_k_numpy(np, orders[start:i + 1], rows[start:i + 1], k, exclude))
+                        start = i + 1
+                        size = 0
+                return result
+
+        norms = self.norms
+        result = []
+        for order, row in zip(orders, rows):
+            dots = {}
+            for disease, efficacy in row:
+                for other, value in zip(self.column_orders[disease], self.column_values[disease]):
+                    dots[other] = dots.get(other, 0.0) + efficacy * value
+            dots.pop(order, None)
+            result.append(self._select(order, ((other, dot / (norms[order] * norms[other]))
+                                               for other, dot in dots.items()), k, exclude))
+        return result
+
+    def _top_k_numpy(self, np, orders, rows, k, exclude):
+        n = len(self.norms)
+        norms = np.frombuffer(self.norms, dtype=np.float64)
+        keys = []
+        weights = []
+        for i, row in enumerate(rows):
+            for disease, efficacy in row:
+                keys.append(np.frombuffer(self.column_orders[disease], dtype=np.int64) + i * n)
+                weights.append(np.frombuffer(self.column_values[disease], dtype=np.float64) * efficacy)
+        result = [[] for _ in orders]
+        if not keys:
+            return result
+
+        # Jedna suma dla wszystkich par (zapytanie, lek): klucz = numer zapytania * n + klucz leku.
+        # Kolumny są posortowane, więc klucze to posortowane serie — sortowanie stabilne scala je szybko
+        # i zachowuje kolejność składek (jak w wersji słownikowej)
+        keys = np.concatenate(keys)
+        weights = np.concatenate(weights)
+        permutation = np.argsort(keys, kind="stable")
+        keys = keys[permutation]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        dots = np.add.reduceat(weights[permutation], starts)
+        query = keys[starts] // n
+        others = keys[starts] % n
+        query_norms = np.array([self.norms[order] for order in orders])
+        similarity = dots / (query_norms[query] * norms[others])
+        bounds = np.searchsorted(query, np.arange(len(orders) + 1)).tolist()
+
+        for i, order in enumerate(orders):
+            excluded = exclude(order) if exclude is not None else ()
+            segment_others = others[bounds[i]:bounds[i + 1]]
+            segment_similarity = similarity[bounds[i]:bounds[i + 1]]
+            # Wystarczy k + 1 + |excluded| najlepszych (pomijany sam lek i wykluczone) razem z remisami na granicy
+            limit = k + 1 + len(excluded)
+            if limit < len(segment_others):
+                best = np.argpartition(-segment_similarity, limit - 1)[:limit]
+                best = np.flatnonzero(segment_similarity >= segment_similarity[best].min())
+                segment_others = segment_others[best]
+                segment_similarity = segment_similarity[best]
+            candidates = zip(segment_others.tolist(), segment_similarity.tolist())
+            result[i] = self._select(order, ((other, sim) for other, sim in candidates if other != order), k, exclude)
+        return result
+
+    def _select(self, order, candidates, k, exclude):
+        excluded = exclude(order) if exclude is not None else ()
+        return [(other, sim) for neg, other, sim in
+                heapq.nsmallest(k, ((-sim, other, sim) for other, sim in candidates if other not in excluded))]
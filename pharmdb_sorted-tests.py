@@ -0,0 +1,128 @@
+# Testy multizbioru z operacjami rank/select
+import random
+from bisect import bisect_left
+
+from pharmdb_sorted import SortedCountIndex
+
+rng = random.Random(1)
+index = SortedCountIndex(load=4)            # mały rozmiar porcji — dużo podziałów i usunięć porcji
+items = []
+for step in range(3000):
+    if items and rng.random() < 0.4:
+        key = items.pop(rng.randrange(len(items)))
+        index.remove(key)
+    else:
+        key = rng.randint(0, 300) / 4
+        index.add(key)
+        items.append(key)
+    if step % 50 == 0:
+        ordered = sorted(items)
+        assert len(index) == len(ordered)
+        assert [index.select(i) for i in range(len(ordered))] == ordered
+        for probe in (-1, 0, 12.5, 37.25, 80):
+            assert index.rank(probe) == bisect_left(ordered, probe)
+            assert index.count(probe) == ordered.count(probe)
+
+try:
+    index.remove(1000.0)
+    assert False
+except KeyError:
+    pass
+try:
+    index.select(len(index))
+    assert False
+except IndexError:
+    pass
+
+index = SortedCountIndex()
+index.add(5.0, 3)
+assert index.rank(5.0) == 0 and index.rank(5.5) == 3 and index.select(2) == 5.0
+index.remove(5.0, 3)
+assert len(index) == 0 and index.rank(1.0) == 0
+print("Testy multizbioru rank/select zakończone sukcesem!")
+
+# Słownik z uporządkowanymi kluczami
+from pharmdb_sorted import SortedKeyDict
+
+rng = random.Random(2)
+mapping = SortedKeyDict(load=4)
+reference = {}
+for step in range(3000):
+    roll = rng.random()
+    if reference and roll < 0.3:
+        key = rng.choice(list(reference))
+        if roll < 0.15:
+            del mapping[key]
+        else:
+            assert mapping.pop(key) == reference[key]
+        del reference[key]
+    elif roll < 0.35:
+        batch = {rng.randint(0, 400) / 8: [step] for _ in range(rng.randint(1, 40))}
+        mapping.update(batch)
+        reference.update(batch)
+    else:
+        key = step / 10 if roll < 0.8 else rng.randint(0, 400) / 8       # głównie klucze rosnące
+        if roll < 0.6:
+            mapping.setdefault(key, []).append(step)
+            reference.setdefault(key, []).append(step)
+        else:
+            mapping[key] = [step]
+            reference[key] = [step]
+    if step % 50 == 0:
+        ordered = sorted(reference)
+        assert list(mapping) == mapping.keys() == ordered and len(mapping) == len(ordered)
+        assert mapping.items() == [(key, reference[key]) for key in ordered]
+        assert list(reversed(mapping)) == ordered[::-1]
+        for _ in range(5):
+            low = rng.uniform(-5, 320)
+            high = low + rng.uniform(-1, 40)
+            assert list(mapping.irange(low, high)) == [key for key in ordered if low <= key <= high]
+
+mapping.clear()
+assert len(mapping) == 0 and list(mapping.irange(0, 10)) == []
+mapping = SortedKeyDict([(3.0, "c"), (1.0, "a"), (2.0, "b")])
+assert mapping.keys() == [1.0, 2.0, 3.0] and mapping[2.0] == "b" and mapping.get(4.0) is None
+assert list(mapping.irange(1.5, 3.0)) == [2.0, 3.0] and list(mapping.irange(3.5, 9)) == []
+assert mapping.pop(9.0, None) is None
+
+# Pozostałe metody dict zmieniające zawartość utrzymują uporządkowane klucze
+import copy
+import pickle
+
+mapping = SortedKeyDict([(float(i), i) for i in range(10)], load=2)
+assert mapping.popitem() == (9.0, 9) and max(mapping.irange(0, 100)) == 8.0
+mapping |= {20.0: "x", 0.5: "y"}
+assert list(mapping.irange(0, 1)) == [0.0, 0.5, 1.0] and mapping.keys()[-1] == 20.0
+for clone in (mapping.copy(), copy.copy(mapping), copy.deepcopy(mapping), pickle.loads(pickle.dumps(mapping))):
+    assert type(clone) is SortedKeyDict and clone.items() == mapping.items()
+    clone[-1.0] = "z"
+    del clone[20.0]
+    assert list(clone.irange(-5, 0.5)) == [-1.0, 0.0, 0.5] and list(clone.irange(10, 30)) == []
+    assert list(mapping.irange(10, 30)) == [20.0] and -1.0 not in mapping
+merged = mapping | {7.5: "w"}
+assert type(merged) is SortedKeyDict and list(merged.irange(7, 8)) == [7.0, 7.5, 8.0] and 7.5 not in mapping
+merged = {7.5: "w", 1.0: "v"} | mapping
+assert type(merged) is SortedKeyDict and merged[1.0] == 1 and list(merged.irange(7, 8)) == [7.0, 7.5, 8.0]
+keys = SortedKeyDict.fromkeys([3.0, 1.0, 2.0], 0)
+assert type(keys) is SortedKeyDict and keys.items() == [(1.0, 0), (2.0, 0), (3.0, 0)]
+while keys:
+    keys.popitem()
+assert list(keys.irange(0, 10)) == []
+try:
+    keys.popitem()
+    assert False
+except KeyError:
+    pass
+print("Testy słownika z uporządkowanymi kluczami zakończone sukcesem!")
+
+# Iteracja i liczności przedziałów multizbioru
+index = SortedCountIndex(load=2)
+rng = random.Random(3)
+values = [rng.randint(0, 20) for _ in range(200)]
+for value in values:
+    index.add(value)
+assert list(index) == sorted(values)
+assert list(index.distinct()) == sorted(set(values)) and list(index.distinct(reverse=True)) == sorted(set(values))[::-1]
+for low, high in [(0, 20), (3, 7), (7, 3), (-5, 0), (20, 30), (4, 4)]:
+    assert index.count_range(low, high) == sum(1 for v in values if low <= v <= high)
+print("Testy iteracji multizbioru zakończone sukcesem!")
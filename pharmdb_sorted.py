@@ -0,0 +1,372 @@
+# Posortowane struktury kluczy liczbowych bez zależności zewnętrznych
+#
+# SortedCountIndex — multizbiór z operacjami rank/select. Klucze trzymane są w porcjach (chunkach) posortowanych
+# list o ograniczonym rozmiarze, każda z listą krotności kluczy. Sumy krotności porcji przechowuje drzewo Fenwicka, więc liczba elementów przed daną porcją to O(log C).
+# Rozmiar porcji jest stały (load), dlatego rank, select i wstawianie działają w O(log F).
+#
+# SortedKeyDict — słownik z uporządkowanymi kluczami i zapytaniami zakresowymi (irange), oparty na tych samych
+# porcjach posortowanych list; zastępuje SortedDict z sortedcontainers w indeksie częstotliwości PharmaDB.
+
+from bisect import bisect_left, bisect_right
+from itertools import chain
+
+
+class SortedCountIndex:
+    '''
+        Multizbiór kluczy (np. częstotliwości skutków ubocznych) z krotnościami.
+
+        Operacje:
+            add(key, n), remove(key, n) — zmiana krotności klucza
+            rank(key) — liczba elementów mniejszych od key
+            select(i) — i-ty najmniejszy element (od 0)
+            count(key) — krotność klucza
+            count_range(low, high) — liczba elementów z przedziału [low, high]
+
+        Args:
+            load (int, optional): docelowy rozmiar porcji (porcja dzielona przy 2 * load kluczach)
+    '''
+
+    def __init__(self, load=256):
+        self.load = load
+        self.keys = []              # porcja → posortowana lista kluczy
+        self.counts = []            # porcja → krotności kluczy
+        self.maxes = []             # porcja → największy klucz
+        self.tree = [0]             # drzewo Fenwicka sum krotności porcji (indeksy od 1)
+        self.total = 0
+
+    def __len__(self):
+        return self.total
+
+    def _rebuild_tree(self):
+        tree = [0] * (len(self.keys) + 1)
+        for i, counts in enumerate(self.counts, 1):
+            tree[i] += sum(counts)
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self.tree = tree
+
+    def _tree_add(self, chunk, delta):
+        i = chunk + 1
+        tree = self.tree
+        while i < len(tree):
+            tree[i] += delta
+            i += i & -i
+
+    def _before(self, chunk):
+        # Liczba elementów w porcjach 0..chunk-1
+        total = 0
+        i = chunk
+        tree = self.tree
+        while i:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+    def add(self, key, n=1):
+        if not self.keys:
+            self.keys.append([key])
+            self.counts.append([n])
+            self.maxes.append(key)
+            self._rebuild_tree()
+            self.total += n
+            return
+        chunk = bisect_left(self.maxes, key)
+        if chunk == len(self.maxes):
+            chunk -= 1
+        keys = self.keys[chunk]
+        pos = bisect_left(keys, key)
+        if pos < len(keys) and keys[pos] == key:
+            self.counts[chunk][pos] += n
+        else:
+            keys.insert(pos, key)
+            self.counts[chunk].insert(pos, n)
+            self.maxes[chunk] = keys[-1]
+        self.total += n
+
+        if len(keys) > 2 * self.load:
+            # Podział porcji — drzewo budowane od nowa (amortyzowane: raz na load wstawień)
+            half = len(keys) // 2
+            counts = self.counts[chunk]
+            self.keys[chunk + 1:chunk + 1] = [keys[half:]]
+            self.counts[chunk + 1:chunk + 1] = [counts[half:]]
+            del keys[half:]
+            del counts[half:]
+            self.maxes[chunk] = keys[-1]
+            self.maxes.insert(chunk + 1, self.keys[chunk + 1][-1])
+            self._rebuild_tree()
+        else:
+            self._tree_add(chunk, n)
+
+    def remove(self, key, n=1):
+        chunk = bisect_left(self.maxes, key)
+        if chunk == len(self.maxes):
+            raise KeyError(key)
+        keys = self.keys[chunk]
+        pos = bisect_left(keys, key)
+        if pos == len(keys) or keys[pos] != key or self.counts[chunk][pos] < n:
+            raise KeyError(key)
+        self.counts[chunk][pos] -= n
+        self.total -= n
+        if self.counts[chunk][pos]:
+            self._tree_add(chunk, -n)
+            return
+        del keys[pos]
+        del self.counts[chunk][pos]
+        if keys:
+            self.maxes[chunk] = keys[-1]
+            self._tree_add(chunk, -n)
+        else:
+            del self.keys[chunk]
+            del self.counts[chunk]
+            del self.maxes[chunk]
+            self._rebuild_tree()
+
+    def count(self, key):
+        chunk = bisect_left(self.maxes, key)
+        if chunk == len(self.maxes):
+            return 0
+        keys = self.keys[chunk]
+        pos = bisect_left(keys, key)
+        return self.counts[chunk][pos] if pos < len(keys) and keys[pos] == key else 0
+
+    def count_range(self, low, high):
+        '''Liczba elementów z obustronnie domkniętego przedziału [low, high]. O(log F)'''
+        if low > high:
+            return 0
+        return self.rank(high) + self.count(high) - self.rank(low)
+
+    def __iter__(self):
+        '''Elementy rosnąco (klucz powtórzony tyle razy, ile wynosi jego krotność).'''
+        for keys, counts in zip(self.keys, self.counts):
+            for key, n in zip(keys, counts):
+                for _ in range(n):
+                    yield key
+
+    def distinct(self, reverse=False):
+        '''Różne klucze rosnąco (malejąco przy reverse=True).'''
+        if reverse:
+            for keys in reversed(self.keys):
+                yield from reversed(keys)
+        else:
+            for keys in self.keys:
+                yield from keys
+
+    def rank(self, key):
+        '''Liczba elementów ściśle mniejszych od key. O(log F)'''
+        chunk = bisect_left(self.maxes, key)
+        if chunk == len(self.maxes):
+            return self.total
+        pos = bisect_left(self.keys[chunk], key)
+        return self._before(chunk) + sum(self.counts[chunk][:pos])
+
+    def select(self, index):
+        '''Klucz i-tego najmniejszego elementu (od 0). O(log F)'''
+        if not 0 <= index < self.total:
+            raise IndexError(index)
+        # Zejście po drzewie Fenwicka: największa porcja, przed którą jest co najwyżej index elementów
+        chunk = 0
+        remaining = index
+        step = 1 << (len(self.tree) - 1).bit_length()
+        tree = self.tree
+        while step:
+            nxt = chunk + step
+            if nxt < len(tree) and tree[nxt] <= remaining:
+                chunk = nxt
+                remaining -= tree[nxt]
+            step >>= 1
+        for key, n in zip(self.keys[chunk], self.counts[chunk]):
+            if remaining < n:
+                return key
+            remaining -= n
+        raise AssertionError("niespójne sumy porcji")
+
+
+_MISSING = object()
+
+
+class SortedKeyDict(dict):
+    '''
+        Słownik z kluczami liczbowymi utrzymywanymi w porządku rosnącym (zamiennik SortedDict
+        z sortedcontainers w zakresie potrzebnym PharmaDB).
+
+        Wartości trzyma zwykły dict (odczyt po kluczu w O(1)), a klucze dodatkowo porcje posortowanych list
+        z listą największych kluczy porcji. Wszystkie metody dict zmieniające zawartość są nadpisane
+        (popitem usuwa największy klucz, jak w SortedDict), więc porcje zawsze odpowiadają kluczom. Klucz większy od wszystkich dotychczasowych (typowe przy wczytywaniu
+        danych posortowanych po częstotliwości) trafia na koniec ostatniej porcji bez wyszukiwania.
+
+        Złożoność czasowa: wstawienie/usunięcie klucza O(log F) (przesunięcie w porcji stałego rozmiaru),
+        irange O(log F + liczba zwróconych kluczy).
+
+        Args:
+            load (int, optional): docelowy rozmiar porcji (porcja dzielona przy 2 * load kluczach)
+    '''
+
+    def __init__(self, items=(), load=256):
+        super().__init__()
+        self.load = load
+        self.lists = []             # porcja → posortowana lista kluczy
+        self.maxes = []             # porcja → największy klucz
+        self.update(items)
+
+    def _insert_key(self, key):
+        lists = self.lists
+        maxes = self.maxes
+        if not maxes:
+            lists.append([key])
+            maxes.append(key)
+            return
+        if key > maxes[-1]:
+            chunk = len(maxes) - 1
+            keys = lists[chunk]
+            keys.append(key)
+            maxes[chunk] = key
+        else:
+            chunk = bisect_left(maxes, key)
+            keys = lists[chunk]
+            keys.insert(bisect_left(keys, key), key)
+        if len(keys) > 2 * self.load:
+            half = len(keys) // 2
+            lists.insert(chunk + 1, keys[half:])
+            del keys[half:]
+            maxes[chunk] = keys[-1]
+            maxes.insert(chunk + 1, lists[chunk + 1][-1])
+
+    def _remove_key(self, key):
+        chunk = bisect_left(self.maxes, key)
+        keys = self.lists[chunk]
+        del keys[bisect_left(keys, key)]
+        if keys:
+            self.maxes[chunk] = keys[-1]
+        else:
+            del self.lists[chunk]
+            del self.maxes[chunk]
+
+    def __setitem__(self, key, value):
+        if key not in self:
+            self._insert_key(key)
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        self._remove_key(key)
+
+    def setdefault(self, key, default=None):
+        value = dict.get(self, key, _MISSING)
+        if value is not _MISSING:
+            return value
+        self._insert_key(key)
+        dict.__setitem__(self, key, default)
+        return default
+
+    def pop(self, key, *default):
+        if key in self:
+            value = dict.pop(self, key)
+            self._remove_key(key)
+            return value
+        return dict.pop(self, key, *default)
+
+    def clear(self):
+        dict.clear(self)
+        self.lists = []
+        self.maxes = []
+
+    def popitem(self):
+        '''Usuwa i zwraca parę o największym kluczu (KeyError dla pustego słownika).'''
+        if not self.maxes:
+            raise KeyError("popitem(): słownik jest pusty")
+        key = self.maxes[-1]
+        return key, self.pop(key)
+
+    def copy(self):
+        return type(self)(self.items(), load=self.load)
+
+    __copy__ = copy
+
+    def __reduce__(self):
+        # Odtworzenie (pickle, copy.deepcopy) przez konstruktor — porcje budowane razem z kluczami
+        return type(self), (self.items(), self.load)
+
+    @classmethod
+    def fromkeys(cls, iterable, value=None):
+        return cls((key, value) for key in iterable)
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def __or__(self, other):
+        if not isinstance(other, dict):
+            return NotImplemented
+        result = self.copy()
+        result.update(other)
+        return result
+
+    def __ror__(self, other):
+        if not isinstance(other, dict):
+            return NotImplemented
+        result = type(self)(other.items(), load=self.load)
+        result.update(self.items())
+        return result
+
+    def update(self, other=(), **kwargs):
+        '''
+            Wstawia wiele par naraz. Gdy nowych kluczy jest dużo w porównaniu z istniejącymi, porcje są
+            budowane od nowa z jednego sortowania zamiast wstawiania kluczy po kolei.
+        '''
+        items = other.items() if hasattr(other, "items") else other
+        new_keys = []
+        for key, value in chain(items, kwargs.items()):
+            if key not in self:
+                new_keys.append(key)
+            dict.__setitem__(self, key, value)
+        if len(new_keys) * 8 < len(self):
+            for key in new_keys:
+                self._insert_key(key)
+            return
+        keys = sorted(list(self) + new_keys)
+        load = self.load
+        self.lists = [keys[i:i + load] for i in range(0, len(keys), load)]
+        self.maxes = [chunk[-1] for chunk in self.lists]
+
+    def __iter__(self):
+        for keys in self.lists:
+            yield from keys
+
+    def __reversed__(self):
+        for keys in reversed(self.lists):
+            yield from reversed(keys)
+
+    def keys(self):
+        return list(self)
+
+    def values(self):
+        return [dict.__getitem__(self, key) for key in self]
+
+    def items(self):
+        return [(key, dict.__getitem__(self, key)) for key in self]
+
+    def irange(self, minimum, maximum):
+        '''Klucze z obustronnie domkniętego przedziału [minimum, maximum] w porządku rosnącym.'''
+        maxes = self.maxes
+        first = bisect_left(maxes, minimum)
+        if first == len(maxes) or minimum > maximum:
+            return
+        last = bisect_left(maxes, maximum)
+        lists = self.lists
+        start = bisect_left(lists[first], minimum)
+        if last == len(maxes):
+            last -= 1
+            stop = len(lists[last])
+        else:
+            stop = bisect_right(lists[last], maximum)
+        if first == last:
+            yield from lists[first][start:stop]
+            return
+        yield from lists[first][start:]
+        for chunk in range(first + 1, last):
+            yield from lists[chunk]
+        yield from lists[last][:stop]
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.items()!r})"
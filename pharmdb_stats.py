@@ -0,0 +1,88 @@
+# Instrumentacja PharmDB / PharmaDB
+#
+# Włączana na żądanie (db.enable_instrumentation()). Gdy jest wyłączona, metody bazy nie są opakowane,
+# a algorytmy sprawdzają jedynie raz na wywołanie, czy self.stats nie jest None.
+
+import time
+from collections import deque
+
+
+class Instrumentation:
+    '''
+        Zbiera statystyki wywołań metod (liczba wywołań, łączny czas, percentyle z ostatnich
+        window wywołań) oraz liczniki specyficzne dla algorytmów, np.:
+            - bfs_nodes_visited: liczba odwiedzonych leków w jednym BFS (find_best_alternative)
+            - stale_heap_pops: liczba usuniętych nieaktualnych wpisów kopca (update_best_indication)
+            - chain_nodes_updated: liczba leków, których ciąg zamienników zmienił się po dodaniu leku
+            - frequency_keys_scanned: liczba przejrzanych kluczy indeksu częstotliwości
+            - query_candidates_scanned: liczba kandydatów sprawdzonych przez zapytanie złożone (query)
+            - topological_reordered: liczba leków przenumerowanych w porządku topologicznym (add_substitutes)
+    '''
+
+    def __init__(self, window=10000):
+        self.window = window
+        self.calls = {}         # metoda → [liczba wywołań, łączny czas w ns, deque ostatnich czasów]
+        self.counters = {}      # licznik → [liczba próbek, suma, maksimum]
+
+    def wrap(self, name, method):
+        clock = time.perf_counter_ns
+        entry = self.calls.setdefault(name, [0, 0, deque(maxlen=self.window)])
+        samples = entry[2]
+
+        def instrumented(*args, **kwargs):
+            start = clock()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                elapsed = clock() - start
+                entry[0] += 1
+                entry[1] += elapsed
+                samples.append(elapsed)
+
+        instrumented.__name__ = name
+        instrumented.__doc__ = method.__doc__
+        return instrumented
+
+    def record(self, counter, value):
+        entry = self.counters.get(counter)
+        if entry is None:
+            self.counters[counter] = [1, value, value]
+        else:
+            entry[0] += 1
+            entry[1] += value
+            if value > entry[2]:
+                entry[2] = value
+
+    def reset(self):
+        for entry in self.calls.values():
+            entry[0] = 0
+            entry[1] = 0
+            entry[2].clear()
+        self.counters.clear()
+
+    def snapshot(self):
+        '''
+            Zwraca słownik {"methods": {...}, "counters": {...}} z bieżącymi statystykami.
+            Czasy podawane są w mikrosekundach.
+        '''
+        methods = {}
+        for name, (count, total_ns, samples) in self.calls.items():
+            if not count:
+                continue
+            ordered = sorted(samples)
+            n = len(ordered)
+            methods[name] = {
+                "calls": count,
+                "total_us": total_ns / 1000.0,
+                "mean_us": total_ns / count / 1000.0,
+                "p50_us": ordered[min(n - 1, int(0.50 * n))] / 1000.0,
+                "p95_us": ordered[min(n - 1, int(0.95 * n))] / 1000.0,
+                "p99_us": ordered[min(n - 1, int(0.99 * n))] / 1000.0,
+                "max_us": ordered[-1] / 1000.0,
+            }
+
+        counters = {}
+        for name, (count, total, maximum) in self.counters.items():
+            counters[name] = {"samples": count, "total": total, "mean": total / count, "max": maximum}
+
+        return {"methods": methods, "counters": counters}